@@ -21,6 +21,50 @@ class Settings(BaseSettings):
     mandi_resource_id: str = "9ef84268-d588-465a-a308-a864a43d0070"
     data_gov_base_url: str = "https://api.data.gov.in/resource"
 
+    # Outbound HTTP (one pooled client per process, see app/services/http_client.py)
+    http_timeout_s: float = 8.0
+    http_max_connections: int = 10
+    http_max_keepalive: int = 5         # idle connections kept open for reuse
+    mandi_refresh_mode: str = "bulk"    # "bulk" (page through the whole resource) or "per_crop"
+    mandi_bulk_page_size: int = 1000    # records per page in bulk mode
+    mandi_refresh_concurrency: int = 8  # requests in flight during the daily refresh
+    mandi_rate_limit_per_s: float = 5.0 # requests per second to data.gov.in, 0 = unlimited
+
+    # Mandi price cache (stale-while-revalidate, see MandiService)
+    mandi_cache_soft_ttl_s: float = 6 * 60 * 60   # served as fresh
+    mandi_cache_hard_ttl_s: float = 24 * 60 * 60  # served stale + refreshed in the background until this
+    mandi_shared_cache: str = "mmap"              # tier shared by all workers on the host: "mmap" or "none"
+    mandi_shared_cache_dir: str = ""              # private dir for the mmap file, default $XDG_RUNTIME_DIR/vyaas or backend/run
+    mandi_shared_cache_slots: int = 1024          # entries (8 KB each)
+
+    # Logging (see app/logging_config.py)
+    log_level: str = "INFO"    # DEBUG adds the per-farm input dump and filter hard-removes
+    log_format: str = "text"   # "text" or "json" (one object per line)
+
+    # ML inference micro-batching (see app/services/inference_scheduler.py)
+    ml_batch_max_size: int = 32         # flush once this many requests are queued
+    ml_batch_max_wait_ms: float = 5.0   # ...or this long after the first one arrived
+    ml_queue_max_depth: int = 1000      # beyond this /api/ml/recommend answers 503
+    ml_inference_workers: int = 1       # threads running batched inference (= batches in flight)
+    ml_batch_workers: int = 1           # separate threads for /api/ml/recommend/batch
+
+    # Distilled student model (published by dataset/train_crop_model.py when it agrees with the forest)
+    ml_serve_student: bool = False               # opt-in: final top-3 lists can differ from the forest's
+    ml_teacher_fallback: bool = True             # re-score low-confidence rows with the full forest
+    ml_teacher_fallback_confidence: float = 0.2  # ...when the student's top probability is below this
+
+    # In-server model retraining (see app/services/retrain_job.py)
+    retrain_enabled: bool = True
+    retrain_day_of_week: str = "sun"    # APScheduler cron fields, Asia/Kolkata
+    retrain_hour: int = 2
+    retrain_nice: int = 10              # child process priority (POSIX nice increment)
+    retrain_n_jobs: int = 1             # cores the forest fit may use
+    retrain_memory_limit_mb: int = 4096 # child address-space cap, 0 = none (POSIX only)
+    retrain_timeout_s: float = 3600
+
+    # Admin endpoints (/api/ml/admin/*) require X-Admin-Token when this is set
+    admin_token: str = ""
+
     # Ayurvedic crops we support
     supported_crops: list = [
         "Turmeric",
@@ -1,10 +1,13 @@
 # app/database.py
 # MySQL database connection and table initialisation via XAMPP
 
+import logging
 import mysql.connector
 from mysql.connector import pooling
 import os
 
+logger = logging.getLogger(__name__)
+
 # ── Connection config ─────────────────────────────────────────────────────────
 DB_CONFIG = {
     "host": os.getenv("MYSQL_HOST", "localhost"),
@@ -56,7 +59,8 @@ _TABLES = [
         farmer_id VARCHAR(36) NOT NULL DEFAULT 'ANON',
         farm_id VARCHAR(50) NOT NULL,
         data_json LONGTEXT NOT NULL,
-        submitted_at TIMESTAMP DEFAULT NOW()
+        submitted_at TIMESTAMP DEFAULT NOW(),
+        INDEX idx_farm_id (farm_id)
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
     """,
     """
@@ -79,7 +83,7 @@ _TABLES = [
         max_price DECIMAL(10,2),
         recorded_date DATE NOT NULL,
         data_source ENUM('live','fallback'),
-        INDEX idx_crop_date (crop_name, recorded_date)
+        UNIQUE KEY uq_crop_date (crop_name, recorded_date)
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
     """,
     """
@@ -90,11 +94,55 @@ _TABLES = [
         recommended_crops JSON,
         chosen_crop VARCHAR(100) NOT NULL,
         processed BOOLEAN DEFAULT FALSE,
-        chosen_at TIMESTAMP DEFAULT NOW()
+        chosen_at TIMESTAMP DEFAULT NOW(),
+        INDEX idx_processed_chosen (processed, chosen_at)
     ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
     """,
 ]
 
+# Indexes added after the tables first shipped — CREATE TABLE IF NOT EXISTS
+# leaves existing tables alone, so init_db adds any that are missing.
+# (table, index name, columns)
+_INDEXES = [
+    ("farm_data",       "idx_farm_id",          "farm_id"),
+    ("farmer_feedback", "idx_processed_chosen", "processed, chosen_at"),
+]
+
+
+# Unique keys added later: (table, key name, columns, plain index it replaces).
+# Duplicate rows already in the table are deleted first, keeping the lowest id.
+_UNIQUE_KEYS = [
+    ("mandi_price_history", "uq_crop_date", ("crop_name", "recorded_date"), "idx_crop_date"),
+]
+
+
+def _has_index(cur, table: str, name: str) -> bool:
+    cur.execute(
+        "SELECT COUNT(*) FROM information_schema.statistics "
+        "WHERE table_schema = %s AND table_name = %s AND index_name = %s",
+        (DB_CONFIG["database"], table, name),
+    )
+    return cur.fetchone()[0] > 0
+
+
+def _ensure_indexes(cur):
+    for table, name, columns in _INDEXES:
+        if not _has_index(cur, table, name):
+            cur.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+            logger.info(f"Added index {name} on {table}({columns})")
+
+    for table, name, columns, replaces in _UNIQUE_KEYS:
+        if _has_index(cur, table, name):
+            continue
+        match = " AND ".join(f"a.{c} = b.{c}" for c in columns)
+        cur.execute(f"DELETE a FROM {table} a JOIN {table} b ON {match} AND a.id > b.id")
+        if cur.rowcount:
+            logger.warning(f"Removed {cur.rowcount} duplicate rows from {table} before adding {name}")
+        cur.execute(f"CREATE UNIQUE INDEX {name} ON {table} ({', '.join(columns)})")
+        if replaces and _has_index(cur, table, replaces):
+            cur.execute(f"DROP INDEX {replaces} ON {table}")
+        logger.info(f"Added unique key {name} on {table}({', '.join(columns)})")
+
 
 def init_db():
     """Create database and all tables if they don't exist."""
@@ -110,11 +158,12 @@ def init_db():
 
         for ddl in _TABLES:
             cur.execute(ddl)
+        _ensure_indexes(cur)
         conn.commit()
         cur.close()
         conn.close()
-        print("[DB] ✅ MySQL connected — all tables ready.")
+        logger.info("MySQL connected — all tables ready.")
     except Exception as e:
-        print(f"[DB] ❌ Could not initialise database: {e}")
-        print("[DB] ⚠️  Make sure XAMPP MySQL is running on port 3306.")
+        logger.error(f"Could not initialise database: {e}")
+        logger.warning("Make sure XAMPP MySQL is running on port 3306.")
         raise
@@ -0,0 +1,110 @@
+# app/logging_config.py
+# Structured, non-blocking logging for the backend
+# Request handlers only enqueue records (QueueHandler); a QueueListener thread
+# formats them and does the actual stdout writes, off the event loop.
+
+import sys
+import copy
+import json
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Attributes every LogRecord has — anything else came from `extra=` and is
+# emitted as a structured field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[QueueListener] = None
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg + any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts":     self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level":  record.levelname,
+            "logger": record.name,
+            "msg":    record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with `extra` fields appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s", "%H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += "  " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+class _StructuredQueueHandler(QueueHandler):
+    """
+    QueueHandler.prepare() would merge the message into a string with the
+    default formatter; keep the record's fields and only resolve the message
+    and traceback so the listener thread can format it however it likes.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: str = "INFO", fmt: str = "text"):
+    """
+    Route every logger through a queue to one stdout writer thread.
+    level: DEBUG / INFO / WARNING / ...   fmt: "text" or "json"
+    Safe to call more than once; only the first call installs handlers.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt.lower() == "json" else TextFormatter())
+
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # flush whatever is still queued on exit
+
+    # DEBUG applies to the app's own loggers only — library DEBUG output
+    # (httpcore, asyncio, apscheduler) would drown the request logs
+    level_no = _level_number(level)
+    root = logging.getLogger()
+    root.handlers = [_StructuredQueueHandler(log_queue)]
+    root.setLevel(max(logging.INFO if level_no is None else level_no, logging.INFO))
+    logging.getLogger("app").setLevel(logging.INFO if level_no is None else level_no)
+    if level_no is None:
+        logging.getLogger(__name__).warning(f"Unknown LOG_LEVEL {level!r} — using INFO")
+
+
+def _level_number(level) -> Optional[int]:
+    """"debug" / "WARNING" / "20" → logging level number; None if it isn't one."""
+    name = str(level).strip().upper()
+    if name.isdigit():
+        return int(name)
+    number = logging.getLevelName(name)  # the level's number, or "Level <name>" if unknown
+    return number if isinstance(number, int) else None
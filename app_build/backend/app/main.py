@@ -1,30 +1,53 @@
 # app/main.py
 # Smart Ayurvedic Crop Advisor — FastAPI entry point
-# Startup: DB init → stale cache check → APScheduler (6:30 AM IST daily)
+# Startup: ML warmup (background) → DB init → price history load (background) → APScheduler (6:30 AM IST
+#          daily mandi refresh, weekly model retrain) → stale cache check → ML scheduler
 
 import sys
 if hasattr(sys.stdout, 'reconfigure'):
     sys.stdout.reconfigure(encoding='utf-8')
 
 import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from app.config import get_settings
+from app.logging_config import setup_logging
+
+# Before the routers import, so model/catalog loading logs go through the queue
+setup_logging(get_settings().log_level, get_settings().log_format)
+
 from app.routers import market_router, farm_router, ml_router
 from app.routers.auth import router as auth_router
-from app.config import get_settings
 from app.database import init_db
+from app.services.http_client import open_http_client, close_http_client
+
+logger = logging.getLogger(__name__)
 
 
 # ── Lifespan ──────────────────────────────────────────────────────────────────
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # 0. Load the ML model in the background — the port binds immediately and
+    #    /api/ml/recommend answers 503 until recommender.ready
+    asyncio.create_task(asyncio.to_thread(ml_router.recommender.warmup))
+
+    # 0b. One pooled HTTP client for all outbound calls — keep-alive connections
+    #     are reused across the mandi refresh and request-path API lookups
+    settings = get_settings()
+    open_http_client(
+        timeout_s=settings.http_timeout_s,
+        max_connections=settings.http_max_connections,
+        max_keepalive=settings.http_max_keepalive,
+    )
+
     # 1. Initialise MySQL DB + create tables
     try:
         init_db()
     except Exception as e:
-        print(f"[STARTUP] ⚠️  DB init failed: {e} — running in limited mode.")
+        logger.warning(f"DB init failed: {e} — running in limited mode.")
 
     # 2. Start APScheduler for daily mandi refresh (6:30 AM IST)
     try:
@@ -32,11 +55,20 @@ async def lifespan(app: FastAPI):
         from apscheduler.triggers.cron import CronTrigger
         from app.routers.market import get_mandi_service
 
-        settings = get_settings()
         mandi_service = get_mandi_service(settings)
 
+        # Price history into memory (one bulk query) — history / harvest prediction
+        # requests retry the load themselves if the DB isn't up yet
+        async def load_price_history():
+            try:
+                await asyncio.to_thread(mandi_service.sync_price_history)
+            except Exception:
+                pass  # already logged
+
+        asyncio.create_task(load_price_history())
+
         async def scheduled_mandi_refresh():
-            print("[SCHEDULER] ⏰ 6:30 AM IST — Starting daily mandi price refresh...")
+            logger.info("6:30 AM IST — Starting daily mandi price refresh...")
             await mandi_service.refresh_all_crops()
 
         scheduler = AsyncIOScheduler(timezone="Asia/Kolkata")
@@ -46,23 +78,39 @@ async def lifespan(app: FastAPI):
             id="daily_mandi_refresh",
             replace_existing=True,
         )
+        if settings.retrain_enabled:
+            # Runs in a separate low-priority process; the new version is hot-swapped in when done
+            scheduler.add_job(
+                ml_router.retrain_job.scheduled_run,
+                CronTrigger(day_of_week=settings.retrain_day_of_week, hour=settings.retrain_hour,
+                            timezone="Asia/Kolkata"),
+                id="weekly_model_retrain",
+                replace_existing=True,
+            )
+            ml_router.retrain_job.attach_scheduler(scheduler, "weekly_model_retrain")
         scheduler.start()
-        print("[SCHEDULER] ✅ APScheduler started — daily mandi refresh at 6:30 AM IST")
+        logger.info("APScheduler started — daily mandi refresh at 6:30 AM IST"
+                    + (f", model retrain {settings.retrain_day_of_week} {settings.retrain_hour}:00" if settings.retrain_enabled else ""))
 
         # 3. Startup lazy check — refresh immediately if prices are stale (> 24 hrs)
         if mandi_service.is_cache_stale():
-            print("[STARTUP] 🔄 Mandi prices are stale — refreshing now in background...")
+            logger.info("Mandi prices are stale — refreshing now in background...")
             asyncio.create_task(mandi_service.refresh_all_crops())
         else:
-            print("[STARTUP] ✅ Mandi prices are fresh — no startup refresh needed.")
+            logger.info("Mandi prices are fresh — no startup refresh needed.")
 
     except ImportError:
-        print("[STARTUP] ⚠️  APScheduler not installed. Run: pip install APScheduler")
+        logger.warning("APScheduler not installed. Run: pip install APScheduler")
     except Exception as e:
-        print(f"[STARTUP] ⚠️  Scheduler error: {e}")
+        logger.warning(f"Scheduler error: {e}")
+
+    # 4. Bind the ML micro-batching scheduler to this event loop
+    ml_router.scheduler.start()
 
     yield  # App is running
-    # Shutdown cleanup if needed
+
+    await ml_router.scheduler.stop()
+    await close_http_client()
 
 
 # ── App initialisation ────────────────────────────────────────────────────────
@@ -110,6 +158,7 @@ async def root():
         "docs": "/docs",
         "endpoints": {
             "ml_recommend":    "POST /api/ml/recommend",
+            "ml_batch":        "POST /api/ml/recommend/batch",
             "ml_feedback":     "POST /api/ml/feedback",
             "crop_details":    "GET  /api/ml/crop-details?crop=Tulsi,Ashwagandha",
             "market_prices":   "GET  /api/market/prices?crop=tulsi",
@@ -129,6 +178,7 @@ async def health_check():
         "api_key_configured": bool(
             settings.data_gov_api_key and settings.data_gov_api_key != "your_api_key_here"
         ),
+        "ml_model_ready": ml_router.recommender.ready,
         "data_source": "data.gov.in",
         "database": "MySQL via XAMPP",
     }
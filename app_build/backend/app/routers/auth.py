@@ -1,10 +1,13 @@
 # app/routers/auth.py
 # Authentication router - Twilio OTP login endpoints
 
+import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from app.services.auth_service import auth_service
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/auth", tags=["Authentication"])
 
 
@@ -43,7 +46,7 @@ async def check_phone_exists(request: OTPRequest):
                 "exists": False,
             }
     except Exception as e:
-        print(f"[AUTH] ❌ Error checking phone: {e}")
+        logger.error(f"Error checking phone: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -72,7 +75,7 @@ async def verify_otp(request: OTPVerifyRequest):
             existing = farm_service.get_farmer_by_phone(request.phone)
             if existing:
                 farmer_id = existing.get("farmer_id", "")
-                print(f"[AUTH] ✅ Verified farmer: {farmer_id} ({request.phone})")
+                logger.info(f"Verified farmer: {farmer_id} ({request.phone})")
                 return {
                     "success": True,
                     "token": "placeholder_jwt_token",  # TODO: generate real JWT
@@ -81,7 +84,7 @@ async def verify_otp(request: OTPVerifyRequest):
                 }
             else:
                 # Phone verified but no profile exists — needs registration
-                print(f"[AUTH] ⚠️ OTP verified but no profile for {request.phone}")
+                logger.warning(f"OTP verified but no profile for {request.phone}")
                 return {
                     "success": True,
                     "token": "placeholder_jwt_token",
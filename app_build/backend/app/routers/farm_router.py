@@ -27,17 +27,10 @@ class FarmData(BaseModel):
     farm_id: str = "FARM_001" # Will be overridden by unique farmer-based ID
     farmer_id: str = "ANON" # Required: farmer identity for ML engine
 
-@router.post("/save")
-async def save_farm(data: FarmData):
+def clean_farm_data(cleaned_data: dict) -> dict:
     """
-    Save farm details to memory.
+    Normalise a raw FarmData dump into the shape the ML engine expects.
     """
-    # Convert string inputs to numbers where necessary for the model
-    # (The pydantic model keeps them as strings to match mobile app, 
-    # but we clean them for the service)
-    
-    cleaned_data = data.model_dump()
-    
     # Simple type conversion helper
     def safe_float(val, default=0.0):
         try: return float(val) if val not in (None, '', 'None') else default
@@ -85,6 +78,18 @@ async def save_farm(data: FarmData):
     }
     state = cleaned_data.get('state', '')
     cleaned_data['climate_zone'] = STATE_TO_CLIMATE.get(state.lower(), 'Tropical')
-        
+    return cleaned_data
+
+
+@router.post("/save")
+async def save_farm(data: FarmData):
+    """
+    Save farm details to memory.
+    """
+    # Convert string inputs to numbers where necessary for the model
+    # (The pydantic model keeps them as strings to match mobile app, 
+    # but we clean them for the service)
+    cleaned_data = clean_farm_data(data.model_dump())
+
     saved = farm_service.save_farm_details(cleaned_data)
     return {"status": "success", "data": saved}
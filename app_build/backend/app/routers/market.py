@@ -5,6 +5,7 @@ from fastapi import APIRouter, Depends, Query, HTTPException
 from typing import Optional
 from app.config import get_settings, Settings
 from app.services.mandi_service import MandiService
+from app.services.shared_cache import open_shared_cache
 
 router = APIRouter(prefix="/api/market", tags=["Market Prices"])
 
@@ -18,7 +19,18 @@ def get_mandi_service(settings: Settings = Depends(get_settings)) -> MandiServic
         _mandi_service_instance = MandiService(
             api_key=settings.data_gov_api_key,
             resource_id=settings.mandi_resource_id,
-            base_url=settings.data_gov_base_url
+            base_url=settings.data_gov_base_url,
+            refresh_concurrency=settings.mandi_refresh_concurrency,
+            rate_limit_per_s=settings.mandi_rate_limit_per_s,
+            refresh_mode=settings.mandi_refresh_mode,
+            bulk_page_size=settings.mandi_bulk_page_size,
+            cache_soft_ttl_s=settings.mandi_cache_soft_ttl_s,
+            cache_hard_ttl_s=settings.mandi_cache_hard_ttl_s,
+            shared_cache=open_shared_cache(
+                settings.mandi_shared_cache,
+                directory=settings.mandi_shared_cache_dir,
+                slots=settings.mandi_shared_cache_slots,
+            ),
         )
     return _mandi_service_instance
 
@@ -60,7 +72,7 @@ async def predict_harvest_price(
     mandi_service: MandiService = Depends(get_mandi_service)
 ):
     """Predicts market price at harvest time based on current trends."""
-    prediction = mandi_service.predict_harvest_price(
+    prediction = await mandi_service.predict_harvest_price(
         crop=crop, 
         growth_days=growth_days, 
         current_price=current_price
@@ -68,6 +80,15 @@ async def predict_harvest_price(
     return prediction
 
 
+@router.get("/metrics")
+async def get_market_metrics(mandi_service: MandiService = Depends(get_mandi_service)):
+    """Price cache counters (fresh and stale hits, revalidations, lookups, coalesced misses) and the in-memory price history."""
+    return {
+        "price_cache":   mandi_service.cache_stats(),
+        "price_history": mandi_service.price_series.stats(),
+    }
+
+
 @router.get("/supported-crops")
 async def get_supported_crops(settings: Settings = Depends(get_settings)):
     """Get list of supported Ayurvedic crops."""
@@ -1,14 +1,48 @@
 # app/routers/ml_router.py
 # ML crop recommendation and feedback endpoints
 
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+import hmac
+import logging
+import time
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from app.config import get_settings
 from app.services.recommendation_service import RecommendationService
+from app.services.inference_scheduler import InferenceScheduler, SchedulerOverloaded
+from app.services.retrain_job import RetrainJob, RetrainAlreadyRunning
 from app.services.farm_service import farm_service
+from app.routers.farm_router import FarmData, clean_farm_data
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/ml", tags=["Machine Learning"])
-recommender = RecommendationService()
+_settings = get_settings()
+recommender = RecommendationService(  # loaded by warmup() in app lifespan
+    autoload=False,
+    serve_student=_settings.ml_serve_student,
+    teacher_fallback_confidence=_settings.ml_teacher_fallback_confidence if _settings.ml_teacher_fallback else None,
+)
+scheduler = InferenceScheduler(
+    recommender,
+    max_batch_size=_settings.ml_batch_max_size,
+    max_wait_ms=_settings.ml_batch_max_wait_ms,
+    max_queue_depth=_settings.ml_queue_max_depth,
+    workers=_settings.ml_inference_workers,
+    batch_workers=_settings.ml_batch_workers,
+)
+retrain_job = RetrainJob(
+    recommender,
+    nice=_settings.retrain_nice,
+    n_jobs=_settings.retrain_n_jobs,
+    memory_limit_mb=_settings.retrain_memory_limit_mb,
+    timeout_s=_settings.retrain_timeout_s,
+)
+
+MAX_BATCH_FARMS = 500  # Upper bound on farms scored per /recommend/batch call
+
+DEBUG_TIMING_HEADER = "X-Debug-Timing"  # send "1" to get per-stage timings back
 
 
 # ── Request / Response models ─────────────────────────────────────────────────
@@ -17,6 +51,12 @@ class RecommendRequest(BaseModel):
     farm_id: str
 
 
+class BatchRecommendRequest(BaseModel):
+    farm_ids: List[str] = []
+    farms: List[FarmData] = []  # Inline farm payloads (same shape as /api/farm/save)
+    top_k: Optional[int] = 3
+
+
 class FeedbackRequest(BaseModel):
     farmer_id: str
     farm_id: str
@@ -24,64 +64,209 @@ class FeedbackRequest(BaseModel):
     chosen_crop: str
 
 
+def _require_admin(token: Optional[str]):
+    """Admin endpoints stay closed until ADMIN_TOKEN is set."""
+    expected = get_settings().admin_token
+    if not expected:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not hmac.compare_digest((token or "").encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+
+def _debug_timing_enabled(value: Optional[str]) -> bool:
+    return (value or "").strip().lower() in ("1", "true", "yes")
+
+
+def _attach_timing(response: Response, body: dict, timing: dict, started: float):
+    """Add the request's stage timings to the body and as a Server-Timing header."""
+    timing["total_ms"] = round((time.perf_counter() - started) * 1000, 4)
+    body["debug_timing"] = timing
+    response.headers["Server-Timing"] = ", ".join(
+        f"{key[:-3]};dur={value}" for key, value in timing.items() if key.endswith("_ms")
+    )
+
+
+def _farm_inputs(farm_data: dict) -> dict:
+    """The model-relevant inputs of a farm, for the DEBUG request log."""
+    return {
+        "state":          farm_data.get("state", ""),
+        "district":       farm_data.get("district", ""),
+        "farm_size":      farm_data.get("farmSize", farm_data.get("total_farm_size_acres")),
+        "temperature":    farm_data.get("temperature"),
+        "rainfall":       farm_data.get("rainfall"),
+        "humidity":       farm_data.get("humidity"),
+        "soil_type":      farm_data.get("soilType", farm_data.get("soil_type")),
+        "soil_ph":        farm_data.get("soilPh", farm_data.get("ph")),
+        "soil_moisture":  farm_data.get("soilMoisture", farm_data.get("soil_moisture")),
+        "organic_carbon": farm_data.get("organicCarbon", farm_data.get("organic_carbon")),
+        "nitrogen":       farm_data.get("nitrogen"),
+        "phosphorus":     farm_data.get("phosphorus"),
+        "potassium":      farm_data.get("potassium"),
+        "budget":         farm_data.get("budget"),
+    }
+
+
+def _require_model():
+    """503 until the background warmup has loaded a model."""
+    if not recommender.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Recommendation model is still loading. Please retry shortly.",
+            headers={"Retry-After": "5"},
+        )
+
+
 # ── Endpoints ─────────────────────────────────────────────────────────────────
 
 @router.post("/recommend")
-async def get_recommendations(request: RecommendRequest):
-    """Get ML crop recommendations for a saved farm_id."""
+async def get_recommendations(
+    request: RecommendRequest,
+    response: Response,
+    x_debug_timing: Optional[str] = Header(None, alias=DEBUG_TIMING_HEADER),
+):
+    """
+    Get ML crop recommendations for a saved farm_id.
+    With the X-Debug-Timing: 1 header the response includes per-stage timings.
+    """
+    started = time.perf_counter()
+    timing  = {} if _debug_timing_enabled(x_debug_timing) else None
+    _require_model()
     farm_data = farm_service.get_farm_details(request.farm_id)
 
     if not farm_data:
-        print(f"\n[ML ENGINE] ❌ No farm data found for farm_id='{request.farm_id}'")
+        logger.warning("No farm data found for farm_id=%s", request.farm_id)
         return {"recommendations": [], "status": "no_data",
                 "message": "Farm details not found. Please submit farm data first."}
 
-    # ── Terminal log ──────────────────────────────────────────────────────────
-    print("\n" + "=" * 55)
-    print(f"[ML ENGINE] 🌾 Predicting crops for farm_id='{request.farm_id}'")
-    print("-" * 55)
-    print(f"  📍 State          : {farm_data.get('state', '')} / {farm_data.get('district', '')}")
-    print(f"  📐 Farm Size      : {farm_data.get('farmSize', farm_data.get('total_farm_size_acres', '?'))} acres")
-    print(f"  🌡️  Temperature    : {farm_data.get('temperature', 0)} °C")
-    print(f"  🌧️  Rainfall       : {farm_data.get('rainfall', 0)} mm")
-    print(f"  💧 Humidity       : {farm_data.get('humidity', 0)} %")
-    print(f"  🪨  Soil Type      : {farm_data.get('soilType', farm_data.get('soil_type', 'N/A'))}")
-    print(f"  🧪 Soil pH        : {farm_data.get('soilPh', farm_data.get('ph', 6.5))}")
-    print(f"  💧 Soil Moisture  : {farm_data.get('soilMoisture', farm_data.get('soil_moisture', 0))} %")
-    print(f"  🍂 Organic Carbon : {farm_data.get('organicCarbon', farm_data.get('organic_carbon', 0))} %")
-    print(f"  🌿 Nitrogen       : {farm_data.get('nitrogen', 0)} kg/ha")
-    print(f"  🧬 Phosphorus     : {farm_data.get('phosphorus', 0)} kg/ha")
-    print(f"  ⚗️  Potassium      : {farm_data.get('potassium', 0)} kg/ha")
-    print(f"  💰 Budget         : ₹{farm_data.get('budget', 0)}")
-    print("-" * 55)
-
-    recommendations = recommender.predict_crops(farm_data)
+    # Full input dump only at DEBUG — it is the bulk of the per-request logging
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Predicting crops", extra={"farm_id": request.farm_id, "farm_inputs": _farm_inputs(farm_data)})
+
+    try:
+        recommendations = await scheduler.submit(farm_data, timing=timing)
+    except SchedulerOverloaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if recommendations:
-        print(f"[ML ENGINE] ✅ Top {len(recommendations)} Recommended Crops:")
-        for rec in recommendations:
-            print(f"  {rec['rank']}. {rec['crop_name']} {rec.get('icon','🌱')}  "
-                  f"|  Score: {rec['match_score']}%  "
-                  f"|  Band: {rec['confidence_band']}  "
-                  f"|  Est. Yield: {rec.get('estimated_yield_kg', '?')} kg  "
-                  f"|  Profit: ₹{rec['profit_estimate']}")
+        logger.info(
+            "Recommended %s for farm_id=%s",
+            ", ".join(f"{rec['crop_name']} ({rec['match_score']}%)" for rec in recommendations),
+            request.farm_id,
+            extra={"farm_id": request.farm_id, "crops": [rec["crop_name"] for rec in recommendations]},
+        )
     else:
-        print("[ML ENGINE] ⚠️  No recommendations returned.")
-    print("=" * 55 + "\n")
+        logger.warning("No recommendations returned for farm_id=%s", request.farm_id)
 
     # Mark farmer as no longer new after first recommendation
     farmer_id = farm_data.get("farmer_id")
     if farmer_id:
         farm_service.mark_farmer_active(farmer_id)
 
-    return {"recommendations": recommendations, "status": "success"}
+    body = {"recommendations": recommendations, "status": "success"}
+    if timing is not None:
+        _attach_timing(response, body, timing, started)
+    return body
+
+
+@router.post("/recommend/batch")
+async def get_batch_recommendations(
+    request: BatchRecommendRequest,
+    response: Response,
+    x_debug_timing: Optional[str] = Header(None, alias=DEBUG_TIMING_HEADER),
+):
+    """
+    Score many farms in one call (co-operative onboarding drives).
+    Accepts saved farm_ids and/or inline farm payloads; all farms share a
+    single model inference pass, then the filter engine runs per farm.
+    With X-Debug-Timing: 1 the response includes stage timings summed over the batch.
+    """
+    started = time.perf_counter()
+    total = len(request.farm_ids) + len(request.farms)
+    if total == 0:
+        raise HTTPException(status_code=400, detail="Provide farm_ids or farms")
+    if total > MAX_BATCH_FARMS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FARMS} farms per batch")
+    top_k = max(1, request.top_k or 3)
+    _require_model()
+
+    # One query for every saved farm, off the event loop
+    saved = await asyncio.to_thread(farm_service.get_farms_details, request.farm_ids) if request.farm_ids else {}
+    entries = [(farm_id, saved.get(farm_id)) for farm_id in request.farm_ids]  # (farm_id, farm_data or None)
+    for farm in request.farms:
+        entries.append((farm.farm_id, clean_farm_data(farm.model_dump())))
+
+    found = [farm for _, farm in entries if farm]
+    timings = [{} for _ in found] if _debug_timing_enabled(x_debug_timing) else None
+    scored = iter(await scheduler.run_batch(found, top_k=top_k, timings=timings))
+
+    results = []
+    farmer_ids = []
+    for farm_id, farm_data in entries:
+        if not farm_data:
+            results.append({"farm_id": farm_id, "recommendations": [], "status": "no_data"})
+            continue
+        results.append({"farm_id": farm_id, "recommendations": next(scored), "status": "success"})
+        if farm_data.get("farmer_id"):
+            farmer_ids.append(farm_data["farmer_id"])
+
+    # Mark every farmer in the batch as no longer new with one UPDATE
+    if farmer_ids:
+        await asyncio.to_thread(farm_service.mark_farmers_active, farmer_ids)
+
+    logger.info("Batch scored %d/%d farms", len(found), total)
+    body = {"results": results, "count": len(results), "status": "success"}
+    if timings is not None:
+        # Per-farm stages summed; inference ran once for the whole batch
+        timing = {"farms": len(found)}
+        for t in timings:
+            for key, value in t.items():
+                if key.endswith("_ms") and key != "inference_ms":
+                    timing[key] = round(timing.get(key, 0.0) + value, 4)
+        timing["inference_ms"] = max((t.get("inference_ms", 0.0) for t in timings), default=0.0)
+        _attach_timing(response, body, timing, started)
+    return body
+
+
+@router.get("/metrics")
+async def get_ml_metrics():
+    """
+    Served model version, result-cache counters, micro-batching queue stats and
+    per-stage latency histograms (features, inference, floor, filter, output, ...).
+    """
+    return {
+        "model_ready":     recommender.ready,
+        "model_version":   recommender.model_version,
+        "serving_model":   recommender.serving_stats(),
+        "result_cache":    recommender.cache_stats(),
+        "inference_queue": scheduler.stats(),
+        "stage_latency":   recommender.stage_metrics.snapshot(),
+    }
+
+
+@router.get("/admin/retrain")
+async def get_retrain_status(x_admin_token: Optional[str] = Header(None)):
+    """State of the background retrain job: current run, recent runs with duration and outcome, next scheduled run."""
+    _require_admin(x_admin_token)
+    return retrain_job.status()
+
+
+@router.post("/admin/retrain", status_code=202)
+async def trigger_retrain(full: bool = Query(False, description="Full refit instead of an incremental update"),
+                          x_admin_token: Optional[str] = Header(None)):
+    """Start a retrain now in the background; poll GET /admin/retrain for the result."""
+    _require_admin(x_admin_token)
+    try:
+        retrain_job.start(full=full, trigger="manual")
+    except RetrainAlreadyRunning as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"started": True, "mode": "full" if full else "incremental"}
 
 
 @router.get("/crop-details")
 async def get_crop_details(crop: str = Query(..., description="Comma-separated crop names")):
     """
     Returns growth duration, yield, and cost data for crops.
-    Data sourced from crops_merged.csv via RecommendationService.merged_df.
+    Data sourced from crops_merged.csv via the shared crop catalog.
     """
     crop_names = [c.strip() for c in crop.split(",") if c.strip()]
     details = recommender.get_crop_details(crop_names)
@@ -0,0 +1,191 @@
+# app/services/crop_catalog.py
+# In-memory crop catalog built once from crops_merged.csv
+# Shared by RecommendationService and MandiService
+
+import logging
+import os
+import math
+import pandas as pd
+from dataclasses import dataclass
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# ── File paths ────────────────────────────────────────────────────────────────
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+MERGED_PATH  = os.path.join(PROJECT_ROOT, "dataset", "crops_merged.csv")
+
+
+def normalize_crop_name(name) -> str:
+    """Catalog key for a crop name: trimmed + lowercase."""
+    return str(name).strip().lower()
+
+
+def _float(value, default: float = math.nan) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _text(value) -> str:
+    return "" if pd.isna(value) else str(value).strip()
+
+
+def _split_set(value) -> frozenset:
+    """'Sandy loam|Loamy' → frozenset({'sandy loam', 'loamy'})"""
+    return frozenset(x.strip().lower() for x in _text(value).split("|") if x.strip())
+
+
+@dataclass(frozen=True)
+class CropRecord:
+    """One row of crops_merged.csv with values parsed and averages precomputed."""
+    crop_id: int
+    name: str
+    botanical_name: str
+    category: str
+    rotation_suitability_score: float
+    soil_restoration_index: float
+    ideal_soil_type: str
+    soil_types: frozenset
+    ph_min: float
+    ph_max: float
+    soil_moisture_min: float
+    soil_moisture_max: float
+    organic_carbon_min: float
+    organic_carbon_max: float
+    n_requirement: str          # lowercase: "low" / "medium" / "high"
+    p_requirement: str
+    k_requirement: str
+    rotation_restrictions: frozenset
+    temp_min_c: float
+    temp_max_c: float
+    rainfall_min_mm: float
+    rainfall_max_mm: float
+    humidity_min: float
+    humidity_max: float
+    climate_zone: str
+    yield_min: float
+    yield_max: float
+    cost_min: float
+    cost_max: float
+    price_min: float
+    price_max: float
+    yield_avg: float
+    cost_avg: float
+    price_avg: float
+    growth_days_min: Optional[int] = None
+    growth_days_max: Optional[int] = None
+
+    @classmethod
+    def from_row(cls, r: dict) -> "CropRecord":
+        yield_min, yield_max = _float(r.get("yield_min_per_acre")), _float(r.get("yield_max_per_acre"))
+        cost_min,  cost_max  = _float(r.get("cost_of_cultivation_min")), _float(r.get("cost_of_cultivation_max"))
+        price_min, price_max = _float(r.get("expected_market_price_min")), _float(r.get("expected_market_price_max"))
+        gmin, gmax = _float(r.get("growth_duration_days_min")), _float(r.get("growth_duration_days_max"))
+        return cls(
+            crop_id=int(_float(r.get("crop_id"), 0)),
+            name=_text(r.get("crop_name")),
+            botanical_name=_text(r.get("botanical_name")),
+            category=_text(r.get("crop_category")),
+            rotation_suitability_score=_float(r.get("rotation_suitability_score")),
+            soil_restoration_index=_float(r.get("soil_restoration_index"), 0.0),
+            ideal_soil_type=_text(r.get("ideal_soil_type")),
+            soil_types=_split_set(r.get("ideal_soil_type")),
+            ph_min=_float(r.get("ph_min")),
+            ph_max=_float(r.get("ph_max")),
+            soil_moisture_min=_float(r.get("soil_moisture_min")),
+            soil_moisture_max=_float(r.get("soil_moisture_max")),
+            organic_carbon_min=_float(r.get("organic_carbon_min")),
+            organic_carbon_max=_float(r.get("organic_carbon_max")),
+            n_requirement=_text(r.get("n_requirement")).lower(),
+            p_requirement=_text(r.get("p_requirement")).lower(),
+            k_requirement=_text(r.get("k_requirement")).lower(),
+            rotation_restrictions=_split_set(r.get("previous_crop_restrictions")),
+            temp_min_c=_float(r.get("temp_min_c")),
+            temp_max_c=_float(r.get("temp_max_c")),
+            rainfall_min_mm=_float(r.get("annual_rainfall_min_mm")),
+            rainfall_max_mm=_float(r.get("annual_rainfall_max_mm")),
+            humidity_min=_float(r.get("humidity_min")),
+            humidity_max=_float(r.get("humidity_max")),
+            climate_zone=_text(r.get("climate_zone")),
+            yield_min=yield_min,
+            yield_max=yield_max,
+            cost_min=cost_min,
+            cost_max=cost_max,
+            price_min=price_min,
+            price_max=price_max,
+            yield_avg=(yield_min + yield_max) / 2,
+            cost_avg=(cost_min + cost_max) / 2,
+            price_avg=(price_min + price_max) / 2,
+            growth_days_min=None if math.isnan(gmin) else int(gmin),
+            growth_days_max=None if math.isnan(gmax) else int(gmax),
+        )
+
+
+class CropCatalog:
+    """Crop records keyed by normalized name, in CSV order."""
+
+    def __init__(self, records: list):
+        self._records = list(records)
+        self._by_name = {}
+        for rec in self._records:
+            # First occurrence wins, matching the old row.iloc[0] lookups
+            self._by_name.setdefault(normalize_crop_name(rec.name), rec)
+
+    @classmethod
+    def from_csv(cls, path: str = MERGED_PATH) -> "CropCatalog":
+        df = pd.read_csv(path)
+        df = df[df["crop_name"].notna()]
+        return cls(CropRecord.from_row(r) for r in df.to_dict("records"))
+
+    def get(self, name) -> Optional[CropRecord]:
+        return self._by_name.get(normalize_crop_name(name))
+
+    def __contains__(self, name) -> bool:
+        return normalize_crop_name(name) in self._by_name
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def names(self, category: Optional[str] = None) -> list[str]:
+        """Unique crop names in CSV order, optionally filtered by crop_category."""
+        seen, names = set(), []
+        for rec in self._records:
+            if category and rec.category.lower() != category.lower():
+                continue
+            key = normalize_crop_name(rec.name)
+            if key not in seen:
+                seen.add(key)
+                names.append(rec.name)
+        return names
+
+
+# Singleton instance
+_catalog = None
+
+def get_crop_catalog() -> CropCatalog:
+    """Get the shared crop catalog, loading crops_merged.csv on first use."""
+    global _catalog
+    if _catalog is None:
+        try:
+            _catalog = CropCatalog.from_csv(MERGED_PATH)
+            logger.info(f"crops_merged.csv loaded ({len(_catalog)} crops)")
+        except Exception as e:
+            logger.warning(f"Could not read crops_merged.csv: {e}")
+            _catalog = CropCatalog([])
+    return _catalog
+
+
+def reload_crop_catalog() -> CropCatalog:
+    """Re-read crops_merged.csv (on model hot-swap); keeps the old catalog on failure."""
+    global _catalog
+    try:
+        _catalog = CropCatalog.from_csv(MERGED_PATH)
+        logger.info(f"crops_merged.csv reloaded ({len(_catalog)} crops)")
+    except Exception as e:
+        logger.warning(f"Reload failed, keeping previous catalog: {e}")
+    return get_crop_catalog()
@@ -1,9 +1,12 @@
 # app/services/farm_service.py
 # Persists farm submissions to MySQL farm_data table
 
+import logging
 import json
 from app.database import get_connection
 
+logger = logging.getLogger(__name__)
+
 
 class FarmService:
 
@@ -28,9 +31,9 @@ class FarmService:
             conn.commit()
             cur.close()
             conn.close()
-            print(f"[DB] ✅ Saved farm_data for farm_id={farm_id} farmer_id={farmer_id}")
+            logger.info(f"Saved farm_data for farm_id={farm_id} farmer_id={farmer_id}")
         except Exception as e:
-            print(f"[DB] ❌ Could not save farm data ({type(e).__name__}): {e}")
+            logger.error(f"Could not save farm data ({type(e).__name__}): {e}")
             raise  # surface the error to the router so it's not silently swallowed
 
         return {**farm_data, "farm_id": farm_id}
@@ -53,9 +56,35 @@ class FarmService:
             if row:
                 return json.loads(row[0])
         except Exception as e:
-            print(f"[DB] ❌ Could not retrieve farm data: {e}")
+            logger.error(f"Could not retrieve farm data: {e}")
         return None
 
+    def get_farms_details(self, farm_ids: list) -> dict:
+        """
+        Latest farm details for many farm_ids in one query.
+        Returns {farm_id: farm_data}; ids with no data are left out.
+        """
+        farm_ids = list(dict.fromkeys(farm_ids))
+        if not farm_ids:
+            return {}
+        farms = {}
+        try:
+            conn = get_connection()
+            cur = conn.cursor()
+            fmt = ",".join(["%s"] * len(farm_ids))
+            cur.execute(
+                f"SELECT farm_id, data_json FROM farm_data WHERE farm_id IN ({fmt}) ORDER BY submitted_at ASC, id ASC",
+                farm_ids,
+            )
+            for farm_id, data_json in cur.fetchall():
+                farms[farm_id] = data_json  # later rows win, as in get_farm_details
+            cur.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f"Could not retrieve farm data: {e}")
+            return {}
+        return {farm_id: json.loads(data_json) for farm_id, data_json in farms.items()}
+
     def save_farmer_profile(self, farmer: dict) -> dict:
         """
         Upserts a farmer profile into the farmers table.
@@ -88,9 +117,9 @@ class FarmService:
             conn.commit()
             cur.close()
             conn.close()
-            print(f"[DB] ✅ Farmer profile saved: {farmer.get('phone')}")
+            logger.info(f"Farmer profile saved: {farmer.get('phone')}")
         except Exception as e:
-            print(f"[DB] ❌ Could not save farmer profile: {e}")
+            logger.error(f"Could not save farmer profile: {e}")
             raise
         return farmer
 
@@ -104,7 +133,7 @@ class FarmService:
             conn.close()
             return row
         except Exception as e:
-            print(f"[DB] ❌ get_farmer_by_phone error: {e}")
+            logger.error(f"get_farmer_by_phone error: {e}")
         return None
 
     def get_farmer_by_id(self, farmer_id: str) -> dict | None:
@@ -117,7 +146,7 @@ class FarmService:
             conn.close()
             return row
         except Exception as e:
-            print(f"[DB] ❌ get_farmer_by_id error: {e}")
+            logger.error(f"get_farmer_by_id error: {e}")
         return None
 
     def mark_farmer_active(self, farmer_id: str):
@@ -130,7 +159,23 @@ class FarmService:
             cur.close()
             conn.close()
         except Exception as e:
-            print(f"[DB] ❌ mark_farmer_active error: {e}")
+            logger.error(f"mark_farmer_active error: {e}")
+
+    def mark_farmers_active(self, farmer_ids: list):
+        """mark_farmer_active for many farmers in one UPDATE."""
+        farmer_ids = list(dict.fromkeys(farmer_ids))
+        if not farmer_ids:
+            return
+        try:
+            conn = get_connection()
+            cur = conn.cursor()
+            fmt = ",".join(["%s"] * len(farmer_ids))
+            cur.execute(f"UPDATE farmers SET is_new = FALSE WHERE farmer_id IN ({fmt})", farmer_ids)
+            conn.commit()
+            cur.close()
+            conn.close()
+        except Exception as e:
+            logger.error(f"mark_farmers_active error: {e}")
 
 
 farm_service = FarmService()
@@ -0,0 +1,185 @@
+# app/services/filter_engine.py
+# NumPy-backed filter engine — evaluates every layer over all model classes at once
+
+import logging
+import numpy as np
+
+from app.services.crop_catalog import CropCatalog, normalize_crop_name
+
+logger = logging.getLogger(__name__)
+
+# ── Legumes that fix nitrogen into soil ───────────────────────────────────────
+LEGUMES = {"chickpea", "green gram", "black gram", "soybean", "pigeon pea", "lentil", "kidney bean"}
+
+SUITABILITY_FLOOR = 20.0  # % of the top scorer a crop needs to enter the pool
+
+
+class FilterEngine:
+    """
+    Per-class threshold arrays aligned with model.classes_, built once per model.
+
+    run() reproduces the Stage 1 floor + Stage 2 layers of the original
+    per-candidate loop exactly (same multiplier order, same tie-breaking),
+    but as array operations over every class.
+    """
+
+    def __init__(self, crop_names: list, catalog: CropCatalog):
+        self.crop_names = [str(n) for n in crop_names]
+        records = [catalog.get(n) for n in self.crop_names]
+        n = len(records)
+
+        self.records  = records
+        self.known    = np.array([r is not None for r in records], dtype=bool)
+        self.cost_min = np.full(n, np.nan)
+        self.temp_min = np.full(n, np.nan)
+        self.temp_max = np.full(n, np.nan)
+        self.rain_min = np.full(n, np.nan)
+        self.n_high   = np.zeros(n, dtype=bool)
+        self.restores = np.zeros(n, dtype=bool)
+
+        # previous crop (normalized) → mask of classes that restrict it
+        self.restricted_by = {}
+
+        for i, r in enumerate(records):
+            if r is None:
+                continue
+            self.cost_min[i] = r.cost_min
+            self.temp_min[i] = r.temp_min_c
+            self.temp_max[i] = r.temp_max_c
+            self.rain_min[i] = r.rainfall_min_mm
+            self.n_high[i]   = r.n_requirement == "high"
+            self.restores[i] = r.soil_restoration_index >= 0.75
+            for prev in r.rotation_restrictions:
+                self.restricted_by.setdefault(prev, np.zeros(n, dtype=bool))[i] = True
+
+    def run(self, probs, farm_data: dict, farm_size: float, budget: float, top_k: int):
+        """
+        Returns (candidates, limited_options) where candidates are the top_k
+        surviving crops as dicts: crop_name, crop, score and any badges/flags.
+        """
+        p, norm, pool, limited_options = self.floor(probs, top_k)
+        return self.filter(p, norm, pool, farm_data, farm_size, budget, top_k), limited_options
+
+    def floor(self, probs, top_k: int):
+        """
+        Stage 1: 20% suitability floor.
+        Returns (p, norm, pool, limited_options) for filter().
+        """
+        p = np.asarray(probs, dtype=np.float64)
+        n = len(p)
+
+        # Normalise relative to the TOP scorer. Python round() keeps the exact
+        # decimal rounding of the original per-crop path.
+        top_prob = p.max() if n else 1.0
+        norm = np.array([round(x, 1) for x in (p / top_prob * 100).tolist()])
+
+        pool = norm >= SUITABILITY_FLOOR
+        limited_options = int(pool.sum()) < top_k
+        if limited_options:
+            # Fallback: take the top scorers regardless — flag so frontend knows
+            order = np.argsort(-p, kind="stable")[:max(top_k * 3, 10)]
+            pool = np.zeros(n, dtype=bool)
+            pool[order] = True
+            logger.debug("Limited options — fewer than %d crops above 20%% floor", top_k)
+        pool &= self.known
+        return p, norm, pool, limited_options
+
+    def filter(self, p, norm, pool, farm_data: dict, farm_size: float, budget: float, top_k: int) -> list:
+        """Stage 2: Filter Engine layers (applied in the original order) + top K."""
+        n = len(p)
+        score   = norm.copy()
+        removed = np.zeros(n, dtype=bool)
+
+        # Layer 1 — Budget
+        min_cost = self.cost_min * farm_size
+        with np.errstate(invalid="ignore"):
+            over_pct = (min_cost - budget) / budget if budget > 0 else np.zeros(n)
+            demote   = (over_pct > 0) & (over_pct <= 0.40)
+            far_over = over_pct > 0.40
+        budget_drop = pool & far_over & (score < 65.0)
+        removed |= budget_drop
+        score *= np.where(demote, 0.75, np.where(far_over, 0.60, 1.0))
+
+        # Layer 2 — Weather penalty (temperature, then rainfall)
+        temp_delta = None
+        try:
+            farm_temp = float(farm_data.get("temperature", 25))
+            temp_delta = np.where(farm_temp < self.temp_min, self.temp_min - farm_temp,
+                                  np.where(farm_temp > self.temp_max, farm_temp - self.temp_max, 0.0))
+            temp_drop = pool & ~removed & (temp_delta > 10)
+            removed |= temp_drop
+            score *= np.where(temp_delta > 5, 0.60, np.where(temp_delta > 0, 0.85, 1.0))
+        except (TypeError, ValueError):
+            temp_drop = np.zeros(n, dtype=bool)
+
+        deficit = None
+        try:
+            farm_rain = float(farm_data.get("rainfall", 800))
+            short = (farm_rain < self.rain_min) & (self.rain_min > 0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                deficit = np.where(short, (self.rain_min - farm_rain) / self.rain_min, 0.0)
+            rain_drop = pool & ~removed & (deficit > 0.40)
+            removed |= rain_drop
+            score *= np.where(deficit > 0.20, 0.80, 1.0)
+        except (TypeError, ValueError):
+            rain_drop = np.zeros(n, dtype=bool)
+
+        # Layer 3a — Rotation restriction penalty
+        prev_raw  = farm_data.get("previousCrop", "")
+        prev_crop = normalize_crop_name(prev_raw)
+        restricted = self.restricted_by.get(prev_crop) if prev_crop else None
+        if restricted is not None:
+            score *= np.where(restricted, 0.50, 1.0)
+
+        # Layer 3b — Legume nitrogen bonus
+        legume = prev_crop in LEGUMES
+        if legume:
+            score *= np.where(self.n_high, 1.20, 1.0)
+
+        # Layer 3c — Soil restoration bonus
+        score *= np.where(self.restores, 1.05, 1.0)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            for i in np.flatnonzero(budget_drop):
+                logger.debug("Budget hard-remove: %s (score %.1f%%, cost ₹%s vs budget ₹%s)",
+                             self.crop_names[i], norm[i], f"{int(min_cost[i]):,}", f"{int(budget):,}")
+            for i in np.flatnonzero(temp_drop):
+                logger.debug("Weather hard-remove: %s (temp delta %.1f°C)", self.crop_names[i], temp_delta[i])
+            for i in np.flatnonzero(rain_drop):
+                logger.debug("Rainfall hard-remove: %s (deficit %.0f%%)", self.crop_names[i], deficit[i] * 100)
+
+        # ── Top K: partial sort, ties broken by raw probability then class ────
+        alive = np.flatnonzero(pool & ~removed)
+        if len(alive) > top_k:
+            kth = np.partition(-score[alive], top_k - 1)[top_k - 1]
+            alive = alive[-score[alive] <= kth]
+        alive = alive[np.lexsort((alive, -p[alive], -score[alive]))][:top_k]
+
+        candidates = []
+        for i in alive:
+            c = {"crop_name": self.crop_names[i], "crop": self.records[i], "score": float(score[i])}
+
+            if demote[i]:
+                c["over_budget_badge"] = f"Over budget by ~{int(over_pct[i]*100)}%"
+            elif far_over[i]:
+                c["over_budget_badge"] = f"Well over budget — cost ≈ ₹{int(min_cost[i]):,}"
+
+            badges = []
+            if temp_delta is not None and temp_delta[i] > 5:
+                badges.append(f"High heat stress ({temp_delta[i]:.0f}°C outside range)")
+            elif temp_delta is not None and temp_delta[i] > 0:
+                badges.append(f"Mild heat stress ({temp_delta[i]:.0f}°C outside range)")
+            if deficit is not None and deficit[i] > 0.20:
+                badges.append(f"Rainfall deficit — needs {int(self.rain_min[i])}mm, you have {int(farm_rain)}mm")
+            if badges:
+                c["weather_badge"] = "; ".join(badges)
+
+            if restricted is not None and restricted[i]:
+                c["rotation_badge"] = f"Caution: Soil may carry residue from your previous {prev_raw} crop"
+            if legume and self.n_high[i]:
+                c["legume_bonus"] = True
+            if self.restores[i]:
+                c["restoration_bonus"] = True
+            candidates.append(c)
+
+        return candidates
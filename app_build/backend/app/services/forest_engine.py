@@ -0,0 +1,164 @@
+# app/services/forest_engine.py
+# Array-based RandomForest inference — the fitted forest flattened into NumPy node arrays
+
+import joblib
+import numpy as np
+from sklearn.base import is_regressor
+
+# Arrays persisted by save() / restored by load(), in constructor order
+_STATE_ARRAYS = ("feature", "threshold", "left", "right", "missing_left",
+                 "leaf_slot", "leaf_values", "roots")
+
+
+class FlatForest:
+    """
+    A fitted sklearn RandomForestClassifier flattened into contiguous arrays.
+    A multi-output RandomForestRegressor trained on class probabilities (the
+    distilled student model) flattens the same way, given the teacher's classes.
+
+    All trees share one node index space:
+      feature / threshold      split of each internal node
+      left / right             global child indices (leaves point to themselves)
+      missing_left             where NaN inputs go (mirrors sklearn)
+      leaf_slot                row into leaf_values for leaf nodes, -1 otherwise
+      leaf_values              per-leaf class distribution, already normalised
+
+    predict_proba() walks every tree in lockstep for a batch of rows: each step
+    advances all unfinished (row, tree) cursors one level. Tree outputs are then
+    summed in estimator order and divided by n_trees, the same arithmetic
+    sklearn uses, so probabilities match model.predict_proba exactly.
+    """
+
+    def __init__(self, feature, threshold, left, right, missing_left,
+                 leaf_slot, leaf_values, roots, max_depth, classes):
+        self.feature      = feature
+        self.threshold    = threshold
+        self.left         = left
+        self.right        = right
+        self.missing_left = missing_left
+        self.leaf_slot    = leaf_slot
+        self.leaf_values  = leaf_values
+        self.roots        = roots
+        self.max_depth    = int(max_depth)
+        self.classes_     = classes
+        self.n_trees      = len(roots)
+        self.n_classes    = leaf_values.shape[1]
+
+    @classmethod
+    def from_sklearn(cls, model, classes=None) -> "FlatForest":
+        regressor = is_regressor(model)
+        if regressor and classes is None:
+            raise ValueError("classes are required to flatten a probability regressor")
+        features, thresholds, lefts, rights, missing = [], [], [], [], []
+        slots, values, roots = [], [], []
+        offset, n_leaves, max_depth = 0, 0, 0
+
+        for est in model.estimators_:
+            t = est.tree_
+            n = t.node_count
+            is_leaf = t.children_left == -1
+            idx = np.arange(n)
+
+            features.append(np.where(is_leaf, 0, t.feature))
+            thresholds.append(np.where(is_leaf, 0.0, t.threshold))
+            lefts.append(np.where(is_leaf, idx, t.children_left) + offset)
+            rights.append(np.where(is_leaf, idx, t.children_right) + offset)
+            mgl = getattr(t, "missing_go_to_left", None)
+            missing.append(np.zeros(n, dtype=bool) if mgl is None else mgl.astype(bool))
+
+            # Same normalisation as DecisionTreeClassifier.predict_proba; a
+            # regressor's leaves hold one mean probability per output instead
+            leaf_vals = t.value[is_leaf][:, :, 0] if regressor else t.value[is_leaf][:, 0, :]
+            normalizer = leaf_vals.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(leaf_vals / normalizer)
+
+            slot = np.full(n, -1, dtype=np.int64)
+            slot[is_leaf] = np.arange(n_leaves, n_leaves + int(is_leaf.sum()))
+            slots.append(slot)
+
+            roots.append(offset)
+            offset += n
+            n_leaves += int(is_leaf.sum())
+            max_depth = max(max_depth, t.max_depth)
+
+        return cls(
+            feature=np.ascontiguousarray(np.concatenate(features), dtype=np.intp),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds), dtype=np.float64),
+            left=np.ascontiguousarray(np.concatenate(lefts), dtype=np.intp),
+            right=np.ascontiguousarray(np.concatenate(rights), dtype=np.intp),
+            missing_left=np.ascontiguousarray(np.concatenate(missing)),
+            leaf_slot=np.ascontiguousarray(np.concatenate(slots), dtype=np.intp),
+            leaf_values=np.ascontiguousarray(np.concatenate(values), dtype=np.float64),
+            roots=np.asarray(roots, dtype=np.intp),
+            max_depth=max_depth,
+            classes=np.asarray(model.classes_ if classes is None else classes),
+        )
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+
+    def state(self) -> dict:
+        """Plain dict of arrays — what save() writes and the model registry publishes."""
+        state = {name: getattr(self, name) for name in _STATE_ARRAYS}
+        state["max_depth"] = self.max_depth
+        state["classes"]   = self.classes_
+        return state
+
+    @classmethod
+    def from_state(cls, state: dict) -> "FlatForest":
+        return cls(**state)
+
+    def save(self, path: str):
+        # Uncompressed on purpose: load() memory-maps the arrays
+        joblib.dump(self.state(), path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "r") -> "FlatForest":
+        """
+        Memory-mapped by default: the node arrays stay in the OS page cache and
+        are shared by every worker process that maps the same file.
+        """
+        return cls.from_state(joblib.load(path, mmap_mode=mmap_mode))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(a.nbytes for a in (
+            self.feature, self.threshold, self.left, self.right,
+            self.missing_left, self.leaf_slot, self.leaf_values, self.roots,
+        ))
+
+    def apply(self, X) -> np.ndarray:
+        """Global leaf node index for every (row, tree) pair."""
+        # sklearn evaluates splits on float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X[np.newaxis, :]
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+
+        # One cursor per (row, tree); cursors that reach a leaf drop out
+        nodes  = np.tile(self.roots, n_rows)
+        base   = np.repeat(np.arange(n_rows) * n_features, self.n_trees)
+        active = np.arange(nodes.size)
+        cur    = nodes[active]
+
+        for _ in range(self.max_depth):
+            x = flat[base[active] + self.feature[cur]]
+            go_left = (x <= self.threshold[cur]) | (np.isnan(x) & self.missing_left[cur])
+            cur = np.where(go_left, self.left[cur], self.right[cur])
+            nodes[active] = cur
+
+            inner = self.leaf_slot[cur] < 0
+            if not inner.all():
+                active, cur = active[inner], cur[inner]
+                if active.size == 0:
+                    break
+        return nodes.reshape(n_rows, self.n_trees)
+
+    def predict_proba(self, X) -> np.ndarray:
+        slots = self.leaf_slot[self.apply(X)]
+        proba = np.zeros((slots.shape[0], self.n_classes), dtype=np.float64)
+        for t in range(self.n_trees):
+            proba += self.leaf_values[slots[:, t]]
+        proba /= self.n_trees
+        return proba
@@ -0,0 +1,73 @@
+# app/services/http_client.py
+# Shared outbound HTTP client — one pooled httpx.AsyncClient for the whole
+# process (opened and closed by the app lifespan) plus a per-host rate limiter
+
+import time
+import asyncio
+import logging
+from typing import Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _new_client(timeout_s: float = 8.0, max_connections: int = 10,
+                max_keepalive: int = 5, keepalive_expiry_s: float = 30.0) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout_s),
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry_s,
+        ),
+    )
+
+
+def open_http_client(**kwargs) -> httpx.AsyncClient:
+    """Create the shared client (lifespan startup). kwargs as _new_client."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _new_client(**kwargs)
+    return _client
+
+
+async def close_http_client():
+    """Close the shared client and its keep-alive connections (lifespan shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """The shared client — created with defaults if the lifespan hasn't opened it (scripts, shell)."""
+    if _client is None or _client.is_closed:
+        return open_http_client()
+    return _client
+
+
+class HostRateLimiter:
+    """
+    Spaces requests to the same host at least 1 / rate_per_s apart. Each
+    acquire() reserves the next free slot for its host and sleeps until then,
+    so a burst of concurrent callers is released one slot at a time.
+    rate_per_s <= 0 disables limiting.
+    """
+
+    def __init__(self, rate_per_s: float = 5.0):
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self._next_slot: dict = {}
+
+    async def acquire(self, url: str):
+        if not self.interval:
+            return
+        host = urlsplit(url).netloc
+        now = time.monotonic()
+        slot = max(now, self._next_slot.get(host, 0.0))
+        self._next_slot[host] = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
@@ -0,0 +1,209 @@
+# app/services/inference_scheduler.py
+# Micro-batching scheduler — concurrent /recommend calls are queued and scored
+# together in one predict_crops_batch() pass on a dedicated executor thread,
+# with /recommend/batch on an executor of its own
+
+import logging
+import time
+import asyncio
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from app.services.recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+
+class SchedulerOverloaded(Exception):
+    """Raised when the request queue is full; the router answers 503."""
+
+
+@dataclass
+class _Pending:
+    """One queued /recommend request."""
+    farm_data: dict
+    top_k: int
+    future: asyncio.Future
+    enqueued: float                # perf_counter() at submit
+    timing: Optional[dict] = None  # per-request debug timing, if requested
+
+
+class InferenceScheduler:
+    """
+    submit() enqueues one farm and awaits its recommendations. A single
+    collector task waits for a free inference worker, takes the first queued
+    request, keeps gathering until max_batch_size requests are waiting or
+    max_wait_ms has passed, then hands the batch to a flush task on the
+    inference executor — the event loop never blocks on the model. Up to
+    `workers` batches are in flight at once; while all of them are busy,
+    new requests simply form the next batch.
+
+    run_batch() (/recommend/batch, up to hundreds of farms) runs on a
+    separate executor, so a large batch never holds up single requests.
+    """
+
+    def __init__(self, recommender: RecommendationService, max_batch_size: int = 32,
+                 max_wait_ms: float = 5.0, max_queue_depth: int = 1000, workers: int = 1,
+                 batch_workers: int = 1):
+        self.recommender     = recommender
+        self.max_batch_size  = max(1, max_batch_size)
+        self.max_wait_ms     = max(0.0, max_wait_ms)
+        self.max_queue_depth = max(1, max_queue_depth)
+        self.workers         = max(1, workers)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ml-inference")
+        self.batch_executor = ThreadPoolExecutor(max_workers=max(1, batch_workers), thread_name_prefix="ml-batch")
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None  # free inference workers
+        self._flushes: set = set()                        # in-flight flush tasks
+
+        # Metrics
+        self._requests = 0
+        self._batches = 0
+        self._rejected = 0
+        self._largest_batch = 0
+        self._busy_seconds = 0.0
+        self._wait_seconds = 0.0
+
+    # ── Lifecycle ─────────────────────────────────────────────────────────────
+
+    def start(self):
+        """Bind the queue and collector task to the running event loop."""
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue()
+            self._slots = asyncio.Semaphore(self.workers)
+            self._task = asyncio.get_running_loop().create_task(self._collect())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Let batches already on the executor deliver their results
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        # Fail anything still queued rather than leaving callers hanging
+        while self._queue is not None and not self._queue.empty():
+            future = self._queue.get_nowait().future
+            if not future.done():
+                future.set_exception(SchedulerOverloaded("Inference scheduler stopped"))
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.batch_executor.shutdown(wait=False, cancel_futures=True)
+
+    # ── Public API ────────────────────────────────────────────────────────────
+
+    async def submit(self, farm_data: dict, top_k: int = 3, timing: Optional[dict] = None) -> list:
+        """
+        Queue one farm for the next batch and wait for its recommendations.
+        timing: optional dict that receives queue wait and stage times in ms.
+        """
+        self.start()
+        if self._queue.qsize() >= self.max_queue_depth:
+            self._rejected += 1
+            raise SchedulerOverloaded(f"Inference queue full ({self.max_queue_depth} waiting)")
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(_Pending(farm_data, top_k, future, time.perf_counter(), timing))
+        return await future
+
+    async def run_batch(self, farms: list, top_k: int = 3, timings: Optional[list] = None) -> list:
+        """Run an already-batched request (e.g. /recommend/batch) on the batch executor."""
+        return await self._score(self.batch_executor, farms, top_k, timings)
+
+    async def _score(self, executor: ThreadPoolExecutor, farms: list, top_k: int, timings: Optional[list]) -> list:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, self.recommender.predict_crops_batch, farms, top_k, timings,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth":     self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "max_batch_size":  self.max_batch_size,
+            "max_wait_ms":     self.max_wait_ms,
+            "workers":         self.workers,
+            "batches_in_flight": len(self._flushes),
+            "requests":        self._requests,
+            "batches":         self._batches,
+            "rejected":        self._rejected,
+            "avg_batch_size":  round(self._requests / self._batches, 2) if self._batches else 0.0,
+            "largest_batch":   self._largest_batch,
+            "avg_queue_wait_ms": round(self._wait_seconds / self._requests * 1000, 3) if self._requests else 0.0,
+            "avg_batch_ms":    round(self._busy_seconds / self._batches * 1000, 3) if self._batches else 0.0,
+        }
+
+    # ── Collector ─────────────────────────────────────────────────────────────
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        slots = self._slots
+        while True:
+            await slots.acquire()  # released when the flush finishes
+            batch = []
+            try:
+                batch.append(await self._queue.get())
+                deadline = loop.time() + self.max_wait_ms / 1000
+                while len(batch) < self.max_batch_size:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+            except asyncio.CancelledError:
+                slots.release()
+                for item in batch:  # back on the queue, so stop() fails them too
+                    self._queue.put_nowait(item)
+                raise
+            # Anything else already queued rides along, up to the batch size
+            while len(batch) < self.max_batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            task = loop.create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def _flush(self, batch: list):
+        started = time.perf_counter()
+        live = [item for item in batch if not item.future.done()]  # skip callers that went away
+        if not live:
+            return
+
+        # predict_crops_batch takes one top_k, so group by it (almost always 3)
+        groups = {}
+        for item in live:
+            groups.setdefault(item.top_k, []).append(item)
+
+        for item in live:
+            self.recommender.stage_metrics.observe("queue_wait", started - item.enqueued, item.timing)
+            if item.timing is not None:
+                item.timing["batch_size"] = len(live)
+
+        for top_k, items in groups.items():
+            try:
+                results = await self._score(
+                    self.executor, [item.farm_data for item in items], top_k, [item.timing for item in items],
+                )
+            except Exception as e:
+                logger.exception("Batched inference failed (%d requests): %s", len(items), e)
+                for item in items:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                continue
+            for item, recs in zip(items, results):
+                if not item.future.done():
+                    item.future.set_result(recs)
+
+        self._requests += len(live)
+        self._batches += 1
+        self._largest_batch = max(self._largest_batch, len(live))
+        self._wait_seconds += sum(started - item.enqueued for item in live)
+        self._busy_seconds += time.perf_counter() - started
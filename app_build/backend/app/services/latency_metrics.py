@@ -0,0 +1,103 @@
+# app/services/latency_metrics.py
+# Low-overhead latency histograms for the recommendation pipeline stages
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+# Bucket upper bounds in ms: 0.01 ms … ~13 s, each 1.5× the previous
+BUCKET_BOUNDS_MS = tuple(round(0.01 * 1.5 ** i, 4) for i in range(36))
+
+
+class LatencyHistogram:
+    """
+    Fixed-bucket histogram — observe() is a bisect plus three adds under a
+    lock, so it is cheap enough to call several times per request.
+    Percentiles are reported as the upper bound of the bucket they fall in
+    (capped at the observed max).
+    """
+
+    def __init__(self, bounds_ms: tuple = BUCKET_BOUNDS_MS):
+        self.bounds_ms = bounds_ms
+        self._counts = [0] * (len(bounds_ms) + 1)  # last bucket = overflow
+        self._count = 0
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        idx = bisect.bisect_left(self.bounds_ms, ms)
+        with self._lock:
+            self._counts[idx] += 1
+            self._count += 1
+            self._sum_ms += ms
+            if ms > self._max_ms:
+                self._max_ms = ms
+
+    def _percentile(self, counts: list, total: int, max_ms: float, q: float) -> float:
+        target = q * total
+        running = 0
+        for idx, c in enumerate(counts):
+            running += c
+            if running >= target:
+                break
+        bound = self.bounds_ms[idx] if idx < len(self.bounds_ms) else max_ms
+        return round(min(bound, max_ms), 4)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total, sum_ms, max_ms = list(self._counts), self._count, self._sum_ms, self._max_ms
+        if not total:
+            return {"count": 0}
+        return {
+            "count":   total,
+            "mean_ms": round(sum_ms / total, 4),
+            "p50_ms":  self._percentile(counts, total, max_ms, 0.50),
+            "p95_ms":  self._percentile(counts, total, max_ms, 0.95),
+            "p99_ms":  self._percentile(counts, total, max_ms, 0.99),
+            "max_ms":  round(max_ms, 4),
+            # Non-empty buckets only, keyed by upper bound in ms: {"le_0.2278": 12, ...}
+            "buckets": {
+                (f"le_{self.bounds_ms[i]}" if i < len(self.bounds_ms) else "le_inf"): c
+                for i, c in enumerate(counts) if c
+            },
+        }
+
+
+class StageMetrics:
+    """One LatencyHistogram per named stage, created on first use."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def histogram(self, stage: str) -> LatencyHistogram:
+        hist = self._histograms.get(stage)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(stage, LatencyHistogram())
+        return hist
+
+    def observe(self, stage: str, seconds: float, timing: Optional[dict] = None):
+        """Record into the stage histogram and, if given, a per-request timing dict (ms)."""
+        self.histogram(stage).observe(seconds)
+        if timing is not None:
+            timing[f"{stage}_ms"] = round(timing.get(f"{stage}_ms", 0.0) + seconds * 1000, 4)
+
+    @contextmanager
+    def time(self, stage: str, timing: Optional[dict] = None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, timing)
+
+    def snapshot(self) -> dict:
+        return {stage: hist.snapshot() for stage, hist in sorted(self._histograms.items())}
+
+    def reset(self):
+        with self._lock:
+            self._histograms = {}
@@ -1,45 +1,89 @@
 # app/services/mandi_service.py
 # Mandi price service — MySQL persistence + TTL in-memory cache
-# Crop list sourced dynamically from crops_merged.csv
+# Crop list sourced from the shared crop catalog (crops_merged.csv)
 
+import time
+import asyncio
+import logging
 import json
 import httpx
-import pandas as pd
 from typing import Optional
 from datetime import datetime, date
 from cachetools import TTLCache
 
 from app.database import get_connection
+from app.services.crop_catalog import get_crop_catalog
+from app.services.http_client import get_http_client, HostRateLimiter
+from app.services.shared_cache import SharedCache
+from app.services.price_series import PriceSeriesStore, SOURCES
 
-# ── In-memory TTL cache (6 hours per entry) ───────────────────────────────────
-_ttl_cache: TTLCache = TTLCache(maxsize=200, ttl=6 * 60 * 60)
+logger = logging.getLogger(__name__)
 
+# ── In-memory price cache defaults ────────────────────────────────────────────
+CACHE_SIZE       = 500           # keys are crop × state × district × limit
+CACHE_SOFT_TTL_S = 6 * 60 * 60   # served as fresh
+CACHE_HARD_TTL_S = 24 * 60 * 60  # served stale (and revalidated) until this, then evicted
 
-def _crop_list_from_csv() -> list[str]:
-    """Read all crop names from crops_merged.csv at call time."""
-    import os
-    base = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-    path = os.path.join(base, "dataset", "crops_merged.csv")
-    try:
-        df = pd.read_csv(path)
-        return df["crop_name"].dropna().unique().tolist()
-    except Exception as e:
-        print(f"[MANDI] ⚠️  Could not read crops_merged.csv: {e}")
-        return []
+MAX_BULK_PAGES = 200  # safety cap on pages read by one bulk refresh
 
 
 class MandiService:
     """
     Mandi price service with two-layer caching:
-    Layer 1: In-memory TTLCache (6 hr TTL) — fastest
+    Layer 1: In-memory TTLCache (soft 6 hr / hard 24 hr TTL) — fastest
+    Layer 1b: Shared cache tier (app/services/shared_cache.py) — seen by every worker on the host
     Layer 2: MySQL mandi_prices_current table — survives restarts
     External: data.gov.in Agmarknet API — only when DB is stale (> 24 hrs)
+
+    API calls go through the process-wide pooled client (app/services/http_client.py);
+    refresh_all_crops fans out at most refresh_concurrency requests at a time
+    (whole-resource pages, or one request per crop), spaced by a per-host rate limit.
+
+    Cache entries younger than soft_ttl_s are served as-is. Between soft_ttl_s
+    and hard_ttl_s the stale entry is still returned at once while a background
+    lookup replaces it, so only a key that has gone unused past hard_ttl_s
+    costs a request the DB/API round trip. Every result is also published to
+    the shared tier, and a worker missing a key (or holding a stale copy)
+    adopts the shared entry first. refresh_all_crops publishes all crops at
+    once and bumps the tier's generation, which makes every worker drop its
+    in-process copies.
     """
 
-    def __init__(self, api_key: str, resource_id: str, base_url: str):
+    def __init__(self, api_key: str, resource_id: str, base_url: str,
+                 refresh_concurrency: int = 8, rate_limit_per_s: float = 5.0,
+                 refresh_mode: str = "bulk", bulk_page_size: int = 1000,
+                 cache_soft_ttl_s: float = CACHE_SOFT_TTL_S, cache_hard_ttl_s: float = CACHE_HARD_TTL_S,
+                 shared_cache: Optional[SharedCache] = None):
         self.api_key = api_key
         self.resource_id = resource_id
         self.base_url = base_url
+        self.refresh_concurrency = max(1, refresh_concurrency)
+        self.rate_limiter = HostRateLimiter(rate_limit_per_s)
+        self.refresh_mode = refresh_mode if refresh_mode in ("bulk", "per_crop") else "bulk"
+        self.bulk_page_size = max(1, bulk_page_size)
+
+        # Layer 1 — values are (stored_at, result); the TTLCache evicts at the hard TTL
+        self.cache_soft_ttl_s = cache_soft_ttl_s
+        self.cache_hard_ttl_s = max(cache_hard_ttl_s, cache_soft_ttl_s)
+        self._cache = TTLCache(maxsize=CACHE_SIZE, ttl=self.cache_hard_ttl_s)
+        self._stale_served = 0
+        self._revalidations = 0
+
+        # Layer 1b — per-host tier shared with the other workers
+        self.shared_cache = shared_cache or SharedCache()
+        self._shared_generation = self.shared_cache.generation()
+
+        # mandi_price_history held in memory; re-synced when another worker publishes a refresh
+        self.price_series = PriceSeriesStore()
+        self._series_generation = self._shared_generation
+
+        # Single-flight state for get_mandi_prices: cache key → lookup task
+        self._inflight: dict = {}
+        self._waiters: dict = {}   # cache key → requests that joined the lookup in flight
+        self._cache_hits = 0
+        self._lookups = 0
+        self._coalesced = 0
+        self._max_waiters = 0
 
         # Commodity name mapping: our crop names → data.gov.in names
         self.crop_mapping = {
@@ -70,53 +114,148 @@ class MandiService:
         district: Optional[str] = None,
         limit: int = 10,
     ) -> dict:
-        """Return mandi prices for a crop via TTL cache → DB → API."""
-        cache_key = f"{crop.lower()}_{state or 'ALL'}_{district or 'ALL'}"
-
-        # Layer 1: TTL cache
-        if cache_key in _ttl_cache:
-            return _ttl_cache[cache_key]
+        """
+        Return mandi prices for a crop via TTL cache → DB → API. Stale entries
+        are served while a background lookup refreshes them; concurrent misses
+        for the same key share one lookup (single-flight).
+        """
+        cache_key = self._cache_key(crop, state, district, limit)
+
+        # Layer 1: TTL cache, backed by the shared tier (fresh, or stale within the hard TTL)
+        entry = self._cache_get(cache_key)
+        if entry is not None:
+            stored_at, result = entry
+            if time.monotonic() - stored_at < self.cache_soft_ttl_s:
+                self._cache_hits += 1
+            else:
+                self._stale_served += 1
+                if cache_key not in self._inflight:
+                    self._revalidations += 1
+                    self._start_lookup(cache_key, crop, state, district, limit)
+            return result
 
-        # Layer 2: DB (if row < 24 hrs old)
-        db_row = self._db_get_current(crop)
+        # Layers 2-3 run once per key: later misses await the lookup in flight.
+        # The lookup is its own task and every caller awaits it through
+        # shield(), so a disconnecting client cancels only its own wait;
+        # an exception reaches every waiter.
+        flight = self._inflight.get(cache_key)
+        if flight is None:
+            self._lookups += 1
+            flight = self._start_lookup(cache_key, crop, state, district, limit)
+        else:
+            self._coalesced += 1
+            self._waiters[cache_key] += 1
+            self._max_waiters = max(self._max_waiters, self._waiters[cache_key])
+        return await asyncio.shield(flight)
+
+    @staticmethod
+    def _cache_key(crop: str, state: Optional[str], district: Optional[str], limit: int) -> str:
+        return f"{crop.lower()}_{state or 'ALL'}_{district or 'ALL'}_{limit}"
+
+    def _cache_get(self, cache_key: str) -> Optional[tuple]:
+        """
+        (stored_at, result) for a key, stored_at on the monotonic clock. A
+        missing or stale in-process entry is replaced by a newer one from the
+        shared tier; anything past the hard TTL counts as missing.
+        """
+        generation = self.shared_cache.generation()
+        if generation != self._shared_generation:
+            # Another worker published a full refresh — re-read from the shared tier
+            self._cache.clear()
+            self._shared_generation = generation
+
+        now = time.monotonic()
+        entry = self._cache.get(cache_key)
+        if entry is None or now - entry[0] >= self.cache_soft_ttl_s:
+            shared = self.shared_cache.get(cache_key)
+            if shared is not None:
+                stored_at = now - max(0.0, time.time() - shared[0])
+                if entry is None or stored_at > entry[0]:
+                    entry = (stored_at, shared[1])
+                    self._cache[cache_key] = entry
+        if entry is not None and now - entry[0] >= self.cache_hard_ttl_s:
+            return None
+        return entry
+
+    def _cache_put(self, cache_key: str, result: dict):
+        self._cache[cache_key] = (time.monotonic(), result)
+        self.shared_cache.set(cache_key, result, self.cache_hard_ttl_s)
+
+    def _publish_refresh(self, results: dict):
+        """Warm both tiers with a full refresh ({cache_key: result}) and tell the other workers."""
+        now = time.monotonic()
+        for cache_key, result in results.items():
+            self._cache[cache_key] = (now, result)
+        self.shared_cache.set_many(results, self.cache_hard_ttl_s, bump_generation=True)
+        self._shared_generation = self.shared_cache.generation()
+
+    def _start_lookup(self, cache_key: str, crop: str, state: Optional[str],
+                      district: Optional[str], limit: int) -> asyncio.Future:
+        flight = asyncio.ensure_future(self._lookup_prices(cache_key, crop, state, district, limit))
+        self._inflight[cache_key] = flight
+        self._waiters[cache_key] = 0
+        flight.add_done_callback(lambda f: self._end_flight(cache_key, f))
+        return flight
+
+    async def _lookup_prices(self, cache_key: str, crop: str, state: Optional[str],
+                             district: Optional[str], limit: int) -> dict:
+        # Layer 2: DB (if row < 24 hrs old), queried off the event loop
+        db_row = await asyncio.to_thread(self._db_get_current, crop)
         if db_row:
             result = self._db_row_to_response(db_row, crop)
-            _ttl_cache[cache_key] = result
+            self._cache_put(cache_key, result)
             return result
 
         # Layer 3: Live API
         result = await self._fetch_from_api(crop, state, district, limit)
-        _ttl_cache[cache_key] = result
+        self._cache_put(cache_key, result)
         return result
 
+    def _end_flight(self, cache_key: str, flight: asyncio.Future):
+        if self._inflight.get(cache_key) is flight:
+            del self._inflight[cache_key]
+            del self._waiters[cache_key]
+        if not flight.cancelled() and flight.exception() is not None:
+            # Retrieved here so a failure nobody is left waiting for isn't reported as unhandled
+            logger.error(f"Mandi price lookup failed for {cache_key}: {flight.exception()!r}")
+
+    def cache_stats(self) -> dict:
+        """
+        Price cache counters: fresh hits, stale hits (each starts at most one
+        background revalidation), DB/API lookups on a miss and requests that
+        joined a lookup already in flight.
+        """
+        return {
+            "size":                   len(self._cache),
+            "maxsize":                self._cache.maxsize,
+            "soft_ttl_seconds":       self.cache_soft_ttl_s,
+            "hard_ttl_seconds":       self.cache_hard_ttl_s,
+            "hits":                   self._cache_hits,
+            "stale_hits":             self._stale_served,
+            "revalidations":          self._revalidations,
+            "lookups":                self._lookups,
+            "coalesced_waiters":      self._coalesced,
+            "max_waiters_per_lookup": self._max_waiters,
+            "in_flight":              len(self._inflight),
+            "shared":                 self.shared_cache.stats(),
+        }
+
     async def get_price_history(self, crop: str, days: int = 30) -> dict:
-        """Return real accumulated price history from mandi_price_history table, and simulate the rest."""
+        """Return real accumulated price history (in-memory copy of mandi_price_history), and simulate the rest."""
         try:
-            conn = get_connection()
-            cur = conn.cursor(dictionary=True)
-            cur.execute(
-                """
-                SELECT modal_price, min_price, max_price, recorded_date, data_source
-                FROM mandi_price_history
-                WHERE crop_name = %s
-                ORDER BY recorded_date DESC
-                LIMIT %s
-                """,
-                (crop, days),
-            )
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
+            if not self._series_current():
+                await asyncio.to_thread(self.sync_price_history)
+            series = self.price_series.get(crop).tail(days)
 
             history = [
                 {
-                    "date": str(r["recorded_date"]),
-                    "price": float(r["modal_price"] or 0),
-                    "min": float(r["min_price"] or 0),
-                    "max": float(r["max_price"] or 0),
-                    "source": r["data_source"],
+                    "date": str(d),
+                    "price": float(p),
+                    "min": float(lo),
+                    "max": float(hi),
+                    "source": SOURCES[src],
                 }
-                for r in reversed(rows)  # oldest first for chart
+                for d, p, lo, hi, src in zip(*series)  # oldest first for chart
             ]
 
             # SIMULATE MISSING HISTORY FOR CHARTS TO WORK PERFECTLY
@@ -164,37 +303,182 @@ class MandiService:
                 "note": "Historical data combined with simulated trends to ensure market analytics function smoothly."
             }
         except Exception as e:
-            print(f"[MANDI] ❌ get_price_history error: {e}")
+            logger.error(f"get_price_history error: {e}")
             return {"crop": crop, "days": 0, "history": [], "current_avg": 0, "trend": "stable"}
 
+    def _series_current(self) -> bool:
+        """True when the in-memory price history is loaded and no other worker has published a refresh since."""
+        return self.price_series.loaded and self.shared_cache.generation() == self._series_generation
+
+    def sync_price_history(self):
+        """
+        Load mandi_price_history into memory (one bulk query), or pull only the
+        newest rows once loaded. Called at startup and whenever the shared
+        tier's generation moves; a DB error leaves the current copy in place.
+        """
+        generation = self.shared_cache.generation()
+        try:
+            self.price_series.sync()
+            self._series_generation = generation
+        except Exception as e:
+            logger.error(f"Price history sync failed: {e}")
+            if not self.price_series.loaded:
+                raise
+
     async def refresh_all_crops(self):
         """
         Fetches latest prices for all crops from crops_merged.csv.
         Writes to mandi_prices_current (overwrite) and mandi_price_history (append).
         Called at 6:30 AM IST daily and on startup if stale.
+
+        "bulk" mode pages through the whole daily resource and buckets records
+        by commodity locally; "per_crop" sends one filtered request per crop.
+        A failed bulk pull falls back to per_crop.
         """
-        crops = _crop_list_from_csv()
-        print(f"[MANDI] 🔄 Refreshing prices for {len(crops)} crops from crops_merged.csv...")
-        live, fallback = 0, 0
+        crops = get_crop_catalog().names()
+        logger.info(f"Refreshing prices for {len(crops)} crops from crops_merged.csv "
+                    f"({self.refresh_mode}, concurrency {self.refresh_concurrency})...")
+        start = time.perf_counter()
+
+        fetched = None
+        if self.refresh_mode == "bulk":
+            try:
+                fetched, timings = await self._fetch_bulk(crops, limit=10)
+            except httpx.HTTPStatusError as e:
+                # str(e) carries the request URL, api-key included — log the status only
+                logger.warning(f"Bulk Agmarknet pull failed (API HTTP {e.response.status_code}) — falling back to per-crop requests")
+            except Exception as e:
+                logger.warning(f"Bulk Agmarknet pull failed ({type(e).__name__}) — falling back to per-crop requests")
+        if fetched is None:
+            fetched, timings = await self._fetch_per_crop(crops, limit=10)
+        fetch_s = time.perf_counter() - start
 
-        for crop in crops:
-            result = await self._fetch_from_api(crop, state=None, district=None, limit=10)
-            src = "live" if result.get("success") else "fallback"
+        live, fallback = 0, 0
+        rows = []
+        for crop, result in fetched.items():
+            src = "live" if not result.get("error") else "fallback"
             if src == "live":
                 live += 1
             else:
                 fallback += 1
+            rows.append((crop, result, src))
+
+        # mandi_prices_current (overwrite) + mandi_price_history (one row per crop per day)
+        if await asyncio.to_thread(self._db_write_refresh, rows):
+            # On a thread: a sync() in progress holds the store's lock for a whole DB query
+            await asyncio.to_thread(self.price_series.append_day, date.today(), {
+                crop: (result["current_price_avg"], result["price_range"]["min"], result["price_range"]["max"], src)
+                for crop, result, src in rows
+            })
 
-            # Update mandi_prices_current
-            self._db_upsert_current(crop, result, src)
-
-            # Append to mandi_price_history (one row per crop per day)
-            self._db_insert_history(crop, result, src)
-
-            # Warm TTL cache
-            _ttl_cache[f"{crop.lower()}_ALL_ALL"] = result
+        # Warm this worker's cache and publish to the shared tier for the others — after the
+        # DB write, so workers re-syncing their price history on the new generation see today's rows
+        self._publish_refresh({self._cache_key(crop, None, None, 10): result for crop, result in fetched.items()})
+        if self.price_series.loaded:
+            self._series_generation = self._shared_generation
+
+        total_s = time.perf_counter() - start
+        slowest = sorted(timings.items(), key=lambda kv: kv[1], reverse=True)[:5]
+        logger.info(
+            f"Refresh complete — Live: {live} | Fallback: {fallback} | Total: {live + fallback} "
+            f"in {total_s:.1f}s (fetch {fetch_s:.1f}s, {len(timings)} requests) — slowest: "
+            + ", ".join(f"{name} {secs:.2f}s" for name, secs in slowest),
+            extra={"fetch_timings_s": {name: round(secs, 3) for name, secs in timings.items()}},
+        )
+
+    async def _fetch_per_crop(self, crops: list, limit: int) -> tuple:
+        """One filtered API request per crop, refresh_concurrency at a time → ({crop: result}, {crop: seconds})."""
+        semaphore = asyncio.Semaphore(self.refresh_concurrency)
+
+        async def fetch(crop: str) -> tuple:
+            async with semaphore:
+                t0 = time.perf_counter()
+                result = await self._fetch_from_api(crop, state=None, district=None, limit=limit)
+                return crop, result, time.perf_counter() - t0
+
+        fetched = await asyncio.gather(*(fetch(crop) for crop in crops))
+        return {crop: result for crop, result, _ in fetched}, {crop: secs for crop, _, secs in fetched}
+
+    async def _fetch_bulk(self, crops: list, limit: int) -> tuple:
+        """
+        Page through the whole resource (bulk_page_size records per request)
+        and bucket records by commodity → ({crop: result}, {"page@offset": seconds}).
+        The first page gives the total; the rest are fetched concurrently. Each
+        page is bucketed as it arrives and then dropped, so only matching
+        records are kept. A crop keeps its first `limit` records in resource
+        order, as a filtered request with that limit would return.
+        Raises on the first failed page, after cancelling the others.
+        """
+        # Agmarknet commodity name (normalised) → our crops that map to it
+        wanted = {}
+        for crop in crops:
+            wanted.setdefault(self._commodity(crop).strip().lower(), []).append(crop)
+        buckets = {crop: [] for crop in crops}  # crop → [(position, record)]
+        timings = {}
+        page_size = self.bulk_page_size
+
+        def bucket(offset: int, records: list):
+            for i, r in enumerate(records):
+                for crop in wanted.get(str(r.get("commodity", "")).strip().lower(), ()):
+                    buckets[crop].append((offset + i, r))
+
+        async def fetch_page(offset: int) -> list:
+            t0 = time.perf_counter()
+            data = await self._api_get({"limit": page_size, "offset": offset})
+            timings[f"page@{offset}"] = time.perf_counter() - t0
+            records = data.get("records", [])
+            bucket(offset, records)
+            return data
+
+        first = await fetch_page(0)
+        try:
+            total = int(first.get("total"))
+        except (TypeError, ValueError):
+            total = None
+
+        if total is not None:
+            offsets = list(range(page_size, min(total, page_size * MAX_BULK_PAGES), page_size))
+            semaphore = asyncio.Semaphore(self.refresh_concurrency)
+
+            async def bounded(offset: int):
+                async with semaphore:
+                    await fetch_page(offset)
+
+            tasks = [asyncio.ensure_future(bounded(offset)) for offset in offsets]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # One failed page fails the pull — stop the pages still queued or in flight
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        else:
+            # No total reported — read sequentially until a short page
+            offset, page = 0, first
+            while len(page.get("records", [])) == page_size and offset // page_size < MAX_BULK_PAGES - 1:
+                offset += page_size
+                page = await fetch_page(offset)
+
+        results = {}
+        for crop, found in buckets.items():
+            found.sort(key=lambda item: item[0])
+            results[crop] = self._parse_response({"records": [r for _, r in found[:limit]]}, crop)
+        return results, timings
+
+    async def _api_get(self, params: dict) -> dict:
+        """GET the Agmarknet resource through the shared client and rate limiter; raises on failure."""
+        url = f"{self.base_url}/{self.resource_id}"
+        await self.rate_limiter.acquire(url)
+        response = await get_http_client().get(
+            url, params={"api-key": self.api_key, "format": "json", **params}
+        )
+        response.raise_for_status()
+        return response.json()
 
-        print(f"[MANDI] ✅ Refresh complete — Live: {live} | Fallback: {fallback} | Total: {live + fallback}")
+    def _commodity(self, crop: str) -> str:
+        """Our crop name → data.gov.in commodity name."""
+        return self.crop_mapping.get(crop.lower(), crop.title())
 
     def is_cache_stale(self) -> bool:
         """Returns True if mandi_prices_current hasn't been updated today."""
@@ -215,7 +499,7 @@ class MandiService:
 
     # ── Harvest Price Prediction ───────────────────────────────────────────────
 
-    def predict_harvest_price(self, crop: str, growth_days: int, current_price: float) -> dict:
+    async def predict_harvest_price(self, crop: str, growth_days: int, current_price: float) -> dict:
         """
         Predicts market price at harvest using linear trend from mandi_price_history.
         Slope = (latest_price - oldest_price) / num_days_of_history
@@ -225,22 +509,13 @@ class MandiService:
         Typical seasonal trends are 5-15% over a growth season.
         """
         try:
-            conn = get_connection()
-            cur = conn.cursor()
-            cur.execute(
-                """
-                SELECT modal_price FROM mandi_price_history
-                WHERE crop_name = %s ORDER BY recorded_date ASC LIMIT 60
-                """,
-                (crop,),
-            )
-            rows = cur.fetchall()
-            cur.close()
-            conn.close()
-            prices = [float(r[0]) for r in rows if r[0]]
+            if not self._series_current():
+                await asyncio.to_thread(self.sync_price_history)
+            modal = self.price_series.get(crop).head(60).modal
+            prices = modal[modal > 0]
 
             if len(prices) >= 2:
-                slope = (prices[-1] - prices[0]) / len(prices)
+                slope = float(prices[-1] - prices[0]) / len(prices)
                 predicted = current_price + (slope * growth_days)
                 
                 # ✅ FIX: Bound predictions to realistic range for agricultural commodities
@@ -267,7 +542,7 @@ class MandiService:
                 "history_points_used": len(prices),
             }
         except Exception as e:
-            print(f"[MANDI] ❌ predict_harvest_price error: {e}")
+            logger.error(f"predict_harvest_price error: {e}")
             return {
                 "crop": crop,
                 "current_price": current_price,
@@ -282,13 +557,9 @@ class MandiService:
     async def _fetch_from_api(
         self, crop: str, state: Optional[str], district: Optional[str], limit: int = 10
     ) -> dict:
-        commodity = self.crop_mapping.get(crop.lower(), crop.title())
-        url = f"{self.base_url}/{self.resource_id}"
         params = {
-            "api-key": self.api_key,
-            "format": "json",
             "limit": limit,
-            "filters[commodity]": commodity,
+            "filters[commodity]": self._commodity(crop),
         }
         if state:
             params["filters[state]"] = state
@@ -296,11 +567,8 @@ class MandiService:
             params["filters[district]"] = district
 
         try:
-            async with httpx.AsyncClient(timeout=8.0) as client:
-                response = await client.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                return self._parse_response(data, crop)
+            data = await self._api_get(params)
+            return self._parse_response(data, crop)
         except httpx.HTTPStatusError as e:
             return self._fallback(crop, f"API HTTP {e.response.status_code}")
         except httpx.RequestError as e:
@@ -399,7 +667,7 @@ class MandiService:
             conn.close()
             return row
         except Exception as e:
-            print(f"[MANDI] DB read error: {e}")
+            logger.error(f"DB read error: {e}")
         return None
 
     def _db_row_to_response(self, row: dict, crop: str) -> dict:
@@ -420,73 +688,85 @@ class MandiService:
             "total_mandis_found": len(mandis),
         }
 
-    def _db_upsert_current(self, crop: str, result: dict, source: str):
+    def _db_write_refresh(self, rows: list) -> bool:
+        """
+        Bulk-write one refresh: rows is [(crop, result, source)]. One
+        connection, one transaction, two multi-row statements — the current
+        prices are upserted, and history rows already recorded today are left
+        alone by the uq_crop_date key. Returns False if the transaction failed.
+        """
+        if not rows:
+            return False
+        fetched_at = datetime.now().replace(microsecond=0)
+        today = date.today().isoformat()
+        current = [
+            (
+                crop,
+                result["price_range"]["min"],
+                result["price_range"]["max"],
+                result["current_price_avg"],
+                json.dumps(result.get("nearby_mandis", [])),
+                source,
+                fetched_at,
+            )
+            for crop, result, source in rows
+        ]
+        history = [
+            (
+                crop,
+                result["current_price_avg"],
+                result["price_range"]["min"],
+                result["price_range"]["max"],
+                today,
+                source,
+            )
+            for crop, result, source in rows
+        ]
+
+        conn = None
         try:
-            mandis_json = json.dumps(result.get("nearby_mandis", []))
             conn = get_connection()
+            conn.start_transaction()
             cur = conn.cursor()
-            cur.execute(
+            cur.executemany(
                 """
                 INSERT INTO mandi_prices_current
                     (crop_name, min_price, max_price, modal_price, mandis_json, data_source, fetched_at)
-                VALUES (%s, %s, %s, %s, %s, %s, NOW())
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
                 ON DUPLICATE KEY UPDATE
                     min_price = VALUES(min_price),
                     max_price = VALUES(max_price),
                     modal_price = VALUES(modal_price),
                     mandis_json = VALUES(mandis_json),
                     data_source = VALUES(data_source),
-                    fetched_at = NOW()
+                    fetched_at = VALUES(fetched_at)
                 """,
-                (
-                    crop,
-                    result["price_range"]["min"],
-                    result["price_range"]["max"],
-                    result["current_price_avg"],
-                    mandis_json,
-                    source,
-                ),
+                current,
             )
-            conn.commit()
-            cur.close()
-            conn.close()
-        except Exception as e:
-            print(f"[MANDI] DB upsert_current error for {crop}: {e}")
-
-    def _db_insert_history(self, crop: str, result: dict, source: str):
-        """Insert one history row per crop per day (skip if already exists for today)."""
-        try:
-            conn = get_connection()
-            cur = conn.cursor()
-            today = date.today().isoformat()
-            cur.execute(
-                "SELECT id FROM mandi_price_history WHERE crop_name = %s AND recorded_date = %s",
-                (crop, today),
-            )
-            if cur.fetchone():
-                cur.close()
-                conn.close()
-                return  # Already recorded today
-            cur.execute(
+            cur.executemany(
                 """
                 INSERT INTO mandi_price_history
                     (crop_name, modal_price, min_price, max_price, recorded_date, data_source)
                 VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = id
                 """,
-                (
-                    crop,
-                    result["current_price_avg"],
-                    result["price_range"]["min"],
-                    result["price_range"]["max"],
-                    today,
-                    source,
-                ),
+                history,
             )
             conn.commit()
             cur.close()
-            conn.close()
+            logger.info(f"Refresh written — {len(rows)} crops in one transaction")
+            return True
         except Exception as e:
-            print(f"[MANDI] DB insert_history error for {crop}: {e}")
+            logger.error(f"DB refresh write error ({len(rows)} crops): {e}")
+            if conn is not None:
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+            return False
+        finally:
+            if conn is not None:
+                conn.close()
 
     def _trend_from_history(self, prices: list) -> str:
         if len(prices) < 2:
@@ -0,0 +1,242 @@
+# app/services/model_registry.py
+# Versioned model artifacts — one directory per version with a checksummed
+# manifest, plus an atomically replaced CURRENT pointer shared by all processes
+#
+# dataset/models/
+#   CURRENT                    ← "20261017-063000-1a2b3c"
+#   20261017-063000-1a2b3c/
+#     model.pkl
+#     label_encoders.pkl
+#     flat_forest.pkl          ← FlatForest arrays, uncompressed for mmap loading
+#     student_forest.pkl       ← distilled student FlatForest (only when it passed its agreement guard)
+#     manifest.json            ← version, created_at, sha256/size/mtime per file, metrics
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import joblib
+from datetime import datetime
+from typing import Callable, Optional
+
+from app.services.forest_engine import FlatForest
+
+# ── File paths ────────────────────────────────────────────────────────────────
+PROJECT_ROOT  = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+REGISTRY_DIR  = os.path.join(PROJECT_ROOT, "dataset", "models")
+
+CURRENT_FILE  = "CURRENT"
+MANIFEST_FILE = "manifest.json"
+MODEL_FILE    = "model.pkl"
+ENCODERS_FILE = "label_encoders.pkl"
+FOREST_FILE   = "flat_forest.pkl"
+STUDENT_FILE  = "student_forest.pkl"
+
+KEEP_VERSIONS = 5  # older versions are pruned after each publish
+
+
+class RegistryError(Exception):
+    """Raised when a version is missing or fails its checksum."""
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_entry(path: str) -> dict:
+    st = os.stat(path)
+    return {"sha256": _sha256(path), "bytes": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _write_atomic(path: str, text: str):
+    """Write via a temp file + os.replace so readers never see a partial file."""
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    def __init__(self, root: str = REGISTRY_DIR):
+        self.root = root
+
+    # ── Publishing (training side) ────────────────────────────────────────────
+
+    def publish(self, model, encoders, metrics: Optional[dict] = None,
+                extra_files: Optional[dict] = None, make_current: bool = True) -> str:
+        """
+        Write a new version directory and (by default) point CURRENT at it.
+        extra_files: {filename: object} dumped with joblib alongside the model.
+        Returns the new version id.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        version = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        staging = os.path.join(self.root, f".staging-{version}")
+        os.makedirs(staging)
+
+        try:
+            artifacts = {MODEL_FILE: model, ENCODERS_FILE: encoders, **(extra_files or {})}
+            if hasattr(model, "estimators_"):
+                artifacts[FOREST_FILE] = FlatForest.from_sklearn(model).state()
+            for name, obj in artifacts.items():
+                joblib.dump(obj, os.path.join(staging, name))  # uncompressed → mmap-able
+
+            target = encoders.get("target") if isinstance(encoders, dict) else None
+            manifest = {
+                "version":    version,
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "files": {
+                    name: _file_entry(os.path.join(staging, name))
+                    for name in artifacts
+                },
+                "n_estimators": len(getattr(model, "estimators_", [])),
+                "classes":      [str(c) for c in target.classes_] if target is not None else [],
+                # Input encoder vocabularies — code i is vocab[col][i]
+                "vocab": {
+                    col: [str(c) for c in enc.classes_]
+                    for col, enc in (encoders.items() if isinstance(encoders, dict) else [])
+                    if col != "target" and hasattr(enc, "classes_")
+                },
+                "metrics":      metrics or {},
+            }
+            _write_atomic(os.path.join(staging, MANIFEST_FILE), json.dumps(manifest, indent=2))
+
+            # Directory rename is atomic — a half-written version is never visible
+            os.replace(staging, os.path.join(self.root, version))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        if make_current:
+            self.set_current(version)
+            self.prune()
+        return version
+
+    def set_current(self, version: str):
+        if not os.path.isfile(os.path.join(self.root, version, MANIFEST_FILE)):
+            raise RegistryError(f"Unknown model version '{version}'")
+        _write_atomic(os.path.join(self.root, CURRENT_FILE), version + "\n")
+
+    def prune(self, keep: int = KEEP_VERSIONS):
+        """Delete all but the newest `keep` versions (never the current one)."""
+        current = self.current_version()
+        for version in self.versions()[:-keep] if keep > 0 else []:
+            if version != current:
+                shutil.rmtree(os.path.join(self.root, version), ignore_errors=True)
+
+    # ── Reading (serving side) ────────────────────────────────────────────────
+
+    def versions(self) -> list[str]:
+        """Published versions, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            d for d in os.listdir(self.root)
+            if not d.startswith(".") and os.path.isfile(os.path.join(self.root, d, MANIFEST_FILE))
+        )
+
+    def current_version(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, CURRENT_FILE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def pointer_stamp(self) -> Optional[int]:
+        """Cheap change detector for CURRENT (mtime in ns); None if unset."""
+        try:
+            return os.stat(os.path.join(self.root, CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def version_path(self, version: str, name: str = "") -> str:
+        return os.path.join(self.root, version, name)
+
+    def manifest(self, version: str) -> dict:
+        try:
+            with open(self.version_path(version, MANIFEST_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise RegistryError(f"Unknown model version '{version}'")
+
+    def verify(self, version: str, full: bool = True) -> dict:
+        """
+        Check every artifact against its manifest checksum; returns the manifest.
+        full=False is the per-load check: a file whose size and mtime still match
+        what publish() recorded is trusted without re-hashing (the model alone is
+        ~110 MB); only files that were touched since are hashed.
+        """
+        manifest = self.manifest(version)
+        for name, info in manifest.get("files", {}).items():
+            path = self.version_path(version, name)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                raise RegistryError(f"Missing artifact {version}/{name}")
+            if "bytes" in info and st.st_size != info["bytes"]:
+                raise RegistryError(f"Size mismatch for {version}/{name}")
+            if not full and info.get("mtime_ns") == st.st_mtime_ns:
+                continue
+            if _sha256(path) != info["sha256"]:
+                raise RegistryError(f"Checksum mismatch for {version}/{name}")
+        return manifest
+
+    def load(self, version: str, verify: bool = True):
+        """Returns (model, encoders, manifest) for a version."""
+        manifest = self.verify(version) if verify else self.manifest(version)
+        return self.load_model(version), self.load_encoders(version), manifest
+
+    def load_model(self, version: str, mmap_mode: Optional[str] = None):
+        return joblib.load(self.version_path(version, MODEL_FILE), mmap_mode=mmap_mode)
+
+    def model_loader(self, version: str) -> Callable[[], object]:
+        """
+        Deferred load_model(): model.pkl is opened now and unpickled on the first
+        call. The open file keeps its data readable even if prune() deletes the
+        version directory in the meantime (a worker can still be serving it).
+        It is closed only once a load succeeds, so a failed load can be retried;
+        calls after that read the file by path again.
+        """
+        path = self.version_path(version, MODEL_FILE)
+        f = open(path, "rb")
+
+        def load():
+            nonlocal f
+            if f is None:
+                return joblib.load(path)
+            f.seek(0)
+            model = joblib.load(f)
+            f.close()
+            f = None
+            return model
+        return load
+
+    def load_encoders(self, version: str) -> dict:
+        return joblib.load(self.version_path(version, ENCODERS_FILE))
+
+    def load_forest(self, version: str, mmap_mode: Optional[str] = "r") -> Optional[FlatForest]:
+        """The version's FlatForest, memory-mapped so workers share its pages; None if not published."""
+        path = self.version_path(version, FOREST_FILE)
+        return FlatForest.load(path, mmap_mode=mmap_mode) if os.path.isfile(path) else None
+
+    def load_student(self, version: str, mmap_mode: Optional[str] = "r") -> Optional[FlatForest]:
+        """The version's distilled student FlatForest; None if none was promoted."""
+        path = self.version_path(version, STUDENT_FILE)
+        return FlatForest.load(path, mmap_mode=mmap_mode) if os.path.isfile(path) else None
+
+
+# Singleton instance
+_registry = None
+
+def get_model_registry() -> ModelRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ModelRegistry()
+    return _registry
@@ -0,0 +1,141 @@
+# app/services/price_series.py
+# In-process copy of mandi_price_history — one set of NumPy arrays per crop,
+# loaded with a single bulk query and extended in place by the daily refresh
+
+import logging
+import threading
+from datetime import date
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from app.database import get_connection
+
+logger = logging.getLogger(__name__)
+
+# data_source codes (the column is a nullable ENUM)
+SOURCES = (None, "live", "fallback")
+_SOURCE_CODE = {s: i for i, s in enumerate(SOURCES)}
+
+
+class PriceSeries(NamedTuple):
+    """One crop's history, oldest first. NULL prices are stored as 0, as the API reported them."""
+    dates:  np.ndarray  # datetime64[D]
+    modal:  np.ndarray  # float64
+    low:    np.ndarray  # float64 (min_price)
+    high:   np.ndarray  # float64 (max_price)
+    source: np.ndarray  # int8 codes into SOURCES
+
+    def tail(self, n: int) -> "PriceSeries":
+        """The most recent n days (views, no copy)."""
+        return PriceSeries(*(a[-n:] if n > 0 else a[:0] for a in self))
+
+    def head(self, n: int) -> "PriceSeries":
+        """The oldest n days (views, no copy)."""
+        return PriceSeries(*(a[:n] for a in self))
+
+
+_EMPTY = PriceSeries(
+    np.empty(0, dtype="datetime64[D]"), np.empty(0), np.empty(0), np.empty(0), np.empty(0, dtype=np.int8)
+)
+
+
+def _key(crop: str) -> str:
+    # crop_name compares case-insensitively in MySQL (utf8mb4_unicode_ci), so the lookup does too
+    return crop.strip().lower()
+
+
+class PriceSeriesStore:
+    """
+    sync() loads every row on the first call and afterwards only the rows
+    from the last loaded date on, in one query either way. Each crop's series
+    is swapped in as a whole, so readers on the event loop never see a
+    half-updated crop and need no lock. Writers (sync, append_day) share one
+    lock; both can block on it, so call them off the event loop.
+    """
+
+    def __init__(self):
+        self._series: dict = {}
+        self._last_date: Optional[date] = None
+        self._lock = threading.Lock()  # serialises sync() and append_day(), not readers
+        self.loaded = False
+
+    def get(self, crop: str) -> PriceSeries:
+        return self._series.get(_key(crop), _EMPTY)
+
+    def sync(self) -> int:
+        """Pull new mandi_price_history rows into memory; returns how many were added."""
+        with self._lock:
+            conn = get_connection()
+            try:
+                cur = conn.cursor()
+                if self._last_date is None:
+                    where, params = "", ()
+                else:
+                    where, params = "WHERE recorded_date >= %s", (self._last_date,)
+                cur.execute(
+                    f"""
+                    SELECT crop_name, recorded_date, modal_price, min_price, max_price, data_source
+                    FROM mandi_price_history
+                    {where}
+                    ORDER BY crop_name, recorded_date
+                    """,
+                    params,
+                )
+                rows = cur.fetchall()
+                cur.close()
+            finally:
+                conn.close()
+
+            grouped: dict = {}
+            for crop, day, modal, low, high, source in rows:
+                grouped.setdefault(_key(crop), []).append((day, modal, low, high, source))
+            added = sum(self._extend(crop, crop_rows) for crop, crop_rows in grouped.items())
+
+            if rows:
+                newest = max(r[1] for r in rows)
+                self._last_date = max(self._last_date, newest) if self._last_date else newest
+            if not self.loaded:
+                logger.info(f"Price history loaded — {added} rows for {len(self._series)} crops")
+            self.loaded = True
+            return added
+
+    def append_day(self, day: date, prices: dict) -> int:
+        """
+        Add one day from the refresh: prices is {crop: (modal, min, max, source)}.
+        Like the uq_crop_date insert, a crop that already has that day keeps its first row.
+        Ignored until the first sync(), which then reads the day from the DB.
+        """
+        with self._lock:
+            if not self.loaded:
+                return 0
+            added = sum(self._extend(_key(crop), [(day, *values)]) for crop, values in prices.items())
+            self._last_date = max(self._last_date, day) if self._last_date else day
+            return added
+
+    def _extend(self, key: str, rows: list) -> int:
+        """Append rows (date-ascending) newer than the crop's last date; returns how many were new."""
+        current = self._series.get(key, _EMPTY)
+        if len(current.dates):
+            last = current.dates[-1]
+            rows = [r for r in rows if np.datetime64(r[0], "D") > last]
+        if not rows:
+            return 0
+        days, modal, low, high, source = zip(*rows)
+        new = PriceSeries(
+            np.asarray(days, dtype="datetime64[D]"),
+            np.asarray([float(v or 0) for v in modal]),
+            np.asarray([float(v or 0) for v in low]),
+            np.asarray([float(v or 0) for v in high]),
+            np.asarray([_SOURCE_CODE.get(s, 0) for s in source], dtype=np.int8),
+        )
+        self._series[key] = PriceSeries(*(np.concatenate([a, b]) for a, b in zip(current, new)))
+        return len(rows)
+
+    def stats(self) -> dict:
+        return {
+            "loaded":    self.loaded,
+            "crops":     len(self._series),
+            "rows":      sum(len(s.dates) for s in self._series.values()),
+            "last_date": str(self._last_date) if self._last_date else None,
+        }
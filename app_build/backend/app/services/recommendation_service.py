@@ -1,18 +1,34 @@
 # app/services/recommendation_service.py
 # ML crop recommendation service + farmer feedback recording
 
+import logging
 import os
 import json
+import time
+import threading
 import joblib
 import pandas as pd
 import numpy as np
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Callable, Optional
+from cachetools import TTLCache
 from app.database import get_connection
+from app.services.crop_catalog import CropCatalog, get_crop_catalog, reload_crop_catalog
+from app.services.filter_engine import FilterEngine
+from app.services.forest_engine import FlatForest
+from app.services.latency_metrics import StageMetrics
+from app.services.model_registry import ModelRegistry, get_model_registry
+
+logger = logging.getLogger(__name__)
 
 # ── File paths ────────────────────────────────────────────────────────────────
+# Legacy single-artifact paths, used only while the model registry is empty
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 MODEL_PATH   = os.path.join(PROJECT_ROOT, "dataset", "crop_recommendation_model.pkl")
 ENCODER_PATH = os.path.join(PROJECT_ROOT, "dataset", "label_encoders.pkl")
-MERGED_PATH  = os.path.join(PROJECT_ROOT, "dataset", "crops_merged.csv")
+
+MODEL_POLL_SECONDS = 5.0  # how often a worker stats the registry CURRENT pointer
 
 # ── Crop icon map ─────────────────────────────────────────────────────────────
 CROP_ICONS = {
@@ -37,8 +53,29 @@ CROP_ICONS = {
     "Cabbage": "🥬", "Cauliflower": "🥦",
 }
 
-# ── Legumes that fix nitrogen into soil ───────────────────────────────────────
-LEGUMES = {"chickpea", "green gram", "black gram", "soybean", "pigeon pea", "lentil", "kidney bean"}
+# Above this many rows sklearn's per-tree C loops beat lockstep traversal
+FLAT_FOREST_MAX_ROWS = 128
+
+# ── Recommendation result cache (LRU + TTL) ───────────────────────────────────
+RESULT_CACHE_SIZE = 2048
+RESULT_CACHE_TTL  = 60 * 60  # 1 hour
+
+# Feature values are snapped to these steps in the cache key only, so
+# near-identical farms in a district share one entry. Hits are approximate on
+# purpose: a hit reuses the ranking (scores, filter decisions) of the first farm
+# scored in its bucket, while profit, advisory and reasons are always rendered
+# from the request's own farm. Scoring itself never sees quantized values.
+QUANT_STEPS = {
+    "nitrogen": 1.0, "phosphorus": 1.0, "potassium": 1.0, "ph": 0.1,
+    "soil_moisture": 1.0, "organic_carbon": 0.1,
+    "temperature": 0.5, "rainfall": 10.0, "humidity": 1.0,
+}
+
+# ── Model feature order (matches train_crop_model.py) ─────────────────────────
+FEATURE_COLUMNS = [
+    "nitrogen", "phosphorus", "potassium", "ph", "soil_moisture", "organic_carbon",
+    "soil_type", "temperature", "rainfall", "humidity", "budget", "climate_zone",
+]
 
 # # ── Condition Gap Intervention Map ────────────────────────────────────────────
 # GAP_INTERVENTIONS = {
@@ -95,317 +132,517 @@ LEGUMES = {"chickpea", "green gram", "black gram", "soybean", "pigeon pea", "len
 # }
 
 
+def _key_number(value):
+    """Cache-key form of a numeric field: "2.5" and 2.5 render the same, anything else as typed."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class _CountingTTLCache(TTLCache):
+    """TTLCache that counts LRU evictions and TTL expirations."""
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired or [])
+        return expired
+
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """Everything one prediction needs, swapped in as a single reference."""
+    version: str
+    encoders: dict
+    catalog: CropCatalog
+    filter_engine: FilterEngine
+    forest: Optional[FlatForest]
+    load_model: Callable[[], object] = field(repr=False)
+    student: Optional[FlatForest] = None  # distilled model, served first when present
+
+    _loaded: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+
+    @property
+    def target_encoder(self):
+        return self.encoders.get("target")
+
+    @property
+    def model(self):
+        """
+        The sklearn forest, loaded on first use. Small batches run on the
+        memory-mapped FlatForest, so most workers never unpickle it.
+        """
+        if "model" not in self._loaded:
+            with self._lock:
+                if "model" not in self._loaded:
+                    logger.info(f"Loading sklearn model for version {self.version}...")
+                    self._loaded["model"] = self.load_model()
+        return self._loaded["model"]
+
+
 class RecommendationService:
-    def __init__(self):
-        self.model = None
-        self.encoders = None
-        self.target_encoder = None
-        self.merged_df = None
-        self._load_model()
-        self._load_data()
+    def __init__(self, registry: Optional[ModelRegistry] = None, autoload: bool = True,
+                 serve_student: bool = False, teacher_fallback_confidence: Optional[float] = 0.2):
+        """
+        serve_student: score with the version's distilled student when it has one.
+        teacher_fallback_confidence: rows whose student top-1 probability is
+        below this are re-scored by the full forest; None serves the student
+        alone and never maps the teacher.
+        """
+        self.registry = registry or get_model_registry()
+        self._bundle: Optional[ModelBundle] = None
+        self.serve_student = serve_student
+        self.teacher_fallback_confidence = teacher_fallback_confidence
+
+        self._serving_lock = threading.Lock()
+        self._student_rows = 0
+        self._teacher_rows = 0
+        self._fallback_rows = 0
+
+        self._cache = _CountingTTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+
+        # Per-stage latency histograms (features, inference, floor, filter, output, ...)
+        self.stage_metrics = StageMetrics()
+
+        # Registry polling state (see _maybe_refresh)
+        self._swap_lock = threading.Lock()
+        self._swap_running = False
+        self._pointer_stamp = None
+        self._last_poll = 0.0
+
+        # autoload=False defers loading to warmup() (the API does it in lifespan)
+        if autoload:
+            self.reload_model()
 
     # ── Model / data loading ──────────────────────────────────────────────────
 
-    def _load_model(self):
-        try:
-            if os.path.exists(MODEL_PATH) and os.path.exists(ENCODER_PATH):
-                self.model = joblib.load(MODEL_PATH)
-                self.encoders = joblib.load(ENCODER_PATH)
-                self.target_encoder = self.encoders.get("target")
-                print("[ML] Model loaded successfully")
-        except Exception as e:
-            print(f"[ML] Error loading model: {e}")
-
-    def _load_data(self):
+    @property
+    def model_version(self) -> Optional[str]:
+        bundle = self._bundle
+        return bundle.version if bundle else None
+
+    @property
+    def ready(self) -> bool:
+        """True once a model is loaded and requests can be scored."""
+        return self._bundle is not None
+
+    def warmup(self):
+        """Initial model load, run off the event loop by the API's lifespan hook."""
+        started = time.perf_counter()
+        self.reload_model()
+        if self.ready:
+            logger.info(f"Warmup complete in {time.perf_counter() - started:.2f}s — recommendations enabled")
+        else:
+            logger.warning("Warmup finished without a model — /api/ml/recommend will return 503")
+
+    def _load_bundle(self, catalog: CropCatalog) -> Optional[ModelBundle]:
+        """Load the registry's CURRENT version, or the legacy dataset/*.pkl pair."""
+        version = self.registry.current_version()
+        if version:
+            self.registry.verify(version, full=False)
+            encoders = self.registry.load_encoders(version)
+            student  = self.registry.load_student(version) if self.serve_student else None
+            if student is not None:
+                logger.info(f"Distilled student mapped ({student.n_trees} trees, {student.nbytes / 1e6:.1f} MB)")
+            # Student-only serving never maps the teacher (unpickled only if a caller asks for bundle.model)
+            teacher_needed = student is None or self.teacher_fallback_confidence is not None
+            forest = self.registry.load_forest(version) if teacher_needed else None  # memory-mapped
+            if not teacher_needed:
+                load_model = self.registry.model_loader(version)
+                classes    = student.classes_
+            elif forest is not None:
+                logger.info(f"Forest mapped from registry ({forest.n_trees} trees, {forest.nbytes / 1e6:.1f} MB shared)")
+                load_model = self.registry.model_loader(version)
+                classes    = forest.classes_
+            else:
+                # Versions published before flat_forest.pkl existed
+                model      = self.registry.load_model(version)
+                forest     = self._flatten_forest(model)
+                load_model = lambda: model
+                classes    = model.classes_
+        elif os.path.exists(MODEL_PATH) and os.path.exists(ENCODER_PATH):
+            student    = None
+            version    = "legacy"
+            model      = joblib.load(MODEL_PATH)
+            encoders   = joblib.load(ENCODER_PATH)
+            forest     = self._flatten_forest(model)
+            load_model = lambda: model
+            classes    = model.classes_
+        else:
+            return None
+
+        class_names = self._class_names(classes, encoders.get("target"))
+        return ModelBundle(
+            version=version,
+            encoders=encoders,
+            catalog=catalog,
+            filter_engine=FilterEngine(class_names, catalog),
+            forest=forest,
+            load_model=load_model,
+            student=student,
+        )
+
+    def _flatten_forest(self, model):
+        """Array-based inference engine for the forest; None → use predict_proba."""
         try:
-            if os.path.exists(MERGED_PATH):
-                self.merged_df = pd.read_csv(MERGED_PATH)
-                print(f"[ML] crops_merged.csv loaded ({len(self.merged_df)} crops)")
+            forest = FlatForest.from_sklearn(model)
+            logger.info(f"Forest flattened ({forest.n_trees} trees, {forest.nbytes / 1e6:.1f} MB)")
+            return forest
         except Exception as e:
-            print(f"[ML] Error loading crops_merged.csv: {e}")
+            logger.warning(f"Could not flatten forest, using predict_proba: {e}")
+            return None
 
-    def reload_model(self):
-        print("[ML] Hot-swapping model...")
-        self._load_model()
-        print("[ML] Model reloaded.")
+    def _class_names(self, classes, target_encoder) -> list:
+        """Crop name for every model class, in model.classes_ order."""
+        if target_encoder is not None:
+            return [str(n) for n in target_encoder.inverse_transform(classes)]
+        return [str(c) for c in classes]
 
-    # ── Core prediction pipeline ──────────────────────────────────────────────
+    def _install(self, bundle: ModelBundle):
+        self._bundle = bundle  # single reference assignment — requests see old or new, never a mix
+        self.clear_cache()
 
-    def predict_crops(self, farm_data: dict, top_k: int = 3) -> list:
-        if not self.model or not self.encoders:
-            return []
+    def reload_model(self):
+        """Synchronously load the registry's current version and swap it in."""
+        logger.info("Hot-swapping model...")
+        stamp = self.registry.pointer_stamp()
         try:
-            input_dict = {
-                "nitrogen":       [float(farm_data.get("nitrogen", 0))],
-                "phosphorus":     [float(farm_data.get("phosphorus", 0))],
-                "potassium":      [float(farm_data.get("potassium", 0))],
-                "ph":             [float(farm_data.get("ph", farm_data.get("soilPh", 6.5)))],
-                "soil_moisture":  [float(farm_data.get("soil_moisture", farm_data.get("soilMoisture", 50)))],
-                "organic_carbon": [float(farm_data.get("organic_carbon", farm_data.get("organicCarbon", 1.2)))],
-                "soil_type":      [self._encode_value("soil_type", farm_data.get("soilType", farm_data.get("soil_type", "Loamy")))],
-                "temperature":    [float(farm_data.get("temperature", 25))],
-                "rainfall":       [float(farm_data.get("rainfall", 800))],
-                "humidity":       [float(farm_data.get("humidity", 60))],
-                "budget":         [float(farm_data.get("budget", 50000))],
-                "climate_zone":   [self._encode_value("climate_zone", farm_data.get("climate_zone", "Tropical"))],
-            }
-
-            df = pd.DataFrame(input_dict)
-            probs = self.model.predict_proba(df)[0]
-            classes = self.model.classes_
-
-            # ── Stage 1: 20% suitability floor ───────────────────────────────
-            # Sort all crops by raw probability (descending)
-            all_sorted = sorted(
-                [(float(p), int(cls)) for cls, p in zip(classes, probs)],
-                key=lambda x: x[0], reverse=True
-            )
-
-            # Normalise relative to the TOP scorer so scores are meaningful %
-            top_prob = all_sorted[0][0] if all_sorted else 1.0
-            norm_scores = [
-                (round(p / top_prob * 100, 1), cls)
-                for p, cls in all_sorted
-            ]
-
-            # Apply 20% floor against normalised scores
-            above_floor = [(score, cls) for score, cls in norm_scores if score >= 20.0]
-
-            limited_options = False
-            if len(above_floor) < top_k:
-                # Fallback: take top_k regardless — flag so frontend knows
-                above_floor = norm_scores[:max(top_k * 3, 10)]  # wider pool for filter engine
-                limited_options = True
-                print(f"[ML] Limited options — fewer than {top_k} crops above 20% floor")
-
-            # ── Stage 2: Filter Engine ────────────────────────────────────────
-            farm_size = float(farm_data.get("farmSize", farm_data.get("total_farm_size_acres", 1.0)))
-            budget    = float(farm_data.get("budget", 50000))
-
-            candidates = []
-            for raw_score, cls_idx in above_floor:
-                crop_name = (
-                    str(self.target_encoder.inverse_transform([cls_idx])[0])
-                    if self.target_encoder else str(cls_idx)
-                )
-                if self.merged_df is None:
-                    continue
-                row = self.merged_df[self.merged_df["crop_name"].str.lower() == crop_name.lower()]
-                if row.empty:
-                    continue
-                crop_row = row.iloc[0]
-                candidates.append({
-                    "crop_name": crop_name,
-                    "crop_row":  crop_row,
-                    "score":     raw_score,
-                })
-
-            filtered = self._apply_filter_engine(candidates, farm_data, farm_size, budget)
-
-            # ── Stage 3: Top K + build output ────────────────────────────────
-            filtered = sorted(filtered, key=lambda x: x["score"], reverse=True)[:top_k]
-
-            recommendations = []
-            for rank, c in enumerate(filtered):
-                crop_name = c["crop_name"]
-                score     = float(round(c["score"], 1))
-                crop_row  = c["crop_row"]
-
-                if score >= 65:   confidence_band = "Strongly Suitable"
-                elif score >= 40: confidence_band = "Suitable"
-                elif score >= 20: confidence_band = "Moderately Suitable"
-                else:             confidence_band = "Low Suitability"
-
-                profit, yield_kg = self._calculate_profit(crop_name, score, budget, farm_size)
-                advisory = self._generate_advisory(crop_row, farm_data)
-                reasons  = self._get_reasons(crop_name, crop_row, farm_data, c)
-
-                rec = {
-                    "rank":               rank + 1,
-                    "crop_name":          crop_name,
-                    "crop_name_hi":       crop_name,
-                    "match_score":        score,
-                    "confidence_band":    confidence_band,
-                    "profit_estimate":    int(profit),
-                    "estimated_yield_kg": round(yield_kg, 1),
-                    "farm_size_acres":    farm_size,
-                    "reasons":            reasons,
-                    "advisory":           advisory,
-                    "icon":               CROP_ICONS.get(crop_name, "🌱"),
-                    "limited_options":    limited_options,
-                }
-                if c.get("over_budget_badge"):
-                    rec["budget_badge"] = c["over_budget_badge"]
-                if c.get("weather_badge"):
-                    rec["weather_badge"] = c["weather_badge"]
-                if c.get("rotation_badge"):
-                    rec["rotation_badge"] = c["rotation_badge"]
-
-                recommendations.append(rec)
-
-            return recommendations
+            catalog = get_crop_catalog() if self._bundle is None else reload_crop_catalog()
+            bundle = self._load_bundle(catalog)
+            if bundle is not None:
+                self._install(bundle)
+                logger.info(f"Model loaded successfully (version {bundle.version})")
         except Exception as e:
-            print(f"[ML] Prediction error: {e}")
-            import traceback; traceback.print_exc()
-            return []
+            logger.error(f"Error loading model: {e}")
+        self._pointer_stamp = stamp
+
+    def _maybe_refresh(self):
+        """
+        Cheap per-request check (one stat() every MODEL_POLL_SECONDS) for a new
+        CURRENT pointer; if it moved, load that version on a background thread.
+        """
+        now = time.monotonic()
+        if now - self._last_poll < MODEL_POLL_SECONDS:
+            return
+        self._last_poll = now
+
+        stamp = self.registry.pointer_stamp()
+        if stamp is None or stamp == self._pointer_stamp:
+            return
+        with self._swap_lock:
+            if self._swap_running:
+                return
+            self._swap_running = True
+        threading.Thread(target=self._background_swap, args=(stamp,), name="model-swap", daemon=True).start()
+
+    def _background_swap(self, stamp):
+        try:
+            version = self.registry.current_version()
+            if version and version != self.model_version:
+                logger.info(f"New model version {version} published — loading in background...")
+                bundle = self._load_bundle(reload_crop_catalog())
+                if bundle is not None:
+                    self._install(bundle)
+                    logger.info(f"Model hot-swapped to version {bundle.version}")
+        except Exception as e:
+            logger.warning(f"Background model swap failed, keeping {self.model_version}: {e}")
+        finally:
+            # Remember the stamp even on failure; the next publish moves it again
+            self._pointer_stamp = stamp
+            with self._swap_lock:
+                self._swap_running = False
+
+    # ── Result cache ──────────────────────────────────────────────────────────
+
+    def clear_cache(self):
+        """Drop every cached result (called whenever a new model is swapped in)."""
+        with self._cache_lock:
+            self._cache.clear()
+
+    def cache_stats(self) -> dict:
+        with self._cache_lock:
+            lookups = self._cache_hits + self._cache_misses
+            return {
+                "size":        len(self._cache),
+                "maxsize":     self._cache.maxsize,
+                "ttl_seconds": self._cache.ttl,
+                "hits":        self._cache_hits,
+                "misses":      self._cache_misses,
+                "evictions":   self._cache.evictions,
+                "expirations": self._cache.expirations,
+                "hit_rate":    round(self._cache_hits / lookups, 4) if lookups else 0.0,
+            }
 
-    # ── Filter Engine ─────────────────────────────────────────────────────────
+    @staticmethod
+    def _quantize_features(features: list) -> tuple:
+        """Feature row with soil/climate values snapped to QUANT_STEPS (cache key only)."""
+        return tuple(
+            round(round(value / QUANT_STEPS[col]) * QUANT_STEPS[col], 3) if col in QUANT_STEPS else value
+            for col, value in zip(FEATURE_COLUMNS, features)
+        )
+
+    def _cache_key(self, version: str, features: list, farm_data: dict, top_k: int) -> tuple:
+        """
+        Everything the cached ranking depends on: the quantized features
+        (budget unrounded) plus the raw fields the filter engine reads besides
+        them. Fields that are only echoed back don't matter, the output is
+        rendered per request.
+        """
+        return (
+            version,                           # a ranking is only valid for the model that produced it
+            self._quantize_features(features),
+            str(farm_data.get("previousCrop", "")),
+            _key_number(farm_data.get("farmSize", farm_data.get("total_farm_size_acres", 1.0))),
+            top_k,
+        )
 
-    def _apply_filter_engine(self, candidates, farm_data, farm_size, budget):
-        result = []
-        for c in candidates:
-            c = dict(c)  # copy so we can mutate score safely
+    # ── Core prediction pipeline ──────────────────────────────────────────────
 
-            # Layer 1 — Budget
-            c = self._budget_filter(c, farm_size, budget)
-            if c is None:
+    def predict_crops(self, farm_data: dict, top_k: int = 3, timing: Optional[dict] = None) -> list:
+        return self.predict_crops_batch([farm_data], top_k, timings=[timing])[0]
+
+    def predict_crops_batch(self, farms: list, top_k: int = 3, timings: Optional[list] = None) -> list:
+        """
+        Score many farms with a single inference pass on a stacked feature
+        matrix (flattened forest, or predict_proba as a fallback), then run
+        the filter engine per farm. Rankings are cached under quantized
+        features (see QUANT_STEPS); only misses reach the model, and every
+        farm's output is rendered from its own raw values.
+        timings: optional per-farm dicts (or None) that receive stage times in ms.
+        Returns one recommendation list per input farm (same order).
+        """
+        started = time.perf_counter()
+        results = [[] for _ in farms]
+        timings = timings or [None] * len(farms)
+        metrics = self.stage_metrics
+        self._maybe_refresh()
+        bundle = self._bundle  # one consistent model/encoders/catalog for the whole batch
+        if bundle is None or not farms:
+            return results
+
+        rows, row_farms, row_keys = [], [], []
+        for i, farm_data in enumerate(farms):
+            t0 = time.perf_counter()
+            try:
+                features = self._build_features(farm_data, bundle.encoders)
+            except Exception as e:
+                logger.warning("Skipping farm #%d — invalid input: %s", i, e)
                 continue
-
-            # Layer 2 — Weather penalty
-            c = self._weather_penalty(c, farm_data)
-            if c is None:
+            metrics.observe("features", time.perf_counter() - t0, timings[i])
+
+            key = self._cache_key(bundle.version, features, farm_data, top_k)
+            with self._cache_lock:
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache_hits += 1
+                else:
+                    self._cache_misses += 1
+            if timings[i] is not None:
+                timings[i]["cache"] = "hit" if cached is not None else "miss"
+            if cached is not None:
+                results[i] = self._render(cached, farm_data, timings[i])
                 continue
 
-            # Layer 3a — Rotation restriction penalty
-            c = self._rotation_restriction(c, farm_data)
-
-            # Layer 3b — Legume nitrogen bonus
-            c = self._legume_bonus(c, farm_data)
-
-            # Layer 3c — Soil restoration bonus
-            c = self._restoration_bonus(c)
-
-            result.append(c)
-        return result
-
-    def _budget_filter(self, c, farm_size, budget):
-        """Layer 1: demotion or removal based on cultivation cost vs budget."""
-        r = c["crop_row"]
-        try:
-            min_cost = float(r["cost_of_cultivation_min"]) * farm_size
-        except Exception:
-            return c  # no cost data — let it pass
-
-        over_pct = (min_cost - budget) / budget if budget > 0 else 0
-
-        if over_pct <= 0:
-            # Within budget — no change
-            return c
-        elif over_pct <= 0.40:
-            # 10–40% over: demote
-            c["score"] *= 0.75
-            c["over_budget_badge"] = f"Over budget by ~{int(over_pct*100)}%"
-        else:
-            # >40% over budget
-            if c["score"] < 65.0:
-                print(f"[ML] Budget hard-remove: {c['crop_name']} (score {c['score']:.1f}%, cost ₹{int(min_cost):,} vs budget ₹{int(budget):,})")
-                return None  # hard remove
-            else:
-                # High confidence — demote heavily but show
-                c["score"] *= 0.60
-                c["over_budget_badge"] = f"Well over budget — cost ≈ ₹{int(min_cost):,}"
-        return c
-
-    def _weather_penalty(self, c, farm_data):
-        """Layer 2: 3-zone temperature + rainfall penalty."""
-        r   = c["crop_row"]
-        badges = []
-
-        # Temperature check
+            rows.append(features)
+            row_farms.append(i)
+            row_keys.append(key)
+
+        if rows:
+            try:
+                t0 = time.perf_counter()
+                all_probs = self._predict_proba(bundle, rows)
+                elapsed = time.perf_counter() - t0
+            except Exception as e:
+                logger.exception("Prediction error: %s", e)
+                return results
+
+            # One inference pass serves the whole batch; every farm in it waited for all of it
+            metrics.observe("inference", elapsed)
+            for i in row_farms:
+                if timings[i] is not None:
+                    timings[i]["inference_ms"] = round(elapsed * 1000, 4)
+                    timings[i]["inference_rows"] = len(rows)
+
+            for probs, i, key in zip(all_probs, row_farms, row_keys):
+                ranking = self._rank_crops(bundle, probs, farms[i], top_k, timings[i])
+                if ranking is None:
+                    continue
+                if ranking[0]:  # an empty ranking may be a transient failure; score it again next time
+                    with self._cache_lock:
+                        self._cache[key] = ranking
+                results[i] = self._render(ranking, farms[i], timings[i])
+
+        metrics.observe("batch_total", time.perf_counter() - started)
+        return results
+
+    def _predict_proba(self, bundle: ModelBundle, rows: list):
+        """
+        Class probabilities for stacked feature rows: the distilled student when
+        the version has one, with low-confidence rows re-scored by the teacher;
+        otherwise the teacher alone.
+        """
+        if bundle.student is None:
+            with self._serving_lock:
+                self._teacher_rows += len(rows)
+            return self._teacher_proba(bundle, rows)
+
+        fallback = self.teacher_fallback_confidence
         try:
-            farm_temp  = float(farm_data.get("temperature", 25))
-            temp_min   = float(r["temp_min_c"])
-            temp_max   = float(r["temp_max_c"])
-
-            if farm_temp < temp_min:
-                delta = temp_min - farm_temp
-            elif farm_temp > temp_max:
-                delta = farm_temp - temp_max
-            else:
-                delta = 0
-
-            if delta > 10:
-                print(f"[ML] Weather hard-remove: {c['crop_name']} (temp delta {delta:.1f}°C)")
-                return None
-            elif delta > 5:
-                c["score"] *= 0.60
-                badges.append(f"High heat stress ({delta:.0f}°C outside range)")
-            elif delta > 0:
-                c["score"] *= 0.85
-                badges.append(f"Mild heat stress ({delta:.0f}°C outside range)")
-        except Exception:
-            pass
+            probs = bundle.student.predict_proba(np.array(rows, dtype=np.float64))
+        except Exception as e:
+            if fallback is None:
+                raise
+            logger.warning(f"Student inference failed, using the teacher: {e}")
+            with self._serving_lock:
+                self._fallback_rows += len(rows)
+            return self._teacher_proba(bundle, rows)
+
+        low = np.flatnonzero(probs.max(axis=1) < fallback) if fallback is not None else []
+        if len(low):
+            probs[low] = self._teacher_proba(bundle, [rows[i] for i in low])
+        with self._serving_lock:
+            self._student_rows += len(rows)
+            self._fallback_rows += len(low)
+        return probs
+
+    def serving_stats(self) -> dict:
+        """Which model scores requests, and how many rows fell back to the teacher."""
+        bundle = self._bundle
+        with self._serving_lock:
+            return {
+                "model":                       "student" if bundle is not None and bundle.student is not None else "teacher",
+                "teacher_fallback_confidence": self.teacher_fallback_confidence,
+                "student_rows":                self._student_rows,
+                "teacher_rows":                self._teacher_rows,
+                "teacher_fallback_rows":       self._fallback_rows,
+            }
 
-        # Rainfall check
+    def _teacher_proba(self, bundle: ModelBundle, rows: list):
+        """The full forest's probabilities (FlatForest for small batches)."""
+        if bundle.forest is not None and len(rows) <= FLAT_FOREST_MAX_ROWS:
+            return bundle.forest.predict_proba(np.array(rows, dtype=np.float64))
+        return bundle.model.predict_proba(pd.DataFrame(rows, columns=FEATURE_COLUMNS))
+
+    def _build_features(self, farm_data: dict, encoders: dict) -> list:
+        """Encode one farm payload into a feature row (FEATURE_COLUMNS order)."""
+        return [
+            float(farm_data.get("nitrogen", 0)),
+            float(farm_data.get("phosphorus", 0)),
+            float(farm_data.get("potassium", 0)),
+            float(farm_data.get("ph", farm_data.get("soilPh", 6.5))),
+            float(farm_data.get("soil_moisture", farm_data.get("soilMoisture", 50))),
+            float(farm_data.get("organic_carbon", farm_data.get("organicCarbon", 1.2))),
+            self._encode_value(encoders, "soil_type", farm_data.get("soilType", farm_data.get("soil_type", "Loamy"))),
+            float(farm_data.get("temperature", 25)),
+            float(farm_data.get("rainfall", 800)),
+            float(farm_data.get("humidity", 60)),
+            float(farm_data.get("budget", 50000)),
+            self._encode_value(encoders, "climate_zone", farm_data.get("climate_zone", "Tropical")),
+        ]
+
+    def _rank_crops(self, bundle: ModelBundle, probs, farm_data: dict, top_k: int,
+                    timing: Optional[dict] = None) -> Optional[tuple]:
+        """
+        Stages 1–2 for one farm, given its class probabilities →
+        (candidates, limited_options), with the candidates read-only so the
+        cache can share them; None if ranking failed.
+        """
+        metrics = self.stage_metrics
         try:
-            farm_rain  = float(farm_data.get("rainfall", 800))
-            rain_min   = float(r["annual_rainfall_min_mm"])
+            farm_size = float(farm_data.get("farmSize", farm_data.get("total_farm_size_acres", 1.0)))
+            budget    = float(farm_data.get("budget", 50000))
+            engine    = bundle.filter_engine
 
-            if farm_rain < rain_min:
-                deficit_pct = (rain_min - farm_rain) / rain_min
-                if deficit_pct > 0.40:
-                    print(f"[ML] Rainfall hard-remove: {c['crop_name']} (deficit {deficit_pct*100:.0f}%)")
-                    return None
-                elif deficit_pct > 0.20:
-                    c["score"] *= 0.80
-                    badges.append(f"Rainfall deficit — needs {int(rain_min)}mm, you have {int(farm_rain)}mm")
-        except Exception:
-            pass
+            # ── Stage 1: 20% floor ────────────────────────────────────────────
+            with metrics.time("floor", timing):
+                p, norm, pool, limited_options = engine.floor(probs, top_k)
 
-        if badges:
-            c["weather_badge"] = "; ".join(badges)
-        return c
+            # ── Stage 2: Filter Engine (vectorised) ───────────────────────────
+            with metrics.time("filter", timing):
+                filtered = engine.filter(p, norm, pool, farm_data, farm_size, budget, top_k)
+            return tuple(MappingProxyType(c) for c in filtered), limited_options
+        except Exception as e:
+            logger.exception("Prediction error: %s", e)
+            return None
 
-    def _rotation_restriction(self, c, farm_data):
-        """Layer 3a: penalise if previous crop is in restrictions list."""
-        prev_crop = str(farm_data.get("previousCrop", "")).strip().lower()
-        if not prev_crop:
-            return c
+    def _render(self, ranking: tuple, farm_data: dict, timing: Optional[dict] = None) -> list:
+        """Stage 3 for one farm: build output (profit, advisory, reasons) from its ranking."""
+        candidates, limited_options = ranking
         try:
-            restrictions_raw = str(c["crop_row"].get("previous_crop_restrictions", ""))
-            restrictions = [x.strip().lower() for x in restrictions_raw.split("|") if x.strip()]
-            if prev_crop in restrictions:
-                c["score"] *= 0.50
-                c["rotation_badge"] = f"Caution: Soil may carry residue from your previous {farm_data.get('previousCrop')} crop"
-        except Exception:
-            pass
-        return c
+            farm_size = float(farm_data.get("farmSize", farm_data.get("total_farm_size_acres", 1.0)))
+            budget    = float(farm_data.get("budget", 50000))
+            with self.stage_metrics.time("output", timing):
+                return self._build_output(list(candidates), limited_options, farm_data, farm_size, budget)
+        except Exception as e:
+            logger.exception("Prediction error: %s", e)
+            return []
 
-    def _legume_bonus(self, c, farm_data):
-        """Layer 3b: +20% score if previous crop was a legume AND this crop needs high nitrogen."""
-        prev_crop = str(farm_data.get("previousCrop", "")).strip().lower()
-        if prev_crop not in LEGUMES:
-            return c
-        try:
-            n_req = str(c["crop_row"].get("n_requirement", "")).strip().lower()
-            if n_req == "high":
-                c["score"] *= 1.20
-                c["legume_bonus"] = True
-        except Exception:
-            pass
-        return c
+    def _build_output(self, filtered: list, limited_options: bool, farm_data: dict,
+                      farm_size: float, budget: float) -> list:
+        """Stage 3: profit, advisory and reasons for each surviving candidate."""
+        recommendations = []
+        for rank, c in enumerate(filtered):
+            crop_name = c["crop_name"]
+            score     = float(round(c["score"], 1))
+            crop      = c["crop"]
+
+            if score >= 65:   confidence_band = "Strongly Suitable"
+            elif score >= 40: confidence_band = "Suitable"
+            elif score >= 20: confidence_band = "Moderately Suitable"
+            else:             confidence_band = "Low Suitability"
+
+            profit, yield_kg = self._calculate_profit(crop, score, budget, farm_size)
+            advisory = self._generate_advisory(crop, farm_data)
+            reasons  = self._get_reasons(crop_name, crop, farm_data, c)
+
+            rec = {
+                "rank":               rank + 1,
+                "crop_name":          crop_name,
+                "crop_name_hi":       crop_name,
+                "match_score":        score,
+                "confidence_band":    confidence_band,
+                "profit_estimate":    int(profit),
+                "estimated_yield_kg": round(yield_kg, 1),
+                "farm_size_acres":    farm_size,
+                "reasons":            reasons,
+                "advisory":           advisory,
+                "icon":               CROP_ICONS.get(crop_name, "🌱"),
+                "limited_options":    limited_options,
+            }
+            if c.get("over_budget_badge"):
+                rec["budget_badge"] = c["over_budget_badge"]
+            if c.get("weather_badge"):
+                rec["weather_badge"] = c["weather_badge"]
+            if c.get("rotation_badge"):
+                rec["rotation_badge"] = c["rotation_badge"]
 
-    def _restoration_bonus(self, c):
-        """Layer 3c: +5% for crops that improve soil for the next cycle."""
-        try:
-            sri = float(c["crop_row"].get("soil_restoration_index", 0))
-            if sri >= 0.75:
-                c["score"] *= 1.05
-                c["restoration_bonus"] = True
-        except Exception:
-            pass
-        return c
+            recommendations.append(rec)
+
+        return recommendations
 
     # ── Condition Gap Advisor ─────────────────────────────────────────────────
 
-    def _generate_advisory(self, crop_row, farm_data) -> list:
+    def _generate_advisory(self, crop, farm_data) -> list:
         """Compute condition gaps and return actionable interventions."""
         advisory = []
 
         try:
             farm_temp = float(farm_data.get("temperature", 25))
-            temp_min  = float(crop_row["temp_min_c"])
-            temp_max  = float(crop_row["temp_max_c"])
+            temp_min  = crop.temp_min_c
+            temp_max  = crop.temp_max_c
 
             if farm_temp > temp_max:
                 delta = farm_temp - temp_max
@@ -420,7 +657,7 @@ class RecommendationService:
 
         try:
             farm_rain = float(farm_data.get("rainfall", 800))
-            rain_min  = float(crop_row["annual_rainfall_min_mm"])
+            rain_min  = crop.rainfall_min_mm
             if farm_rain < rain_min:
                 deficit_pct = (rain_min - farm_rain) / rain_min
                 severity = "severe" if deficit_pct > 0.40 else "mild"
@@ -430,8 +667,8 @@ class RecommendationService:
 
         try:
             farm_ph  = float(farm_data.get("ph", farm_data.get("soilPh", 6.5)))
-            ph_min   = float(crop_row["ph_min"])
-            ph_max   = float(crop_row["ph_max"])
+            ph_min   = crop.ph_min
+            ph_max   = crop.ph_max
             if farm_ph < ph_min:
                 advisory += GAP_INTERVENTIONS["soil_ph_low"]["mild"]
             elif farm_ph > ph_max:
@@ -440,7 +677,7 @@ class RecommendationService:
             pass
 
         try:
-            n_req = str(crop_row.get("n_requirement", "")).strip().lower()
+            n_req = crop.n_requirement
             farm_n = float(farm_data.get("nitrogen", 0))
             if n_req == "high" and farm_n < 120:
                 advisory += GAP_INTERVENTIONS["nitrogen_low"]["mild"]
@@ -451,13 +688,12 @@ class RecommendationService:
 
     # ── Dynamic reason generation ─────────────────────────────────────────────
 
-    def _get_reasons(self, crop_name: str, crop_row, farm_data: dict, candidate: dict) -> list:
+    def _get_reasons(self, crop_name: str, crop, farm_data: dict, candidate: dict) -> list:
         reasons = []
 
         try:
             farm_rain = float(farm_data.get("rainfall", 0))
-            rain_min  = float(crop_row["annual_rainfall_min_mm"])
-            rain_max  = float(crop_row["annual_rainfall_max_mm"])
+            rain_min  = crop.rainfall_min_mm
             if farm_rain >= rain_min:
                 reasons.append(f"Your {int(farm_rain)}mm rainfall suits this crop well")
             elif farm_rain >= rain_min * 0.80:
@@ -467,15 +703,14 @@ class RecommendationService:
 
         try:
             farm_soil = str(farm_data.get("soilType", farm_data.get("soil_type", ""))).strip()
-            ideal_soils = str(crop_row.get("ideal_soil_type", ""))
-            if farm_soil and farm_soil.lower() in ideal_soils.lower():
+            if farm_soil and any(farm_soil.lower() in s for s in crop.soil_types):
                 reasons.append(f"Well-suited to {farm_soil} soil — matches your farm")
         except Exception:
             pass
 
         try:
             farm_ph = float(farm_data.get("ph", farm_data.get("soilPh", 6.5)))
-            if float(crop_row["ph_min"]) <= farm_ph <= float(crop_row["ph_max"]):
+            if crop.ph_min <= farm_ph <= crop.ph_max:
                 reasons.append(f"Your soil pH of {farm_ph} is ideal for this crop")
         except Exception:
             pass
@@ -490,7 +725,7 @@ class RecommendationService:
         try:
             farm_size = float(farm_data.get("farmSize", 1.0))
             budget    = float(farm_data.get("budget", 50000))
-            min_cost  = float(crop_row["cost_of_cultivation_min"]) * farm_size
+            min_cost  = crop.cost_min * farm_size
             if min_cost <= budget:
                 reasons.append(f"Budget-friendly — estimated cultivation cost ₹{int(min_cost):,}")
         except Exception:
@@ -505,20 +740,20 @@ class RecommendationService:
     # ── Crop detail lookup ────────────────────────────────────────────────────
 
     def get_crop_details(self, crop_names: list) -> list:
+        bundle  = self._bundle
+        catalog = bundle.catalog if bundle else get_crop_catalog()
         details = []
         for name in crop_names:
             info = {"crop_name": name}
-            if self.merged_df is not None:
-                row = self.merged_df[self.merged_df["crop_name"].str.lower() == name.lower()]
-                if not row.empty:
-                    r = row.iloc[0]
-                    info["growth_days"]     = int(r.get("growth_duration_days_max", 120))
-                    info["growth_days_min"] = int(r.get("growth_duration_days_min", 90)) if "growth_duration_days_min" in r else info["growth_days"]
-                    info["yield_avg"]       = float((r["yield_min_per_acre"] + r["yield_max_per_acre"]) / 2)
-                    info["cost_avg"]        = float((r["cost_of_cultivation_min"] + r["cost_of_cultivation_max"]) / 2)
-                    info["price_avg"]       = float((r["expected_market_price_min"] + r["expected_market_price_max"]) / 2)
-                    info["soil_type"]       = str(r.get("ideal_soil_type", ""))
-                    info["climate_zone"]    = str(r.get("climate_zone", ""))
+            crop = catalog.get(name)
+            if crop is not None:
+                info["growth_days"]     = crop.growth_days_max or 120
+                info["growth_days_min"] = crop.growth_days_min if crop.growth_days_min is not None else info["growth_days"]
+                info["yield_avg"]       = crop.yield_avg
+                info["cost_avg"]        = crop.cost_avg
+                info["price_avg"]       = crop.price_avg
+                info["soil_type"]       = crop.ideal_soil_type
+                info["climate_zone"]    = crop.climate_zone
             details.append(info)
         return details
 
@@ -534,9 +769,9 @@ class RecommendationService:
             )
             conn.commit()
             cur.close(); conn.close()
-            print(f"[ML] Feedback recorded: farmer={farmer_id} chose={chosen_crop}")
+            logger.info(f"Feedback recorded: farmer={farmer_id} chose={chosen_crop}")
         except Exception as e:
-            print(f"[ML] Feedback recording error: {e}")
+            logger.error(f"Feedback recording error: {e}")
 
     def get_feedback_history(self, farmer_id: str) -> list:
         try:
@@ -556,28 +791,22 @@ class RecommendationService:
                     row["chosen_at"] = row["chosen_at"].isoformat()
             return rows
         except Exception as e:
-            print(f"[ML] History fetch error: {e}")
+            logger.error(f"History fetch error: {e}")
             return []
 
     # ── Private helpers ───────────────────────────────────────────────────────
 
-    def _calculate_profit(self, crop_name: str, score: float, budget, farm_size: float):
-        if self.merged_df is not None:
-            row = self.merged_df[self.merged_df["crop_name"].str.lower() == crop_name.lower()]
-            if not row.empty:
-                r          = row.iloc[0]
-                yield_avg  = (r["yield_min_per_acre"] + r["yield_max_per_acre"]) / 2
-                price_avg  = (r["expected_market_price_min"] + r["expected_market_price_max"]) / 2
-                cost_avg   = (r["cost_of_cultivation_min"] + r["cost_of_cultivation_max"]) / 2
-                total_yield = yield_avg * farm_size
-                profit      = max(0, total_yield * price_avg - cost_avg * farm_size) * (score / 100)
-                return profit, total_yield
+    def _calculate_profit(self, crop, score: float, budget, farm_size: float):
+        if crop is not None:
+            total_yield = crop.yield_avg * farm_size
+            profit      = max(0, total_yield * crop.price_avg - crop.cost_avg * farm_size) * (score / 100)
+            return profit, total_yield
         return (float(score) * 500 + float(budget) * 0.2, 0.0)
 
-    def _encode_value(self, feature: str, value) -> int:
+    def _encode_value(self, encoders: dict, feature: str, value) -> int:
         try:
-            if feature in self.encoders:
-                enc = self.encoders[feature]
+            if feature in encoders:
+                enc = encoders[feature]
                 if value in enc.classes_:
                     return enc.transform([value])[0]
         except Exception:
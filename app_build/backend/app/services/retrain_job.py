@@ -0,0 +1,303 @@
+# app/services/retrain_job.py
+# In-server model retraining — runs dataset/retrain_from_feedback.py in a
+# separate low-priority process so training never competes with request
+# handling for the GIL, and tracks run status for the admin endpoint.
+# An exclusive lock on a file in the model registry keeps it to one run per
+# host, however many uvicorn workers fire the weekly schedule; the holder
+# also writes a state file so other workers can report the run without
+# touching the lock.
+
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import subprocess
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from app.services.recommendation_service import RecommendationService
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR    = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DATASET_DIR    = os.path.join(os.path.dirname(BACKEND_DIR), "dataset")
+RETRAIN_SCRIPT = os.path.join(DATASET_DIR, "retrain_from_feedback.py")
+
+OUTPUT_TAIL_LINES = 20  # last lines of the child's output kept per run
+HISTORY_RUNS      = 10  # finished runs kept for the status endpoint
+
+LOCK_FILE  = ".retrain.lock"   # in the registry root, next to the versions a run publishes
+STATE_FILE = ".retrain.state"  # the lock holder's run (pid, start, trigger, mode), removed when it ends
+
+# Thread pools of the numeric libraries the child imports
+_THREAD_ENV_VARS = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS")
+
+# POSIX: the child applies its own limits, then execs the retrainer
+# (argv: nice, address-space bytes, script, script args...). A preexec_fn
+# would run Python between fork and exec in a multi-threaded server.
+_LIMIT_SHIM = (
+    "import os, sys, resource\n"
+    "nice, limit = int(sys.argv[1]), int(sys.argv[2])\n"
+    "if nice: os.nice(nice)\n"
+    "if limit: resource.setrlimit(resource.RLIMIT_AS, (limit, limit))\n"
+    "os.execv(sys.executable, [sys.executable] + sys.argv[3:])\n"
+)
+
+if os.name == "nt":
+    import msvcrt
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+else:
+    import fcntl
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+
+def _pid_alive(pid) -> bool:
+    if not isinstance(pid, int) or pid <= 0:
+        return False
+    if os.name == "nt":
+        return True  # os.kill would terminate it; the holder removes the file when it ends
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class RetrainAlreadyRunning(Exception):
+    """Raised when a retrain is requested while one is in progress; the router answers 409."""
+
+
+class RetrainJob:
+    """
+    run() launches the retrainer as a child process with a raised nice value,
+    an address-space cap and TRAIN_N_JOBS / BLAS thread limits, waits for it on
+    a worker thread, then hot-swaps the serving model if a new registry
+    version was published. One run at a time per host: a run holds LOCK_FILE
+    for its whole duration, and a worker that can't take it skips.
+    """
+
+    def __init__(self, recommender: RecommendationService, nice: int = 10, n_jobs: int = 1,
+                 memory_limit_mb: int = 4096, timeout_s: float = 3600):
+        self.recommender     = recommender
+        self.nice            = max(0, nice)
+        self.n_jobs          = max(1, n_jobs)
+        self.memory_limit_mb = max(0, memory_limit_mb)  # 0 = no cap
+        self.timeout_s       = timeout_s
+
+        self._scheduler = None  # APScheduler and job id of the weekly run, see attach_scheduler()
+        self._job_id: Optional[str] = None
+
+        self._running: Optional[dict] = None
+        self._task: Optional[asyncio.Task] = None  # manual run started by start()
+        self._history = deque(maxlen=HISTORY_RUNS)
+
+    # ── Child process ─────────────────────────────────────────────────────────
+
+    def _command(self, full: bool) -> list:
+        cmd = [RETRAIN_SCRIPT] + (["--full"] if full else [])
+        if os.name == "posix":
+            limit = self.memory_limit_mb * 1024 * 1024
+            return [sys.executable, "-c", _LIMIT_SHIM, str(self.nice), str(limit)] + cmd
+        return [sys.executable] + cmd
+
+    def _popen_kwargs(self) -> dict:
+        env = dict(os.environ, TRAIN_N_JOBS=str(self.n_jobs), PYTHONIOENCODING="utf-8")
+        env.update({var: str(self.n_jobs) for var in _THREAD_ENV_VARS})
+        kwargs = {"cwd": DATASET_DIR, "env": env}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.BELOW_NORMAL_PRIORITY_CLASS  # no rlimits on Windows
+        return kwargs
+
+    def _run_process(self, full: bool) -> tuple:
+        cmd = self._command(full)
+        try:
+            proc = subprocess.run(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, encoding="utf-8", errors="replace",
+                timeout=self.timeout_s, **self._popen_kwargs(),
+            )
+            return proc.returncode, proc.stdout
+        except subprocess.TimeoutExpired as e:
+            output = e.stdout.decode("utf-8", "replace") if isinstance(e.stdout, bytes) else (e.stdout or "")
+            return None, output + f"\nKilled after {self.timeout_s:.0f}s timeout"
+
+    # ── Runs ──────────────────────────────────────────────────────────────────
+
+    def _lock_path(self) -> str:
+        return os.path.join(self.recommender.registry.root, LOCK_FILE)
+
+    def _acquire_lock(self) -> int:
+        """Take the host-wide retrain lock; raises RetrainAlreadyRunning if another process holds it."""
+        os.makedirs(self.recommender.registry.root, exist_ok=True)
+        fd = os.open(self._lock_path(), os.O_RDWR | os.O_CREAT, 0o600)
+        if not _try_lock(fd):
+            os.close(fd)
+            raise RetrainAlreadyRunning("Retrain running in another worker process")
+        return fd
+
+    def _state_path(self) -> str:
+        return os.path.join(self.recommender.registry.root, STATE_FILE)
+
+    def _write_state(self, run: dict):
+        """Publish the run this process holds the lock for."""
+        state = {"pid": os.getpid(), **{k: run[k] for k in ("trigger", "mode", "started_at")}}
+        tmp = f"{self._state_path()}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self._state_path())
+
+    def _clear_state(self):
+        try:
+            os.remove(self._state_path())
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove retrain state file: {e}")
+
+    def _running_elsewhere(self) -> Optional[dict]:
+        """
+        The run another worker holds the lock for, read from its state file —
+        never by probing the lock, which would make a real run that fires at
+        the same moment skip. A file left by a crashed process is ignored.
+        """
+        try:
+            with open(self._state_path(), encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not _pid_alive(state.get("pid")):
+            return None
+        return state
+
+    def _begin(self, full: bool, trigger: str) -> tuple:
+        """Claim the run synchronously (no await) so two triggers can't both start one."""
+        if self._running is not None:
+            raise RetrainAlreadyRunning(f"Retrain running since {self._running['started_at']}")
+        lock_fd = self._acquire_lock()
+        run = {
+            "trigger":        trigger,
+            "mode":           "full" if full else "incremental",
+            "started_at":     datetime.now().isoformat(timespec="seconds"),
+            "version_before": self.recommender.registry.current_version(),
+        }
+        try:
+            self._write_state(run)
+        except OSError as e:
+            logger.warning(f"Could not write retrain state file: {e}")  # only the status of other workers suffers
+        self._running = run
+        return run, lock_fd
+
+    async def run(self, full: bool = False, trigger: str = "schedule") -> dict:
+        run, lock_fd = self._begin(full, trigger)
+        return await self._execute(run, lock_fd, full)
+
+    def start(self, full: bool = False, trigger: str = "manual") -> asyncio.Task:
+        """
+        Start a run in the background (admin endpoint) and keep its task.
+        Raises RetrainAlreadyRunning straight away if one is in progress here
+        or in another worker.
+        """
+        run, lock_fd = self._begin(full, trigger)
+        self._task = asyncio.get_running_loop().create_task(self._execute(run, lock_fd, full))
+        self._task.add_done_callback(self._task_done)
+        return self._task
+
+    @staticmethod
+    def _task_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Manual retrain crashed: {task.exception()}")
+
+    async def _execute(self, run: dict, lock_fd: int, full: bool) -> dict:
+        try:
+            return await self._run_and_record(run, full)
+        finally:
+            self._running = None
+            self._clear_state()  # before the lock goes, so a state file always belongs to the holder
+            os.close(lock_fd)    # releases the host-wide lock
+
+    async def _run_and_record(self, run: dict, full: bool) -> dict:
+        registry = self.recommender.registry
+        logger.info("Model retrain started", extra={"trigger": run["trigger"], "mode": run["mode"]})
+        start = time.perf_counter()
+        try:
+            exit_code, output = await asyncio.to_thread(self._run_process, full)
+        except Exception as e:
+            exit_code, output = None, f"Could not start retrain process: {e}"
+
+        run["finished_at"]   = datetime.now().isoformat(timespec="seconds")
+        run["duration_s"]    = round(time.perf_counter() - start, 1)
+        run["exit_code"]     = exit_code
+        run["version_after"] = registry.current_version()
+        run["output_tail"]   = output.strip().splitlines()[-OUTPUT_TAIL_LINES:]
+        if exit_code != 0:
+            run["status"] = "failed"
+        elif run["version_after"] != run["version_before"]:
+            run["status"] = "published"
+        else:
+            run["status"] = "skipped"
+
+        self._history.appendleft(run)
+
+        log = logger.info if run["status"] != "failed" else logger.error
+        log(f"Model retrain {run['status']} in {run['duration_s']}s",
+            extra={"exit_code": exit_code, "version": run["version_after"]})
+
+        # The per-request pointer poll would pick the new version up too; swap
+        # now so the first request after a retrain doesn't trigger the load
+        if run["status"] == "published" and run["version_after"] != self.recommender.model_version:
+            await asyncio.to_thread(self.recommender.reload_model)
+        return run
+
+    async def scheduled_run(self):
+        """APScheduler entry point — a run in progress (here or in another worker) just skips this one."""
+        try:
+            await self.run(trigger="schedule")
+        except RetrainAlreadyRunning as e:
+            logger.info(f"Scheduled retrain skipped: {e}")  # expected in all workers but one
+
+    def attach_scheduler(self, scheduler, job_id: str):
+        """Report the next fire time of scheduler's job_id in status()."""
+        self._scheduler = scheduler
+        self._job_id = job_id
+
+    def _next_run_time(self) -> Optional[datetime]:
+        job = self._scheduler.get_job(self._job_id) if self._scheduler is not None else None
+        return job.next_run_time if job is not None else None
+
+    def status(self) -> dict:
+        next_run = self._next_run_time()
+        elsewhere = self._running_elsewhere() if self._running is None else None
+        if self._running is not None:
+            state = "running"
+        else:
+            state = "running_elsewhere" if elsewhere else "idle"
+        return {
+            "state":    state,
+            "running":  self._running or elsewhere,
+            "last_run": self._history[0] if self._history else None,
+            "history":  list(self._history),
+            "next_run": next_run.isoformat() if next_run else None,
+            "limits": {
+                "nice":            self.nice,
+                "n_jobs":          self.n_jobs,
+                "memory_limit_mb": self.memory_limit_mb,
+                "timeout_s":       self.timeout_s,
+            },
+        }
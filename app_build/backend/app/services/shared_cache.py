@@ -0,0 +1,337 @@
+# app/services/shared_cache.py
+# Second price-cache tier shared by every worker process on the host — a
+# memory-mapped slot table with TTL metadata, behind a small key/value
+# interface that a Redis-compatible backend can implement as well
+#
+# File layout (MmapSharedCache):
+#   header   64 B   magic "VYMC", format version, slot count, slot size, generation
+#   slot i   SLOT_SIZE B at 64 + i × SLOT_SIZE:
+#            seq u64 | key hash u64 | stored_at f64 | expires_at f64 | length u32 | JSON payload
+#
+# Readers never lock: a writer makes the slot's seq odd, writes, then makes it
+# even again, and a reader retries if seq was odd or changed under it
+# (seqlock). Writers serialise on an exclusive lock of the file itself.
+#
+# The format version and geometry are part of the file name, and a file is
+# never resized once published — peers have it mapped, and shrinking a mapped
+# file kills them with SIGBUS. A new file is built in full under a temp name
+# and only then linked into place. It lives in a private per-user directory.
+
+import os
+import json
+import mmap
+import stat
+import time
+import uuid
+import struct
+import hashlib
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR   = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_SLOTS = 1024
+SLOT_SIZE     = 8192   # bytes per slot; payloads above SLOT_SIZE - SLOT_HEADER are not shared
+PROBE_SLOTS   = 8      # linear-probe window per key
+READ_RETRIES  = 3      # seqlock retries before a read counts as a miss
+
+_MAGIC       = b"VYMC"
+_VERSION     = 1
+_FILE_HEADER = struct.Struct("<4sIIIQ")   # magic, version, slots, slot size, generation
+_FILE_HEADER_SIZE = 64
+_GEN_OFFSET  = 16                          # generation's offset inside the file header
+_SLOT        = struct.Struct("<QQddI")     # seq, key hash, stored_at, expires_at, length
+_SEQ         = struct.Struct("<Q")
+SLOT_HEADER  = 48
+
+_OPEN_FLAGS  = os.O_RDWR | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_BINARY", 0)
+
+
+def default_dir() -> str:
+    """$XDG_RUNTIME_DIR/vyaas (per-user, in memory) when set, else backend/run/."""
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    return os.path.join(runtime, "vyaas") if runtime else os.path.join(BACKEND_DIR, "run")
+
+
+def cache_filename(slots: int) -> str:
+    return f"mandi_cache-v{_VERSION}-{slots}x{SLOT_SIZE}.bin"
+
+
+def _check_owner(st: os.stat_result, path: str):
+    """Refuse a file or directory another user controls (POSIX)."""
+    if hasattr(os, "geteuid") and st.st_uid != os.geteuid():
+        raise OSError(f"{path} is owned by uid {st.st_uid}, not us")
+
+
+def _private_dir(path: str):
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise OSError(f"{path} is not a directory")
+    _check_owner(st, path)
+
+if os.name == "nt":
+    import msvcrt
+
+    def _lock_file(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+
+    def _unlock_file(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock_file(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_EX)
+
+    def _unlock_file(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+class SharedCache:
+    """
+    Interface of the shared tier. Values are JSON-serialisable; get() returns
+    (stored_at epoch seconds, value) or None once the entry expired. The
+    generation counter changes whenever a writer publishes a full refresh, so
+    workers know to drop their own per-process copies.
+
+    A Redis-compatible backend maps onto it as: set_many → one pipeline of
+    SET key {"stored_at", "value"} EX ttl (plus INCR generation when asked),
+    get → GET, generation → GET generation.
+    """
+
+    backend = "none"
+
+    def get(self, key: str) -> Optional[tuple]:
+        return None
+
+    def set_many(self, items: dict, ttl_s: float, bump_generation: bool = False) -> int:
+        """Store {key: value}; returns the number of entries written."""
+        return 0
+
+    def set(self, key: str, value, ttl_s: float) -> bool:
+        return self.set_many({key: value}, ttl_s) == 1
+
+    def generation(self) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        return {"backend": self.backend}
+
+    def close(self):
+        pass
+
+
+class MmapSharedCache(SharedCache):
+    """Fixed-size open-addressing table in a memory-mapped file (see the module header)."""
+
+    backend = "mmap"
+
+    def __init__(self, directory: str = "", slots: int = DEFAULT_SLOTS):
+        self.slots = max(PROBE_SLOTS, slots)
+        self.size  = _FILE_HEADER_SIZE + self.slots * SLOT_SIZE
+        self.dir   = directory or default_dir()
+        self.path  = os.path.join(self.dir, cache_filename(self.slots))
+        self._lock = threading.Lock()  # flock doesn't exclude threads sharing our descriptor
+
+        _private_dir(self.dir)
+        self._fd = self._open_file()
+        try:
+            self._mm = mmap.mmap(self._fd, self.size)
+        except Exception:
+            os.close(self._fd)
+            raise
+
+        self._hits = 0
+        self._misses = 0
+        self._writes = 0
+        self._too_large = 0
+
+    # ── File ──────────────────────────────────────────────────────────────────
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            _lock_file(self._fd)
+            try:
+                yield
+            finally:
+                _unlock_file(self._fd)
+
+    def _open_file(self) -> int:
+        """Open the cache file (never through a symlink), creating it if it doesn't exist yet."""
+        for _ in range(3):
+            try:
+                fd = os.open(self.path, _OPEN_FLAGS)
+            except FileNotFoundError:
+                self._create(replace=False)
+                continue
+            try:
+                if self._valid(fd):
+                    return fd
+            except Exception:
+                os.close(fd)
+                raise
+            os.close(fd)
+            # Same name, so same geometry: only a damaged file gets here. Peers
+            # that mapped it keep their (old) inode; nobody is truncated.
+            logger.warning(f"Shared price cache {self.path} is damaged — replacing it")
+            self._create(replace=True)
+        raise OSError(f"Could not open shared price cache {self.path}")
+
+    def _valid(self, fd: int) -> bool:
+        st = os.fstat(fd)
+        if not stat.S_ISREG(st.st_mode):
+            raise OSError(f"{self.path} is not a regular file")
+        _check_owner(st, self.path)
+        raw = os.pread(fd, _FILE_HEADER.size, 0) if hasattr(os, "pread") else os.read(fd, _FILE_HEADER.size)
+        if st.st_size != self.size or len(raw) != _FILE_HEADER.size:
+            return False
+        magic, version, slots, slot_size, _ = _FILE_HEADER.unpack(raw)
+        return (magic, version, slots, slot_size) == (_MAGIC, _VERSION, self.slots, SLOT_SIZE)
+
+    def _create(self, replace: bool):
+        """
+        Build a complete, empty file under a temp name, then publish it: linked
+        into place when missing (a peer that got there first wins), renamed
+        over a damaged one.
+        """
+        tmp = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        fd = os.open(tmp, _OPEN_FLAGS | os.O_CREAT | os.O_EXCL, 0o600)
+        try:
+            os.ftruncate(fd, self.size)  # zero-filled: every slot empty
+            os.write(fd, _FILE_HEADER.pack(_MAGIC, _VERSION, self.slots, SLOT_SIZE, 0))
+        finally:
+            os.close(fd)
+        try:
+            if replace:
+                os.replace(tmp, self.path)
+            else:
+                try:
+                    os.link(tmp, self.path)
+                except FileExistsError:
+                    pass
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        # 0 marks an empty slot, so never produce it
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") | 1
+
+    def _probe(self, h: int):
+        start = h % self.slots
+        for i in range(PROBE_SLOTS):
+            yield _FILE_HEADER_SIZE + ((start + i) % self.slots) * SLOT_SIZE
+
+    # ── Reads (lock-free) ─────────────────────────────────────────────────────
+
+    def get(self, key: str) -> Optional[tuple]:
+        h = self._hash(key)
+        now = time.time()
+        for off in self._probe(h):
+            for _ in range(READ_RETRIES):
+                seq, slot_hash, stored_at, expires_at, length = _SLOT.unpack_from(self._mm, off)
+                if seq & 1:
+                    continue  # being written
+                if slot_hash != h:
+                    break
+                payload = self._mm[off + SLOT_HEADER: off + SLOT_HEADER + length]
+                if _SEQ.unpack_from(self._mm, off)[0] != seq:
+                    continue  # rewritten while we read it
+                if expires_at <= now:
+                    break
+                try:
+                    entry = json.loads(payload)
+                except ValueError:
+                    break
+                if entry.get("k") != key:
+                    break  # hash collision
+                self._hits += 1
+                return stored_at, entry["v"]
+        self._misses += 1
+        return None
+
+    def generation(self) -> int:
+        return _SEQ.unpack_from(self._mm, _GEN_OFFSET)[0]
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def _slot_for(self, h: int, now: float) -> int:
+        """Slot offset for a key: its existing slot, else the first free/expired one, else the soonest to expire."""
+        free, oldest, oldest_expiry = None, None, None
+        for off in self._probe(h):
+            _, slot_hash, _, expires_at, _ = _SLOT.unpack_from(self._mm, off)
+            if slot_hash == h:
+                return off
+            if free is None and (slot_hash == 0 or expires_at <= now):
+                free = off
+            if oldest is None or expires_at < oldest_expiry:
+                oldest, oldest_expiry = off, expires_at
+        return free if free is not None else oldest
+
+    def set_many(self, items: dict, ttl_s: float, bump_generation: bool = False) -> int:
+        written = 0
+        now = time.time()
+        capacity = SLOT_SIZE - SLOT_HEADER
+        with self._write_lock():
+            for key, value in items.items():
+                payload = json.dumps({"k": key, "v": value}, separators=(",", ":"), default=str).encode()
+                if len(payload) > capacity:
+                    self._too_large += 1
+                    continue
+                h = self._hash(key)
+                off = self._slot_for(h, now)
+                seq = _SEQ.unpack_from(self._mm, off)[0]
+                seq += seq & 1  # a writer that died mid-write left it odd
+                _SEQ.pack_into(self._mm, off, seq + 1)  # odd: readers skip the slot
+                self._mm[off + SLOT_HEADER: off + SLOT_HEADER + len(payload)] = payload
+                _SLOT.pack_into(self._mm, off, seq + 1, h, now, now + ttl_s, len(payload))
+                _SEQ.pack_into(self._mm, off, seq + 2)
+                written += 1
+            if bump_generation:
+                _SEQ.pack_into(self._mm, _GEN_OFFSET, self.generation() + 1)
+        self._writes += written
+        return written
+
+    # ── Housekeeping ──────────────────────────────────────────────────────────
+
+    def stats(self) -> dict:
+        now = time.time()
+        used = 0
+        for i in range(self.slots):
+            _, slot_hash, _, expires_at, _ = _SLOT.unpack_from(self._mm, _FILE_HEADER_SIZE + i * SLOT_SIZE)
+            used += slot_hash != 0 and expires_at > now
+        return {
+            "backend":    self.backend,
+            "path":       self.path,
+            "slots":      self.slots,
+            "live_slots": used,
+            "generation": self.generation(),
+            "hits":       self._hits,
+            "misses":     self._misses,
+            "writes":     self._writes,
+            "too_large":  self._too_large,
+        }
+
+    def close(self):
+        self._mm.close()
+        os.close(self._fd)
+
+
+def open_shared_cache(backend: str = "mmap", directory: str = "", slots: int = DEFAULT_SLOTS) -> SharedCache:
+    """Shared tier for a MandiService: "mmap", or "none" to keep caching per process."""
+    if backend == "mmap":
+        try:
+            return MmapSharedCache(directory, slots)
+        except OSError as e:
+            logger.warning(f"Shared price cache unavailable ({e}) — caching per process only")
+    elif backend != "none":
+        logger.warning(f"Unknown shared cache backend {backend!r} — caching per process only")
+    return SharedCache()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# benchmarks/bench_forest_engine.py
+# Latency comparison: FlatForest vs sklearn predict_proba
+# (parity is covered by tests/test_forest_engine.py)
+#
+# Usage (from the backend folder):
+#   python benchmarks/bench_forest_engine.py [--rows 2000] [--repeat 500]
+
+import os
+import sys
+import time
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services.forest_engine import FlatForest
+from app.services.recommendation_service import MODEL_PATH, ENCODER_PATH, FEATURE_COLUMNS
+
+INPUTS_CSV = os.path.join(os.path.dirname(BACKEND_DIR), "dataset", "farmer_inputs.csv")
+
+
+def load_features(encoders, n_rows: int) -> pd.DataFrame:
+    df = pd.read_csv(INPUTS_CSV).head(n_rows)
+    for col in ("soil_type", "climate_zone"):
+        df[col] = encoders[col].transform(df[col])
+    return df[FEATURE_COLUMNS].astype(np.float64)
+
+
+def percentiles_ms(samples: list) -> tuple:
+    arr = np.asarray(samples) * 1000
+    return float(np.percentile(arr, 50)), float(np.percentile(arr, 99))
+
+
+def time_calls(fn, inputs: list) -> list:
+    samples = []
+    for x in inputs:
+        start = time.perf_counter()
+        fn(x)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FlatForest vs sklearn predict_proba benchmark")
+    parser.add_argument("--rows", type=int, default=2000, help="rows of farmer_inputs.csv to sample from")
+    parser.add_argument("--repeat", type=int, default=500, help="single-row calls to time")
+    args = parser.parse_args()
+
+    model    = joblib.load(MODEL_PATH)
+    encoders = joblib.load(ENCODER_PATH)
+
+    start = time.perf_counter()
+    forest = FlatForest.from_sklearn(model)
+    print(f"Flattened {forest.n_trees} trees in {(time.perf_counter() - start) * 1000:.0f} ms "
+          f"({forest.nbytes / 1e6:.1f} MB, max depth {forest.max_depth})")
+
+    df = load_features(encoders, args.rows)
+    X  = df.to_numpy()
+
+    # ── Single-row latency ────────────────────────────────────────────────────
+    idx = np.arange(args.repeat) % len(X)
+    sk_rows   = [df.iloc[[i]] for i in idx]
+    flat_rows = [X[i:i + 1] for i in idx]
+    model.predict_proba(sk_rows[0]); forest.predict_proba(flat_rows[0])  # warm up
+
+    sk_p50, sk_p99     = percentiles_ms(time_calls(model.predict_proba, sk_rows))
+    flat_p50, flat_p99 = percentiles_ms(time_calls(forest.predict_proba, flat_rows))
+
+    print("\nSingle row (ms)        p50       p99")
+    print(f"  sklearn         {sk_p50:9.3f} {sk_p99:9.3f}")
+    print(f"  FlatForest      {flat_p50:9.3f} {flat_p99:9.3f}")
+    print(f"  speed-up        {sk_p50 / flat_p50:8.1f}x {sk_p99 / flat_p99:8.1f}x")
+
+    # ── Batch latency ─────────────────────────────────────────────────────────
+    print("\nBatch (ms, p50)     sklearn  FlatForest")
+    for size in (32, 512):
+        size = min(size, len(X))
+        sk_p50, _   = percentiles_ms(time_calls(model.predict_proba, [df.iloc[:size]] * 20))
+        flat_p50, _ = percentiles_ms(time_calls(forest.predict_proba, [X[:size]] * 20))
+        print(f"  {size:>4} rows     {sk_p50:9.2f} {flat_p50:11.2f}")
+
+
+if __name__ == "__main__":
+    main()
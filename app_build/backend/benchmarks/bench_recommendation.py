@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+# benchmarks/bench_recommendation.py
+# End-to-end RecommendationService benchmark — per-stage timings, batch
+# throughput and peak memory, replaying farm payloads built from farmer_inputs.csv
+#
+# Usage (from the backend folder):
+#   python benchmarks/bench_recommendation.py [--farms 2000] [--repeat 5] [--out results.json]
+#
+# Results are written as JSON (default: benchmarks/results/recommendation-<timestamp>.json)
+# so runs against different models or code revisions can be diffed.
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import contextlib
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from app.services.recommendation_service import RecommendationService, FLAT_FOREST_MAX_ROWS
+
+INPUTS_CSV  = os.path.join(os.path.dirname(BACKEND_DIR), "dataset", "farmer_inputs.csv")
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+BATCH_SIZES    = (1, 32, 512)
+PREVIOUS_CROPS = ["", "", "", "Chickpea", "Soybean", "Rice", "Ginger", "Tomato", "Lentil", "Wheat"]
+STAGES = ("features", "predict_proba", "floor", "filter", "output")
+
+
+# ── Payloads ──────────────────────────────────────────────────────────────────
+
+def load_farms(n_farms: int, seed: int) -> list:
+    """
+    Farm payloads shaped like /api/farm/save output: the soil/climate columns
+    of farmer_inputs.csv plus a farm size, budget and previous crop.
+    """
+    df  = pd.read_csv(INPUTS_CSV)
+    df  = df.sample(n_farms, replace=n_farms > len(df), random_state=seed)
+    rng = random.Random(seed)
+    farms = []
+    for r in df.to_dict("records"):
+        farms.append({
+            "nitrogen":       r["nitrogen"],
+            "phosphorus":     r["phosphorus"],
+            "potassium":      r["potassium"],
+            "ph":             r["ph"],
+            "soil_moisture":  r["soil_moisture"],
+            "organic_carbon": r["organic_carbon"],
+            "soilType":       r["soil_type"],
+            "temperature":    r["temperature"],
+            "rainfall":       r["rainfall"],
+            "humidity":       r["humidity"],
+            "budget":         r["budget"],
+            "climate_zone":   r["climate_zone"],
+            "farmSize":       rng.choice([0.5, 1, 2, 2.5, 5, 10]),
+            "previousCrop":   rng.choice(PREVIOUS_CROPS),
+        })
+    return farms
+
+
+# ── Measurements ──────────────────────────────────────────────────────────────
+
+def summarize(samples: list) -> dict:
+    arr = np.asarray(samples) * 1000
+    return {
+        "n":       int(arr.size),
+        "mean_ms": round(float(arr.mean()), 4),
+        "p50_ms":  round(float(np.percentile(arr, 50)), 4),
+        "p95_ms":  round(float(np.percentile(arr, 95)), 4),
+        "p99_ms":  round(float(np.percentile(arr, 99)), 4),
+        "max_ms":  round(float(arr.max()), 4),
+    }
+
+
+def time_stages(svc: RecommendationService, farms: list, top_k: int) -> dict:
+    """Single-farm pipeline, timing each stage the way predict_crops_batch runs it."""
+    bundle  = svc._bundle
+    engine  = bundle.filter_engine
+    samples = {stage: [] for stage in STAGES}
+    clock   = time.perf_counter
+
+    for farm in farms:
+        farm_size = float(farm["farmSize"])
+        budget    = float(farm["budget"])
+
+        t0 = clock()
+        row = svc._build_features(farm, bundle.encoders)
+        t1 = clock()
+        probs = svc._predict_proba(bundle, [row])[0]
+        t2 = clock()
+        p, norm, pool, limited = engine.floor(probs, top_k)
+        t3 = clock()
+        filtered = engine.filter(p, norm, pool, farm, farm_size, budget, top_k)
+        t4 = clock()
+        svc._build_output(filtered, limited, farm, farm_size, budget)
+        t5 = clock()
+
+        for stage, elapsed in zip(STAGES, (t1 - t0, t2 - t1, t3 - t2, t4 - t3, t5 - t4)):
+            samples[stage].append(elapsed)
+
+    return {stage: summarize(s) for stage, s in samples.items()}
+
+
+def time_batches(svc: RecommendationService, farms: list, batch_size: int, repeat: int, top_k: int) -> dict:
+    """
+    predict_crops_batch throughput with the result cache cleared before every
+    call. Each size scores repeat × 512 farms in total, cycling over the payloads.
+    """
+    batches = [farms[i:i + batch_size] for i in range(0, len(farms) - batch_size + 1, batch_size)]
+    n_calls = max(1, repeat) * max(1, 512 // batch_size)
+
+    samples = []
+    for call in range(n_calls):
+        batch = batches[call % len(batches)]
+        svc.clear_cache()
+        start = time.perf_counter()
+        svc.predict_crops_batch(batch, top_k)
+        samples.append(time.perf_counter() - start)
+
+    stats = summarize(samples)
+    stats["batch_size"]    = batch_size
+    stats["farms_per_sec"] = round(batch_size * len(samples) / sum(samples), 1)
+    stats["engine"]        = "FlatForest" if batch_size <= FLAT_FOREST_MAX_ROWS else "sklearn"
+    return stats
+
+
+def peak_memory(svc: RecommendationService, farms: list, batch_size: int, top_k: int) -> dict:
+    """Python-heap peak (tracemalloc) for one uncached batch, on top of the loaded model."""
+    svc.clear_cache()
+    tracemalloc.start()
+    svc.predict_crops_batch(farms[:batch_size], top_k)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"batch_size": batch_size, "peak_mb": round(peak / 1e6, 3), "retained_mb": round(current / 1e6, 3)}
+
+
+def max_rss_mb() -> float:
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(rss / 1e6 if sys.platform == "darwin" else rss / 1e3, 1)  # bytes on macOS, KiB on Linux
+    except ImportError:
+        return None
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except Exception:
+        return ""
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="RecommendationService benchmark")
+    parser.add_argument("--farms", type=int, default=2000, help="farm payloads to sample from farmer_inputs.csv")
+    parser.add_argument("--repeat", type=int, default=5, help="x 512 farms scored per batch size")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="JSON results path")
+    args = parser.parse_args()
+
+    farms = load_farms(max(args.farms, max(BATCH_SIZES)), args.seed)
+
+    # Service and pipeline prints would swamp the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        svc = RecommendationService()
+        load_seconds = time.perf_counter() - start
+    if not svc.ready:
+        print("❌ No model found — train one with dataset/train_crop_model.py first")
+        sys.exit(1)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        svc.predict_crops_batch(farms[:8], args.top_k)  # warm up
+        stages  = time_stages(svc, farms[:args.farms], args.top_k)
+        batches = [time_batches(svc, farms, size, args.repeat, args.top_k) for size in BATCH_SIZES]
+        memory  = [peak_memory(svc, farms, size, args.top_k) for size in BATCH_SIZES]
+
+    results = {
+        "timestamp":     datetime.now().isoformat(timespec="seconds"),
+        "git_revision":  git_revision(),
+        "model_version": svc.model_version,
+        "python":        platform.python_version(),
+        "numpy":         np.__version__,
+        "pandas":        pd.__version__,
+        "farms":         args.farms,
+        "top_k":         args.top_k,
+        "load_seconds":  round(load_seconds, 3),
+        "stages":        stages,
+        "batches":       batches,
+        "memory":        memory,
+        "max_rss_mb":    max_rss_mb(),
+    }
+
+    # ── Report ────────────────────────────────────────────────────────────────
+    print(f"Model {svc.model_version} loaded in {load_seconds:.2f}s — {args.farms} farms, top_k={args.top_k}")
+    print("\nStage (ms)            mean      p50      p99")
+    for stage, s in stages.items():
+        print(f"  {stage:<16} {s['mean_ms']:8.3f} {s['p50_ms']:8.3f} {s['p99_ms']:8.3f}")
+    total = sum(s["mean_ms"] for s in stages.values())
+    print(f"  {'total':<16} {total:8.3f}")
+
+    print("\nBatch        engine       p50 ms    farms/s")
+    for b in batches:
+        print(f"  {b['batch_size']:>4}       {b['engine']:<10} {b['p50_ms']:9.2f} {b['farms_per_sec']:10.1f}")
+
+    print("\nPeak memory (tracemalloc)")
+    for m in memory:
+        print(f"  batch {m['batch_size']:>4}   {m['peak_mb']:8.2f} MB")
+    print(f"  max RSS      {results['max_rss_mb']} MB")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"recommendation-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,12 @@
+# tests/conftest.py
+# Run from app_build/backend: python -m pytest -q
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+# Settings refuses to load without the data.gov.in key; tests never call the API
+os.environ.setdefault("DATA_GOV_API_KEY", "test")
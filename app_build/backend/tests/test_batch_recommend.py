@@ -0,0 +1,69 @@
+# tests/test_batch_recommend.py
+# /api/ml/recommend/batch: saved farms come from one query and farmers are
+# marked active with one UPDATE, both off the event loop
+
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import ml_router
+
+
+class FakeFarmService:
+    def __init__(self, farms):
+        self.farms = farms
+        self.calls = []
+
+    def get_farms_details(self, farm_ids):
+        self.calls.append(("get_farms_details", list(farm_ids), threading.current_thread()))
+        return {fid: self.farms[fid] for fid in farm_ids if fid in self.farms}
+
+    def mark_farmers_active(self, farmer_ids):
+        self.calls.append(("mark_farmers_active", list(farmer_ids), threading.current_thread()))
+
+    def get_farm_details(self, farm_id):
+        raise AssertionError("per-farm lookup in the batch endpoint")
+
+    def mark_farmer_active(self, farmer_id):
+        raise AssertionError("per-farmer UPDATE in the batch endpoint")
+
+
+@pytest.fixture
+def client(monkeypatch):
+    farms = {f"F{i}": {"farm_id": f"F{i}", "farmer_id": f"U{i % 3}", "nitrogen": i} for i in range(10)}
+    fake = FakeFarmService(farms)
+    monkeypatch.setattr(ml_router, "farm_service", fake)
+    monkeypatch.setattr(ml_router, "_require_model", lambda: None)
+
+    async def run_batch(found, top_k=3, timings=None):
+        fake.loop_thread = threading.current_thread()
+        return [[{"crop_name": "Tulsi", "nitrogen": f["nitrogen"]}] for f in found]
+
+    monkeypatch.setattr(ml_router.scheduler, "run_batch", run_batch)
+    app = FastAPI()
+    app.include_router(ml_router.router)
+    return TestClient(app), fake
+
+
+def test_batch_uses_one_query_and_one_update(client):
+    http, fake = client
+    ids = [f"F{i}" for i in range(10)] + ["MISSING"]
+    body = http.post("/api/ml/recommend/batch", json={"farm_ids": ids}).json()
+
+    assert [r["farm_id"] for r in body["results"]] == ids
+    assert [r["status"] for r in body["results"]] == ["success"] * 10 + ["no_data"]
+    assert body["results"][4]["recommendations"] == [{"crop_name": "Tulsi", "nitrogen": 4}]
+
+    assert [name for name, _, _ in fake.calls] == ["get_farms_details", "mark_farmers_active"]
+    assert fake.calls[0][1] == ids
+    assert sorted(set(fake.calls[1][1])) == ["U0", "U1", "U2"]
+    assert all(thread is not fake.loop_thread for _, _, thread in fake.calls)
+
+
+def test_inline_farms_skip_the_query(client):
+    http, fake = client
+    body = http.post("/api/ml/recommend/batch", json={"farms": [{"farm_id": "X", "nitrogen": 7}]}).json()
+    assert body["results"][0]["status"] == "success"
+    assert "get_farms_details" not in [name for name, _, _ in fake.calls]
@@ -0,0 +1,393 @@
+# tests/test_filter_engine.py
+# FilterEngine.run() against a frozen copy of the per-candidate filter loop it
+# replaced, run over crops_merged.csv as a DataFrame — same survivors, same
+# order, same scores and badges. Where the engine deliberately behaves
+# differently, a separate test pins both sides down.
+
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+from app.services.crop_catalog import MERGED_PATH, CropCatalog, CropRecord
+from app.services.filter_engine import FilterEngine
+
+
+# ── Frozen baseline ───────────────────────────────────────────────────────────
+# Copied verbatim from RecommendationService before the FilterEngine: Stage 1
+# and the candidate lookup from predict_crops (farm_size and budget come in as
+# arguments, as FilterEngine.run takes them), and the per-candidate layers.
+# Do not edit — it is the reference the engine is held to.
+
+LEGUMES = {"chickpea", "green gram", "black gram", "soybean", "pigeon pea", "lentil", "kidney bean"}
+
+
+class BaselineFilter:
+    def __init__(self, merged_df: pd.DataFrame, crop_names: list):
+        self.merged_df = merged_df
+        self.target_encoder = LabelEncoder()
+        self.target_encoder.classes_ = np.asarray(crop_names, dtype=object)
+
+    def run(self, probs, farm_data, farm_size, budget, top_k):
+        classes = np.arange(len(probs))
+
+        # ── Stage 1: 20% suitability floor ───────────────────────────────
+        # Sort all crops by raw probability (descending)
+        all_sorted = sorted(
+            [(float(p), int(cls)) for cls, p in zip(classes, probs)],
+            key=lambda x: x[0], reverse=True
+        )
+
+        # Normalise relative to the TOP scorer so scores are meaningful %
+        top_prob = all_sorted[0][0] if all_sorted else 1.0
+        norm_scores = [
+            (round(p / top_prob * 100, 1), cls)
+            for p, cls in all_sorted
+        ]
+
+        # Apply 20% floor against normalised scores
+        above_floor = [(score, cls) for score, cls in norm_scores if score >= 20.0]
+
+        limited_options = False
+        if len(above_floor) < top_k:
+            # Fallback: take top_k regardless — flag so frontend knows
+            above_floor = norm_scores[:max(top_k * 3, 10)]  # wider pool for filter engine
+            limited_options = True
+            print(f"[ML] Limited options — fewer than {top_k} crops above 20% floor")
+
+        # ── Stage 2: Filter Engine ────────────────────────────────────────
+
+        candidates = []
+        for raw_score, cls_idx in above_floor:
+            crop_name = (
+                str(self.target_encoder.inverse_transform([cls_idx])[0])
+                if self.target_encoder else str(cls_idx)
+            )
+            if self.merged_df is None:
+                continue
+            row = self.merged_df[self.merged_df["crop_name"].str.lower() == crop_name.lower()]
+            if row.empty:
+                continue
+            crop_row = row.iloc[0]
+            candidates.append({
+                "crop_name": crop_name,
+                "crop_row":  crop_row,
+                "score":     raw_score,
+            })
+
+        filtered = self._apply_filter_engine(candidates, farm_data, farm_size, budget)
+
+        # ── Stage 3: Top K + build output ────────────────────────────────
+        filtered = sorted(filtered, key=lambda x: x["score"], reverse=True)[:top_k]
+        return filtered, limited_options
+
+    def _apply_filter_engine(self, candidates, farm_data, farm_size, budget):
+        result = []
+        for c in candidates:
+            c = dict(c)  # copy so we can mutate score safely
+
+            # Layer 1 — Budget
+            c = self._budget_filter(c, farm_size, budget)
+            if c is None:
+                continue
+
+            # Layer 2 — Weather penalty
+            c = self._weather_penalty(c, farm_data)
+            if c is None:
+                continue
+
+            # Layer 3a — Rotation restriction penalty
+            c = self._rotation_restriction(c, farm_data)
+
+            # Layer 3b — Legume nitrogen bonus
+            c = self._legume_bonus(c, farm_data)
+
+            # Layer 3c — Soil restoration bonus
+            c = self._restoration_bonus(c)
+
+            result.append(c)
+        return result
+
+    def _budget_filter(self, c, farm_size, budget):
+        """Layer 1: demotion or removal based on cultivation cost vs budget."""
+        r = c["crop_row"]
+        try:
+            min_cost = float(r["cost_of_cultivation_min"]) * farm_size
+        except Exception:
+            return c  # no cost data — let it pass
+
+        over_pct = (min_cost - budget) / budget if budget > 0 else 0
+
+        if over_pct <= 0:
+            # Within budget — no change
+            return c
+        elif over_pct <= 0.40:
+            # 10–40% over: demote
+            c["score"] *= 0.75
+            c["over_budget_badge"] = f"Over budget by ~{int(over_pct*100)}%"
+        else:
+            # >40% over budget
+            if c["score"] < 65.0:
+                print(f"[ML] Budget hard-remove: {c['crop_name']} (score {c['score']:.1f}%, cost ₹{int(min_cost):,} vs budget ₹{int(budget):,})")
+                return None  # hard remove
+            else:
+                # High confidence — demote heavily but show
+                c["score"] *= 0.60
+                c["over_budget_badge"] = f"Well over budget — cost ≈ ₹{int(min_cost):,}"
+        return c
+
+    def _weather_penalty(self, c, farm_data):
+        """Layer 2: 3-zone temperature + rainfall penalty."""
+        r   = c["crop_row"]
+        badges = []
+
+        # Temperature check
+        try:
+            farm_temp  = float(farm_data.get("temperature", 25))
+            temp_min   = float(r["temp_min_c"])
+            temp_max   = float(r["temp_max_c"])
+
+            if farm_temp < temp_min:
+                delta = temp_min - farm_temp
+            elif farm_temp > temp_max:
+                delta = farm_temp - temp_max
+            else:
+                delta = 0
+
+            if delta > 10:
+                print(f"[ML] Weather hard-remove: {c['crop_name']} (temp delta {delta:.1f}°C)")
+                return None
+            elif delta > 5:
+                c["score"] *= 0.60
+                badges.append(f"High heat stress ({delta:.0f}°C outside range)")
+            elif delta > 0:
+                c["score"] *= 0.85
+                badges.append(f"Mild heat stress ({delta:.0f}°C outside range)")
+        except Exception:
+            pass
+
+        # Rainfall check
+        try:
+            farm_rain  = float(farm_data.get("rainfall", 800))
+            rain_min   = float(r["annual_rainfall_min_mm"])
+
+            if farm_rain < rain_min:
+                deficit_pct = (rain_min - farm_rain) / rain_min
+                if deficit_pct > 0.40:
+                    print(f"[ML] Rainfall hard-remove: {c['crop_name']} (deficit {deficit_pct*100:.0f}%)")
+                    return None
+                elif deficit_pct > 0.20:
+                    c["score"] *= 0.80
+                    badges.append(f"Rainfall deficit — needs {int(rain_min)}mm, you have {int(farm_rain)}mm")
+        except Exception:
+            pass
+
+        if badges:
+            c["weather_badge"] = "; ".join(badges)
+        return c
+
+    def _rotation_restriction(self, c, farm_data):
+        """Layer 3a: penalise if previous crop is in restrictions list."""
+        prev_crop = str(farm_data.get("previousCrop", "")).strip().lower()
+        if not prev_crop:
+            return c
+        try:
+            restrictions_raw = str(c["crop_row"].get("previous_crop_restrictions", ""))
+            restrictions = [x.strip().lower() for x in restrictions_raw.split("|") if x.strip()]
+            if prev_crop in restrictions:
+                c["score"] *= 0.50
+                c["rotation_badge"] = f"Caution: Soil may carry residue from your previous {farm_data.get('previousCrop')} crop"
+        except Exception:
+            pass
+        return c
+
+    def _legume_bonus(self, c, farm_data):
+        """Layer 3b: +20% score if previous crop was a legume AND this crop needs high nitrogen."""
+        prev_crop = str(farm_data.get("previousCrop", "")).strip().lower()
+        if prev_crop not in LEGUMES:
+            return c
+        try:
+            n_req = str(c["crop_row"].get("n_requirement", "")).strip().lower()
+            if n_req == "high":
+                c["score"] *= 1.20
+                c["legume_bonus"] = True
+        except Exception:
+            pass
+        return c
+
+    def _restoration_bonus(self, c):
+        """Layer 3c: +5% for crops that improve soil for the next cycle."""
+        try:
+            sri = float(c["crop_row"].get("soil_restoration_index", 0))
+            if sri >= 0.75:
+                c["score"] *= 1.05
+                c["restoration_bonus"] = True
+        except Exception:
+            pass
+        return c
+
+
+# ── Fixtures ──────────────────────────────────────────────────────────────────
+
+@pytest.fixture(scope="module")
+def merged_df():
+    try:
+        return pd.read_csv(MERGED_PATH)
+    except FileNotFoundError:
+        pytest.skip("crops_merged.csv not available")
+
+
+def _catalog(df: pd.DataFrame) -> CropCatalog:
+    # what CropCatalog.from_csv builds, from an in-memory frame
+    return CropCatalog(CropRecord.from_row(r) for r in df[df["crop_name"].notna()].to_dict("records"))
+
+
+@pytest.fixture(scope="module")
+def crop_names(merged_df):
+    # model classes are the CSV's crops; one unknown class exercises the skip
+    return list(merged_df["crop_name"]) + ["Not A Crop"]
+
+
+@pytest.fixture(scope="module")
+def engine(merged_df, crop_names):
+    return FilterEngine(crop_names, _catalog(merged_df))
+
+
+@pytest.fixture(scope="module")
+def baseline(merged_df, crop_names):
+    return BaselineFilter(merged_df, crop_names)
+
+
+def _random_farm(rng: random.Random, crop_names) -> dict:
+    prev = rng.choice([*crop_names, *sorted(LEGUMES), "", "  Chickpea ", "WHEAT"])
+    return {
+        "temperature":  round(rng.uniform(-5, 50), 1),
+        "rainfall":     round(rng.uniform(0, 3000), 0),
+        "ph":           round(rng.uniform(3.5, 9.5), 1),
+        "previousCrop": prev,
+    }
+
+
+def _random_probs(rng: np.random.Generator, n: int) -> np.ndarray:
+    # peaked distributions (few above the floor) as well as flat ones
+    probs = rng.dirichlet(np.full(n, rng.choice([0.05, 0.3, 1.0])))
+    # the RF emits exact ties (leaf fractions); reproduce some
+    if rng.random() < 0.3:
+        probs = np.round(probs * 50) / 50
+        if probs.sum() == 0:
+            probs[0] = 1.0
+    return probs
+
+
+def _flags(c: dict) -> dict:
+    """Badges and bonus flags: everything but the score and the crop data itself."""
+    return {k: v for k, v in c.items() if k not in ("score", "crop", "crop_row")}
+
+
+def _assert_same(got, want):
+    got_c, got_limited = got
+    want_c, want_limited = want
+    assert got_limited == want_limited
+    assert [c["crop_name"] for c in got_c] == [c["crop_name"] for c in want_c]
+    for g, w in zip(got_c, want_c):
+        assert g["crop"].name == w["crop_row"]["crop_name"]
+        assert g["score"] == pytest.approx(w["score"], rel=1e-12)
+        assert _flags(g) == _flags(w)
+
+
+# ── Parity ────────────────────────────────────────────────────────────────────
+
+@pytest.mark.parametrize("seed", range(20))
+def test_matches_baseline_on_random_farms(seed, engine, baseline, crop_names):
+    rng = random.Random(seed)
+    nrng = np.random.default_rng(seed)
+    for _ in range(25):
+        farm = _random_farm(rng, crop_names)
+        farm_size = rng.choice([0.5, 1.0, 2.5, 10.0])
+        budget = rng.choice([0.0, 5000.0, 25000.0, 50000.0, 200000.0])
+        top_k = rng.choice([1, 3, 5])
+        probs = _random_probs(nrng, len(crop_names))
+        _assert_same(
+            engine.run(probs, farm, farm_size, budget, top_k),
+            baseline.run(probs, farm, farm_size, budget, top_k),
+        )
+
+
+@pytest.mark.parametrize("farm", [
+    {},                                                    # every field missing → defaults
+    {"temperature": None, "rainfall": None},               # unparseable → layer skipped
+    {"temperature": "hot", "rainfall": "lots"},
+    {"temperature": 25, "rainfall": -200, "ph": -1},       # out of range
+    {"temperature": 25, "rainfall": 1e9, "ph": 14.5},
+    {"temperature": 25, "rainfall": 800, "previousCrop": None},
+])
+def test_matches_baseline_on_edge_farms(farm, engine, baseline, crop_names):
+    probs = _random_probs(np.random.default_rng(7), len(crop_names))
+    for top_k in (1, 3, 10):
+        _assert_same(
+            engine.run(probs, farm, 1.0, 50000.0, top_k),
+            baseline.run(probs, farm, 1.0, 50000.0, top_k),
+        )
+
+
+def test_empty_survivor_set(engine, baseline, crop_names):
+    # far outside every crop's temperature range: all hard-removed
+    farm = {"temperature": 80, "rainfall": 800}
+    probs = np.full(len(crop_names), 1.0 / len(crop_names))
+    assert engine.run(probs, farm, 1.0, 50000.0, 3) == ([], False)
+    assert baseline.run(probs, farm, 1.0, 50000.0, 3) == ([], False)
+
+
+def test_limited_options_fallback(engine, baseline, crop_names):
+    # one dominant class: nothing else reaches the 20% floor
+    probs = np.full(len(crop_names), 0.001)
+    probs[0] = 1.0
+    got = engine.run(probs, {}, 1.0, 50000.0, 3)
+    assert got[1] is True
+    _assert_same(got, baseline.run(probs, {}, 1.0, 50000.0, 3))
+
+
+# ── Intended differences from the baseline ────────────────────────────────────
+
+def test_missing_cost_passes_the_budget_layer(merged_df):
+    """
+    New behaviour: a crop with no cost_of_cultivation_min passes the budget
+    layer untouched, which is what the baseline's "no cost data — let it pass"
+    branch meant. The baseline only caught an unparseable value: NaN made
+    over_pct NaN, which fell through to the >40% branch, and int(nan) in its
+    log line / badge raised — predict_crops then returned no recommendations
+    at all for that farm.
+    """
+    df = merged_df.copy()
+    df.loc[0, "cost_of_cultivation_min"] = np.nan
+    names = [df.loc[0, "crop_name"], df.loc[1, "crop_name"]]
+    engine, baseline = FilterEngine(names, _catalog(df)), BaselineFilter(df, names)
+    farm = {"temperature": df.loc[0, "temp_min_c"], "rainfall": 1e9}
+
+    for probs in ([1.0, 0.5], [0.5, 1.0]):  # the NaN-cost crop scores 100 (≥ 65), then 50
+        got, _ = engine.run(np.array(probs), farm, 1.0, 1.0, 2)
+        nan_cost = next(c for c in got if c["crop_name"] == names[0])
+        assert "over_budget_badge" not in nan_cost
+        with pytest.raises(ValueError, match="NaN"):
+            baseline.run(np.array(probs), farm, 1.0, 1.0, 2)
+
+
+def test_blank_rotation_restrictions_match_nothing(merged_df):
+    """
+    New behaviour: a crop with no previous_crop_restrictions restricts
+    nothing. The baseline read the empty cell as the string "nan", so a
+    previous crop typed as "nan" halved its score.
+    """
+    blank = merged_df[merged_df["previous_crop_restrictions"].isna()].iloc[:1]
+    if blank.empty:
+        pytest.skip("every crop in crops_merged.csv lists rotation restrictions")
+    names = list(blank["crop_name"])
+    engine, baseline = FilterEngine(names, _catalog(blank)), BaselineFilter(blank, names)
+    farm = {"previousCrop": "nan", "temperature": blank.iloc[0]["temp_min_c"], "rainfall": 1e9}
+
+    got, _ = engine.run(np.array([1.0]), farm, 1.0, 1e9, 1)
+    want, _ = baseline.run(np.array([1.0]), farm, 1.0, 1e9, 1)
+    assert "rotation_badge" not in got[0] and "rotation_badge" in want[0]
+    assert got[0]["score"] == pytest.approx(want[0]["score"] * 2, rel=1e-12)
@@ -0,0 +1,99 @@
+# tests/test_forest_engine.py
+# FlatForest parity with sklearn predict_proba — probabilities and top-k order,
+# for single rows and batches, on small fitted forests and the shipped model
+
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+
+from app.services.forest_engine import FlatForest
+from app.services.recommendation_service import MODEL_PATH, ENCODER_PATH, FEATURE_COLUMNS
+
+INPUTS_CSV = os.path.join(os.path.dirname(os.path.dirname(MODEL_PATH)), "dataset", "farmer_inputs.csv")
+TOP_K = 3
+
+
+def _top_k(proba: np.ndarray, k: int = TOP_K) -> np.ndarray:
+    # stable sort: ties keep class order, like the ranking in the service
+    return np.argsort(-proba, axis=1, kind="stable")[:, :k]
+
+
+def _assert_parity(expected: np.ndarray, actual: np.ndarray):
+    assert actual.shape == expected.shape
+    assert np.allclose(actual, expected, rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(_top_k(actual), _top_k(expected))
+
+
+def _check(model, forest, X):
+    # whole batch, then row by row (the single-farm request path)
+    _assert_parity(model.predict_proba(X), forest.predict_proba(X))
+    for i in range(0, len(X), max(1, len(X) // 25)):
+        _assert_parity(model.predict_proba(X[i:i + 1]), forest.predict_proba(X[i:i + 1]))
+
+
+@pytest.fixture(scope="module")
+def toy_data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 6))
+    y = (X[:, 0] * 2 + X[:, 1] - X[:, 2] ** 2 > 0).astype(int) + (X[:, 3] > 1).astype(int) * 2
+    return X, y
+
+
+@pytest.mark.parametrize("params", [
+    {"n_estimators": 25, "max_depth": None},
+    {"n_estimators": 40, "max_depth": 4, "min_samples_leaf": 5},
+    {"n_estimators": 10, "max_depth": 8, "class_weight": "balanced"},
+])
+def test_classifier_parity(params, toy_data):
+    X, y = toy_data
+    model = RandomForestClassifier(random_state=1, n_jobs=1, **params).fit(X[:400], y[:400])
+    forest = FlatForest.from_sklearn(model)
+    np.testing.assert_array_equal(forest.classes_, model.classes_)
+    _check(model, forest, X[400:])
+
+
+def test_classifier_parity_with_missing_values(toy_data):
+    X, y = toy_data
+    X = X.copy()
+    X[np.random.default_rng(1).random(X.shape) < 0.1] = np.nan
+    model = RandomForestClassifier(n_estimators=20, random_state=2, n_jobs=1).fit(X[:400], y[:400])
+    _check(model, FlatForest.from_sklearn(model), X[400:])
+
+
+def test_regressor_student_parity(toy_data):
+    X, y = toy_data
+    teacher = RandomForestClassifier(n_estimators=20, random_state=3, n_jobs=1).fit(X[:400], y[:400])
+    student = RandomForestRegressor(n_estimators=15, random_state=4, n_jobs=1).fit(
+        X[:400], teacher.predict_proba(X[:400]))
+    forest = FlatForest.from_sklearn(student, classes=teacher.classes_)
+    expected = student.predict(X[400:])
+    _assert_parity(expected, forest.predict_proba(X[400:]))
+    _assert_parity(student.predict(X[400:401]), forest.predict_proba(X[400:401]))
+
+
+def test_save_load_roundtrip(tmp_path, toy_data):
+    X, y = toy_data
+    model = RandomForestClassifier(n_estimators=10, random_state=5, n_jobs=1).fit(X[:400], y[:400])
+    path = str(tmp_path / "forest.joblib")
+    FlatForest.from_sklearn(model).save(path)
+    _check(model, FlatForest.load(path), X[400:])
+
+
+@pytest.mark.skipif(not (os.path.exists(MODEL_PATH) and os.path.exists(ENCODER_PATH)),
+                    reason="trained model not in ../dataset/")
+def test_shipped_model_parity():
+    model    = joblib.load(MODEL_PATH)
+    encoders = joblib.load(ENCODER_PATH)
+    df = pd.read_csv(INPUTS_CSV).head(500)
+    for col in ("soil_type", "climate_zone"):
+        df[col] = encoders[col].transform(df[col])
+    df = df[FEATURE_COLUMNS].astype(np.float64)
+
+    forest = FlatForest.from_sklearn(model)
+    _assert_parity(model.predict_proba(df), forest.predict_proba(df.to_numpy()))
+    for i in range(0, len(df), 20):
+        _assert_parity(model.predict_proba(df.iloc[[i]]), forest.predict_proba(df.to_numpy()[i:i + 1]))
@@ -0,0 +1,95 @@
+# tests/test_inference_scheduler.py
+# Micro-batching: batches run concurrently up to the worker count, and
+# /recommend/batch does not queue behind (or hold up) single requests
+
+import asyncio
+import threading
+import time
+
+from app.services.inference_scheduler import InferenceScheduler
+from app.services.latency_metrics import StageMetrics
+
+
+class _SlowRecommender:
+    """predict_crops_batch stand-in that records how many calls overlap."""
+
+    def __init__(self, delay_s: float = 0.05):
+        # seconds per farm scored
+        self.delay_s = delay_s
+        self.stage_metrics = StageMetrics()
+        self.threads = []
+        self._lock = threading.Lock()
+        self._running = 0
+        self.max_running = 0
+
+    def predict_crops_batch(self, farms, top_k=3, timings=None):
+        with self._lock:
+            self._running += 1
+            self.max_running = max(self.max_running, self._running)
+            self.threads.append(threading.current_thread().name)
+        time.sleep(self.delay_s * len(farms))
+        with self._lock:
+            self._running -= 1
+        return [[{"crop_name": f["id"], "top_k": top_k}] for f in farms]
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_results_reach_their_callers():
+    async def main():
+        sched = InferenceScheduler(_SlowRecommender(0.001), max_batch_size=4, max_wait_ms=1, workers=2)
+        try:
+            results = await asyncio.gather(*(sched.submit({"id": i}, top_k=1 + i % 2) for i in range(20)))
+        finally:
+            await sched.stop()
+        assert [r[0]["crop_name"] for r in results] == list(range(20))
+        assert [r[0]["top_k"] for r in results] == [1 + i % 2 for i in range(20)]
+        assert sched.stats()["requests"] == 20
+    _run(main())
+
+
+def test_batches_in_flight_bounded_by_workers():
+    async def main():
+        rec = _SlowRecommender(0.05)
+        sched = InferenceScheduler(rec, max_batch_size=2, max_wait_ms=0, workers=3)
+        try:
+            await asyncio.gather(*(sched.submit({"id": i}) for i in range(18)))
+        finally:
+            await sched.stop()
+        return rec
+    rec = _run(main())
+    assert rec.max_running == 3
+
+
+def test_batch_endpoint_uses_its_own_executor():
+    async def main():
+        rec = _SlowRecommender(0.01)
+        sched = InferenceScheduler(rec, max_batch_size=1, max_wait_ms=0, workers=1, batch_workers=1)
+        try:
+            big = asyncio.ensure_future(sched.run_batch([{"id": i} for i in range(50)]))
+            await asyncio.sleep(0.02)  # the big batch (~0.5 s) is now running
+            started = time.perf_counter()
+            await sched.submit({"id": "single"})
+            single_s = time.perf_counter() - started
+            await big
+        finally:
+            await sched.stop()
+        return rec, single_s
+    rec, single_s = _run(main())
+    assert single_s < 0.3  # did not wait for the big batch to finish first
+    assert any(n.startswith("ml-batch") for n in rec.threads)
+    assert any(n.startswith("ml-inference") for n in rec.threads)
+
+
+def test_stop_fails_queued_requests():
+    async def main():
+        sched = InferenceScheduler(_SlowRecommender(0.1), max_batch_size=1, max_wait_ms=0, workers=1)
+        calls = [asyncio.ensure_future(sched.submit({"id": i})) for i in range(5)]
+        await asyncio.sleep(0.02)
+        await sched.stop()
+        return await asyncio.gather(*calls, return_exceptions=True)
+    results = _run(main())
+    assert isinstance(results[0], list)  # the batch already running still delivers
+    assert all(isinstance(r, Exception) for r in results[1:])
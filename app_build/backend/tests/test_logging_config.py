@@ -0,0 +1,21 @@
+# tests/test_logging_config.py
+
+import logging
+
+import pytest
+
+from app.logging_config import _level_number
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("INFO", logging.INFO),
+    ("debug", logging.DEBUG),
+    (" Warning ", logging.WARNING),
+    ("15", 15),
+    ("NOTSET", logging.NOTSET),
+    ("verbose", None),
+    ("", None),
+    (None, None),
+])
+def test_level_number(value, expected):
+    assert _level_number(value) == expected
@@ -0,0 +1,48 @@
+# tests/test_mandi_service.py
+# Request paths keep DB round trips off the event loop
+
+import asyncio
+import threading
+
+import pytest
+
+from app.services.mandi_service import MandiService
+
+
+@pytest.fixture
+def service():
+    return MandiService("key", "resource", "http://mandi.invalid")
+
+
+def test_predict_harvest_syncs_history_off_the_loop(service, monkeypatch):
+    threads = []
+    monkeypatch.setattr(service, "_series_current", lambda: False)
+    monkeypatch.setattr(service, "sync_price_history", lambda: threads.append(threading.current_thread()))
+
+    async def main():
+        prediction = await service.predict_harvest_price("Tulsi", 90, 150.0)
+        return prediction, threading.current_thread()
+
+    prediction, loop_thread = asyncio.run(main())
+    assert prediction["crop"] == "Tulsi"
+    assert len(threads) == 1 and threads[0] is not loop_thread
+
+
+def test_price_lookup_queries_db_off_the_loop(service, monkeypatch):
+    threads = []
+
+    def db_get_current(crop):
+        threads.append(threading.current_thread())
+        return {"crop_name": crop}
+
+    monkeypatch.setattr(service, "_db_get_current", db_get_current)
+    monkeypatch.setattr(service, "_db_row_to_response", lambda row, crop: {"crop": crop, "current_price_avg": 120.0})
+
+    async def main():
+        # concurrent misses share one lookup, and that lookup runs in a worker thread
+        results = await asyncio.gather(*(service.get_mandi_prices("Tulsi") for _ in range(5)))
+        return results, threading.current_thread()
+
+    results, loop_thread = asyncio.run(main())
+    assert all(r["current_price_avg"] == 120.0 for r in results)
+    assert len(threads) == 1 and threads[0] is not loop_thread
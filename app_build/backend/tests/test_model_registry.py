@@ -0,0 +1,107 @@
+# tests/test_model_registry.py
+# Registry load path: cheap per-load verification, and a deferred model load
+# that survives prune() deleting the version directory
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder
+
+from app.services import model_registry
+from app.services.model_registry import MODEL_FILE, ModelRegistry, RegistryError
+
+
+@pytest.fixture
+def registry(tmp_path):
+    return ModelRegistry(str(tmp_path / "models"))
+
+
+def _publish(registry, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(120, 4))
+    y = (X[:, 0] > 0).astype(int)
+    model = RandomForestClassifier(n_estimators=5, random_state=seed, n_jobs=1).fit(X, y)
+    return registry.publish(model, {"target": LabelEncoder().fit(["a", "b"])})
+
+
+@pytest.fixture
+def hashed(monkeypatch):
+    """Names of files _sha256 was called on."""
+    seen = []
+    real = model_registry._sha256
+
+    def counting(path):
+        seen.append(os.path.basename(path))
+        return real(path)
+    monkeypatch.setattr(model_registry, "_sha256", counting)
+    return seen
+
+
+def test_quick_verify_skips_untouched_files(registry, hashed):
+    version = _publish(registry)
+    hashed.clear()
+    registry.verify(version, full=False)
+    assert hashed == []
+    registry.verify(version)
+    assert MODEL_FILE in hashed
+
+
+def test_quick_verify_hashes_touched_files(registry, hashed):
+    version = _publish(registry)
+    path = registry.version_path(version, MODEL_FILE)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    hashed.clear()
+    registry.verify(version, full=False)  # same bytes, only the mtime moved
+    assert hashed == [MODEL_FILE]
+
+    with open(path, "r+b") as f:  # same size, different content
+        f.seek(-1, os.SEEK_END)
+        last = f.read(1)
+        f.seek(-1, os.SEEK_END)
+        f.write(bytes([last[0] ^ 0xFF]))
+    with pytest.raises(RegistryError):
+        registry.verify(version, full=False)
+
+
+def test_quick_verify_rejects_size_change_and_missing_file(registry):
+    version = _publish(registry)
+    path = registry.version_path(version, MODEL_FILE)
+    with open(path, "ab") as f:
+        f.write(b"x")
+    with pytest.raises(RegistryError):
+        registry.verify(version, full=False)
+    os.remove(path)
+    with pytest.raises(RegistryError):
+        registry.verify(version, full=False)
+
+
+def test_model_loader_survives_version_deletion(registry):
+    version = _publish(registry)
+    load = registry.model_loader(version)
+    shutil.rmtree(registry.version_path(version))  # what prune() does to an old version
+    model = load()
+    assert model.predict_proba(np.zeros((1, 4))).shape == (1, 2)
+
+
+def test_model_loader_retries_after_a_failed_load(registry, monkeypatch):
+    version = _publish(registry)
+    load = registry.model_loader(version)
+    real_load = model_registry.joblib.load
+    calls = []
+
+    def flaky(source, *args, **kwargs):
+        calls.append(source)
+        if len(calls) == 1:
+            source.read(100)  # fail part-way through the file
+            raise MemoryError("transient")
+        return real_load(source, *args, **kwargs)
+
+    monkeypatch.setattr(model_registry.joblib, "load", flaky)
+    with pytest.raises(MemoryError):
+        load()
+    shutil.rmtree(registry.version_path(version))  # pruned between the two attempts
+    assert load().predict_proba(np.zeros((1, 4))).shape == (1, 2)
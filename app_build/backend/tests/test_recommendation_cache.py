@@ -0,0 +1,145 @@
+# tests/test_recommendation_cache.py
+# Result cache: a hit must return exactly what a fresh (uncached) call returns
+# for the same farm, near-identical farms share an entry but are scored and
+# rendered from their own values, and failures are never cached
+
+import numpy as np
+import pytest
+from sklearn.preprocessing import LabelEncoder
+
+from app.services.crop_catalog import get_crop_catalog
+from app.services.filter_engine import FilterEngine
+from app.services.model_registry import ModelRegistry
+from app.services.recommendation_service import ModelBundle, RecommendationService
+
+SOIL_TYPES = ["Alluvial", "Black soil", "Clay", "Clay loam", "Loamy", "Sandy loam"]
+CLIMATE_ZONES = ["Arid", "Semi-arid", "Subtropical", "Temperate", "Tropical"]
+
+
+class _FlatProbs:
+    """Stands in for the forest: every crop equally likely, so every crop is rendered."""
+
+    def __init__(self, n_classes: int):
+        self.n_classes = n_classes
+        self.rows = []
+
+    def predict_proba(self, X):
+        self.rows.extend(np.asarray(X).tolist())
+        return np.full((len(X), self.n_classes), 1.0 / self.n_classes)
+
+
+@pytest.fixture
+def service(tmp_path):
+    catalog = get_crop_catalog()
+    if not len(catalog):
+        pytest.skip("crops_merged.csv not available")
+    names = catalog.names()
+    encoders = {
+        "soil_type":    LabelEncoder().fit(SOIL_TYPES),
+        "climate_zone": LabelEncoder().fit(CLIMATE_ZONES),
+    }
+    svc = RecommendationService(registry=ModelRegistry(str(tmp_path)), autoload=False)
+    svc._install(ModelBundle(
+        version="test",
+        encoders=encoders,
+        catalog=catalog,
+        filter_engine=FilterEngine(names, catalog),
+        forest=_FlatProbs(len(names)),
+        load_model=lambda: None,
+    ))
+    return svc
+
+
+BASE = {"nitrogen": 90, "phosphorus": 40, "potassium": 40, "ph": 6.5, "temperature": 27,
+        "rainfall": 900, "humidity": 60, "budget": 40000, "climate_zone": "Tropical"}
+
+# Pairs that encode to the same features but render differently
+VARIANTS = [
+    {"soilType": "Alluvial"},
+    {"soilType": "Black"},              # unknown → encodes like Alluvial
+    {"soilType": "loamy"},              # unknown casing → encodes like Alluvial
+    {"soilType": "Loamy"},
+    {"soilType": " Loamy"},
+    {"previousCrop": "Chickpea"},
+    {"previousCrop": "chickpea"},
+    {"previousCrop": " CHICKPEA "},
+    {"previousCrop": "Ginger"},
+    {"previousCrop": "ginger"},
+    {"farmSize": 3},
+    {"farmSize": "3"},
+    {"total_farm_size_acres": 3},
+    {"farmSize": 3, "total_farm_size_acres": 1},
+    {"rainfall": None},                 # key present, unparseable → skipped
+]
+
+
+def _farms():
+    farms = []
+    for v in VARIANTS:
+        farm = {**BASE, **v}
+        if farm.get("rainfall") is None:
+            del farm["rainfall"]        # missing rainfall: features default 800, reasons default 0
+        farms.append(farm)
+    farms.append({**BASE, "rainfall": 800})
+    return farms
+
+
+@pytest.mark.parametrize("top_k", [3, 69])
+def test_cache_hit_equals_miss(service, top_k):
+    farms = _farms()
+    fresh = []
+    for farm in farms:
+        service.clear_cache()
+        fresh.append(service.predict_crops(dict(farm), top_k))
+
+    # the variants really do render differently, so a shared entry would show
+    assert len({repr(r) for r in fresh}) > len(farms) // 2
+
+    service.clear_cache()
+    for _ in range(2):  # first pass fills the cache, second pass is all hits
+        for farm, expected in zip(farms, fresh):
+            assert service.predict_crops(dict(farm), top_k) == expected
+    assert service.cache_stats()["hits"] >= len(farms)
+
+
+
+def _reason_text(result) -> str:
+    return " ".join(r for rec in result for r in rec["reasons"])
+
+
+def test_near_identical_farms_share_a_ranking(service):
+    first = service.predict_crops({**BASE, "rainfall": 901, "ph": 6.52}, 69)
+    second = service.predict_crops({**BASE, "rainfall": 903, "ph": 6.54}, 69)
+    assert service.cache_stats()["hits"] == 1
+    assert [r["crop_name"] for r in second] == [r["crop_name"] for r in first]
+    # rendered from the request's own farm, not the one that filled the entry
+    assert "903mm" in _reason_text(second) and "901mm" not in _reason_text(second)
+    assert "6.54" in _reason_text(second)
+
+
+def test_model_scores_raw_values(service):
+    service.predict_crops({**BASE, "rainfall": 903, "ph": 6.54, "temperature": 27.2}, 3)
+    row = service._bundle.forest.rows[-1]
+    assert (row[3], row[7], row[8]) == (6.54, 27.2, 903.0)
+
+
+def test_failed_ranking_is_not_cached(service, monkeypatch):
+    engine = service._bundle.filter_engine
+    real_filter = engine.filter
+    monkeypatch.setattr(engine, "filter", lambda *a, **k: (_ for _ in ()).throw(RuntimeError("transient")))
+    assert service.predict_crops(dict(BASE), 3) == []
+    assert service.cache_stats()["size"] == 0
+
+    monkeypatch.setattr(engine, "filter", real_filter)
+    assert service.predict_crops(dict(BASE), 3) != []
+    assert service.cache_stats()["hits"] == 0
+
+
+def test_hit_is_independent_of_earlier_results(service):
+    first = service.predict_crops(dict(BASE), 3)
+    expected = repr(first)
+    first[0]["reasons"].append("mutated")
+    first[0]["advisory"].clear()
+    first[0]["crop_name"] = "mutated"
+    assert repr(service.predict_crops(dict(BASE), 3)) == expected
+    assert service.cache_stats()["hits"] == 1
@@ -0,0 +1,127 @@
+# tests/test_retrain_checkpoint.py
+# Feedback extraction checkpoint: a run killed around a chunk's append resumes
+# without duplicating or losing rows
+
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+DATASET_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "dataset")
+sys.path.insert(0, DATASET_DIR)
+
+import retrain_from_feedback as rff  # noqa: E402
+from training_store import TrainingStore  # noqa: E402
+
+FARM = {"nitrogen": 90, "phosphorus": 40, "potassium": 40, "ph": 6.5, "soilType": "Loamy",
+        "temperature": 27, "rainfall": 900, "humidity": 60, "budget": 40000, "climate_zone": "Tropical"}
+
+
+class Crash(Exception):
+    pass
+
+
+class FakeFeedbackDB:
+    """farmer_feedback ⨝ farm_data in memory: {id: processed}."""
+
+    def __init__(self, n):
+        self.processed = {i: False for i in range(1, n + 1)}
+
+    def get_connection(self):
+        return self
+
+    def cursor(self, dictionary=False):
+        return self
+
+    def execute(self, sql, params=None):
+        self._rows = [
+            {"id": i, "chosen_crop": f"Crop{i % 3}", "data_json": json.dumps({**FARM, "nitrogen": i})}
+            for i, done in sorted(self.processed.items()) if not done
+        ]
+
+    def fetchmany(self, n):
+        chunk, self._rows = self._rows[:n], self._rows[n:]
+        return chunk
+
+    def close(self):
+        pass
+
+    def mark_processed(self, ids):
+        for i in ids:
+            self.processed[i] = True
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    db = FakeFeedbackDB(25)
+    monkeypatch.setattr(rff, "get_connection", db.get_connection)
+    monkeypatch.setattr(rff, "mark_processed", db.mark_processed)
+    monkeypatch.setattr(rff, "CHECKPOINT_PATH", str(tmp_path / "checkpoint.json"))
+    monkeypatch.setattr(rff, "LOG_PATH", str(tmp_path / "retrain.log"))
+    monkeypatch.setattr(rff, "CHUNK_ROWS", 10)
+    return db, TrainingStore(str(tmp_path / "store"))
+
+
+def _nitrogen(store):
+    return sorted(store.to_frame()["nitrogen"].astype(int))
+
+
+def _resume_and_extract(store):
+    checkpoint = rff.load_checkpoint()
+    rff.resume_unmarked(store, checkpoint)
+    rff.extract_feedback(store, checkpoint)
+
+
+def test_clean_run_appends_each_row_once(env):
+    db, store = env
+    assert rff.extract_feedback(store, rff.load_checkpoint()) == 25
+    assert _nitrogen(store) == list(range(1, 26))
+    assert all(db.processed.values())
+
+
+def test_crash_after_append_before_mark(env, monkeypatch):
+    db, store = env
+    calls = []
+
+    def crash_on_second_chunk(ids):
+        calls.append(ids)
+        if len(calls) == 2:
+            raise Crash  # the second chunk is in the store but not marked processed
+        db.mark_processed(ids)
+
+    monkeypatch.setattr(rff, "mark_processed", crash_on_second_chunk)
+    with pytest.raises(Crash):
+        rff.extract_feedback(store, rff.load_checkpoint())
+    assert store.total_rows() == 20
+    assert rff.load_checkpoint()["unmarked_ids"] == list(range(11, 21))
+
+    monkeypatch.setattr(rff, "mark_processed", db.mark_processed)
+    _resume_and_extract(store)
+    assert _nitrogen(store) == list(range(1, 26))
+    assert all(db.processed.values())
+    assert rff.load_checkpoint()["unmarked_ids"] == []
+
+
+def test_crash_before_append(env, monkeypatch):
+    db, store = env
+    real_append = store.append
+    calls = []
+
+    def crash_on_second_append(df: pd.DataFrame):
+        calls.append(len(df))
+        if len(calls) == 2:
+            raise Crash  # checkpoint already names the second chunk, the store never got it
+        return real_append(df)
+
+    monkeypatch.setattr(store, "append", crash_on_second_append)
+    with pytest.raises(Crash):
+        rff.extract_feedback(store, rff.load_checkpoint())
+    assert store.total_rows() == 10
+    assert rff.load_checkpoint()["unmarked_ids"] == list(range(11, 21))
+
+    monkeypatch.setattr(store, "append", real_append)
+    _resume_and_extract(store)
+    assert _nitrogen(store) == list(range(1, 26))  # the lost chunk is extracted again, not marked away
+    assert all(db.processed.values())
@@ -0,0 +1,67 @@
+# tests/test_retrain_job.py
+# Host-wide retrain lock: status in another worker reads the holder's state
+# file and never takes the lock a real run needs
+
+import asyncio
+import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import retrain_job as rj
+
+
+def _job(root) -> rj.RetrainJob:
+    registry = SimpleNamespace(root=str(root), current_version=lambda: "v1")
+    return rj.RetrainJob(SimpleNamespace(registry=registry, model_version="v1"))
+
+
+@pytest.fixture
+def no_lock_probe(monkeypatch):
+    monkeypatch.setattr(rj, "_try_lock", lambda fd: pytest.fail("status() touched the retrain lock"))
+
+
+def test_status_reports_other_workers_run(tmp_path, monkeypatch):
+    holder, other = _job(tmp_path), _job(tmp_path)
+    run, lock_fd = holder._begin(full=False, trigger="schedule")
+
+    real_try_lock = rj._try_lock
+    monkeypatch.setattr(rj, "_try_lock", lambda fd: pytest.fail("status() touched the retrain lock"))
+    status = other.status()
+    assert status["state"] == "running_elsewhere"
+    assert status["running"]["trigger"] == "schedule" and status["running"]["pid"] == os.getpid()
+
+    monkeypatch.setattr(rj, "_try_lock", real_try_lock)
+    with pytest.raises(rj.RetrainAlreadyRunning):
+        other._begin(full=False, trigger="schedule")
+
+    async def finished(run, full):
+        return run
+
+    monkeypatch.setattr(holder, "_run_and_record", finished)
+    asyncio.run(holder._execute(run, lock_fd, False))
+    assert not os.path.exists(os.path.join(tmp_path, rj.STATE_FILE))
+    assert other.status()["state"] == "idle"
+
+
+def test_idle_status_never_takes_the_lock(tmp_path, no_lock_probe):
+    assert _job(tmp_path).status()["state"] == "idle"
+
+
+def test_state_left_by_a_dead_process_is_ignored(tmp_path, monkeypatch, no_lock_probe):
+    with open(os.path.join(tmp_path, rj.STATE_FILE), "w", encoding="utf-8") as f:
+        json.dump({"pid": 424242, "trigger": "schedule", "mode": "full", "started_at": "x"}, f)
+    monkeypatch.setattr(rj, "_pid_alive", lambda pid: False)
+    status = _job(tmp_path).status()
+    assert status["state"] == "idle" and status["running"] is None
+
+
+def test_next_run_from_attached_scheduler(tmp_path):
+    when = datetime(2026, 10, 18, 2, 0)
+    scheduler = SimpleNamespace(get_job=lambda job_id: SimpleNamespace(next_run_time=when) if job_id == "weekly" else None)
+    job = _job(tmp_path)
+    assert job.status()["next_run"] is None
+    job.attach_scheduler(scheduler, "weekly")
+    assert job.status()["next_run"] == when.isoformat()
@@ -0,0 +1,73 @@
+# tests/test_shared_cache.py
+# mmap shared tier: file creation and validation, cross-process visibility
+
+import multiprocessing
+import os
+
+import pytest
+
+from app.services import shared_cache
+from app.services.shared_cache import MmapSharedCache, cache_filename, open_shared_cache
+
+pytestmark = pytest.mark.skipif(os.name != "posix", reason="POSIX file semantics")
+
+
+def _child_write(directory: str):
+    cache = MmapSharedCache(directory, 64)
+    cache.set_many({"k": {"price": 42}}, ttl_s=60, bump_generation=True)
+    cache.close()
+
+
+def test_roundtrip_across_processes(tmp_path):
+    cache = MmapSharedCache(str(tmp_path), 64)
+    assert cache.get("k") is None and cache.generation() == 0
+    proc = multiprocessing.get_context("fork").Process(target=_child_write, args=(str(tmp_path),))
+    proc.start()
+    proc.join(10)
+    assert proc.exitcode == 0
+    assert cache.generation() == 1
+    assert cache.get("k")[1] == {"price": 42}
+    assert os.listdir(tmp_path) == [cache_filename(64)]  # no temp files left behind
+    cache.close()
+
+
+def test_new_geometry_gets_a_new_file(tmp_path):
+    small = MmapSharedCache(str(tmp_path), 64)
+    small.set("k", 1, ttl_s=60)
+    large = MmapSharedCache(str(tmp_path), 128)
+    assert small.path != large.path
+    assert small.get("k")[1] == 1          # still mapped and intact
+    assert os.path.getsize(small.path) == small.size
+    small.close()
+    large.close()
+
+
+def test_damaged_file_is_replaced_not_truncated(tmp_path):
+    peer = MmapSharedCache(str(tmp_path), 64)
+    peer.set("k", 1, ttl_s=60)
+    with open(peer.path, "r+b") as f:
+        f.write(b"XXXX")                   # bad magic
+    fresh = MmapSharedCache(str(tmp_path), 64)
+    assert fresh.get("k") is None
+    assert os.stat(fresh.path).st_ino != os.fstat(peer._fd).st_ino
+    assert peer.get("k")[1] == 1           # the peer's mapping survived
+    peer.close()
+    fresh.close()
+
+
+def test_refuses_symlinked_file(tmp_path):
+    target = tmp_path / "elsewhere.bin"
+    target.write_bytes(b"")
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir(mode=0o700)
+    os.symlink(target, cache_dir / cache_filename(64))
+    with pytest.raises(OSError):
+        MmapSharedCache(str(cache_dir), 64)
+    assert target.read_bytes() == b""      # never written through the link
+    assert open_shared_cache("mmap", str(cache_dir), 64).backend == "none"
+
+
+def test_refuses_directory_of_another_user(tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_cache.os, "geteuid", lambda: os.stat(tmp_path).st_uid + 1)
+    with pytest.raises(OSError):
+        MmapSharedCache(str(tmp_path), 64)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# dataset/feature_cache.py
+# Cached, pre-encoded training matrix built from the training store
+#
+# Layout (under dataset/feature_cache/):
+#   meta.json           cache key, covered segments, encoder vocabularies, file names
+#   X-<key>.npy         float64 [rows × FEATURES], categoricals as LabelEncoder codes
+#   y-<key>.npy         int64 target codes
+#
+# The key is a sha256 over the store segments' content hashes and the
+# vocabularies, so unchanged data maps straight back from disk (memory-mapped,
+# no pandas or encoding work). When segments were only appended, just the new
+# rows are encoded and added; existing categorical codes are remapped with one
+# lookup if a new category shifted the sorted vocabulary. Anything else
+# (compaction, a re-import) rebuilds the matrix from scratch.
+#
+# Usage:
+#   python feature_cache.py            # build / refresh the cache and report what it did
+#   python feature_cache.py --clear
+
+import os
+import json
+import glob
+import hashlib
+import argparse
+
+import numpy as np
+
+from training_store import TrainingStore, get_training_store, CATEGORICAL, FEATURES
+
+# ── Paths ─────────────────────────────────────────────────────────────────────
+BASE_DIR  = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(BASE_DIR, "feature_cache")
+META_FILE = "meta.json"
+
+# Column positions of the categorical features in X
+_CAT_POS = {col: FEATURES.index(col) for col in CATEGORICAL if col in FEATURES}
+
+
+class FeatureCache:
+    def __init__(self, root: str = CACHE_DIR):
+        self.root = root
+        self.last_action = None  # "hit", "delta" or "rebuild" — reported by train_model
+
+    # ── Metadata ──────────────────────────────────────────────────────────────
+
+    def _meta(self) -> dict:
+        try:
+            with open(os.path.join(self.root, META_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _write_meta(self, meta: dict):
+        os.makedirs(self.root, exist_ok=True)
+        path = os.path.join(self.root, META_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def cache_key(segments: list, classes: dict) -> str:
+        h = hashlib.sha256()
+        h.update(json.dumps([[s["name"], s["sha256"]] for s in segments]).encode())
+        h.update(json.dumps(classes, sort_keys=True).encode())
+        return h.hexdigest()
+
+    # ── Build ─────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _encode_segment(store: TrainingStore, seg: dict, lookups: dict) -> tuple:
+        cols = store.segment_columns(seg)
+        X = np.empty((seg["rows"], len(FEATURES)), dtype=np.float64)
+        for i, col in enumerate(FEATURES):
+            X[:, i] = lookups[col][cols[col]] if col in lookups else cols[col]
+        return X, lookups["crop_name"][cols["crop_name"]].astype(np.int64)
+
+    def _write_arrays(self, key: str, blocks: list) -> tuple:
+        """Stream (X, y) blocks into new memory-mapped .npy files named after the key."""
+        rows = sum(len(y) for _, y in blocks)
+        x_name, y_name = f"X-{key[:16]}.npy", f"y-{key[:16]}.npy"
+        X = np.lib.format.open_memmap(os.path.join(self.root, x_name), mode="w+",
+                                      dtype=np.float64, shape=(rows, len(FEATURES)))
+        y = np.lib.format.open_memmap(os.path.join(self.root, y_name), mode="w+",
+                                      dtype=np.int64, shape=(rows,))
+        at = 0
+        for X_block, y_block in blocks:
+            X[at:at + len(y_block)] = X_block
+            y[at:at + len(y_block)] = y_block
+            at += len(y_block)
+        X.flush()
+        y.flush()
+        del X, y
+        return x_name, y_name
+
+    def load(self, store: TrainingStore = None):
+        """
+        Encoded training data for the store's current contents → (X, y, encoders),
+        X and y memory-mapped read-only.
+        """
+        store = store or get_training_store()
+        manifest = store.manifest()
+        segments = [{"name": s["name"], "rows": s["rows"], "sha256": store.segment_digest(s)}
+                    for s in manifest["segments"]]
+        encoders, lookups = store.label_encoders(manifest)
+        lookups = {col: lookups[col] for col in CATEGORICAL}
+        classes = {name: [str(c) for c in le.classes_] for name, le in encoders.items()}
+        key = self.cache_key(segments, classes)
+
+        meta = self._meta()
+        cached = meta.get("segments", [])
+        if meta.get("key") == key:
+            self.last_action = "hit"
+        else:
+            os.makedirs(self.root, exist_ok=True)
+            prefix = len(cached)
+            if cached and segments[:prefix] == cached:
+                # Appended segments only: keep the cached rows, encode the rest
+                self.last_action = "delta"
+                X_old = np.load(os.path.join(self.root, meta["X_file"]), mmap_mode="r")
+                y_old = np.load(os.path.join(self.root, meta["y_file"]), mmap_mode="r")
+                if meta["classes"] != classes:
+                    X_old, y_old = self._remap(X_old, y_old, meta["classes"], classes)
+                blocks = [(X_old, y_old)]
+            else:
+                self.last_action = "rebuild"
+                prefix, blocks = 0, []
+            blocks += [self._encode_segment(store, seg, lookups) for seg in segments[prefix:]]
+            x_name, y_name = self._write_arrays(key, blocks)
+            del blocks
+
+            self._write_meta({
+                "key":      key,
+                "rows":     sum(s["rows"] for s in segments),
+                "features": FEATURES,
+                "segments": segments,
+                "classes":  classes,  # encoder vocabularies, same order as the published encoders
+                "X_file":   x_name,
+                "y_file":   y_name,
+            })
+            self._remove_stale({META_FILE, x_name, y_name})
+            meta = self._meta()
+
+        X = np.load(os.path.join(self.root, meta["X_file"]), mmap_mode="r")
+        y = np.load(os.path.join(self.root, meta["y_file"]), mmap_mode="r")
+        return X, y, encoders
+
+    @staticmethod
+    def _remap(X_old, y_old, old_classes: dict, new_classes: dict) -> tuple:
+        """Move cached codes onto a grown vocabulary (sorted order may have shifted)."""
+        X_old = np.array(X_old)
+        for col, pos in _CAT_POS.items():
+            lookup = np.searchsorted(np.asarray(new_classes[col], dtype=object),
+                                     np.asarray(old_classes[col], dtype=object))
+            X_old[:, pos] = lookup[X_old[:, pos].astype(np.int64)]
+        target = np.searchsorted(np.asarray(new_classes["target"], dtype=object),
+                                 np.asarray(old_classes["target"], dtype=object))
+        return X_old, target[np.asarray(y_old)]
+
+    def _remove_stale(self, keep: set):
+        for path in glob.glob(os.path.join(self.root, "*")):
+            if os.path.basename(path) not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # still mapped somewhere (Windows) — removed on the next refresh
+
+    def clear(self):
+        self._remove_stale(set())
+
+
+_cache = None
+
+
+def get_feature_cache() -> FeatureCache:
+    global _cache
+    if _cache is None:
+        _cache = FeatureCache()
+    return _cache
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-encoded training matrix cache")
+    parser.add_argument("--clear", action="store_true", help="delete the cached matrix")
+    args = parser.parse_args()
+
+    cache = get_feature_cache()
+    if args.clear:
+        cache.clear()
+        print(f"Cleared {cache.root}")
+        return
+    store = get_training_store()
+    store.ensure()
+    X, y, _ = cache.load(store)
+    print(f"Feature cache {cache.last_action}: {X.shape[0]} rows × {X.shape[1]} features ({cache.root})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 # dataset/retrain_from_feedback.py
 # Weekly batch retrainer — reads farmer feedback from MySQL, retrains RandomForest
+#
+# Usage:
+#   python retrain_from_feedback.py          # incremental update (falls back to a full refit when needed)
+#   python retrain_from_feedback.py --full   # force a full refit on the whole training store
 
 import os
 import sys
 import json
 import time
+import argparse
 import pandas as pd
 from datetime import datetime
 
@@ -14,17 +19,20 @@ BASE_DIR     = os.path.dirname(os.path.abspath(__file__))
 BACKEND_DIR  = os.path.join(BASE_DIR, "..", "backend")
 LOG_DIR      = os.path.join(BACKEND_DIR, "logs")
 LOG_PATH     = os.path.join(LOG_DIR, "retrain.log")
-INPUTS_CSV   = os.path.join(BASE_DIR, "farmer_inputs.csv")
-MODEL_PATH   = os.path.join(BASE_DIR, "crop_recommendation_model.pkl")
-ENCODER_PATH = os.path.join(BASE_DIR, "label_encoders.pkl")
+INPUTS_CSV   = os.path.join(BASE_DIR, "farmer_inputs.csv")   # seeds the training store on first run
+CHECKPOINT_PATH = os.path.join(BASE_DIR, "retrain_checkpoint.json")
 
-MIN_NEW_ROWS = 20  # Minimum new feedback rows required to trigger retrain
+MIN_NEW_ROWS = 20    # Minimum new feedback rows required to trigger retrain
+CHUNK_ROWS   = 1000  # Feedback rows streamed, appended and marked processed per chunk
 
 os.makedirs(LOG_DIR, exist_ok=True)
 
 # ── DB config (mirrors app/database.py) ──────────────────────────────────────
 sys.path.insert(0, os.path.join(BACKEND_DIR))
 from app.database import get_connection, init_db
+from app.services.model_registry import get_model_registry
+sys.path.insert(0, BASE_DIR)
+from training_store import get_training_store
 
 
 # ── Logging ───────────────────────────────────────────────────────────────────
@@ -41,129 +49,250 @@ def log_blank_lines():
         f.write("\n\n")
 
 
-# ── Main ──────────────────────────────────────────────────────────────────────
-def retrain():
-    start = time.time()
-    log("RETRAIN START")
+# ── Checkpoint ────────────────────────────────────────────────────────────────
+# Feedback is appended to the training store chunk by chunk and marked
+# processed as it goes, so a crash never re-reads finished chunks. The
+# checkpoint remembers where the not-yet-trained rows start in the store and,
+# before each append, which ids the chunk holds and the store size it was
+# appended at. On resume the ids are marked only if the store grew past that
+# size (the append was published), so a crash on either side of the append
+# neither duplicates the chunk nor drops it.
 
+def load_checkpoint() -> dict:
     try:
-        init_db()
-    except Exception as e:
-        log(f"DB init failed: {e}")
-        log_blank_lines()
+        with open(CHECKPOINT_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"pending_from_row": None, "unmarked_ids": [], "unmarked_from_row": None}
+
+
+def save_checkpoint(checkpoint: dict):
+    tmp = CHECKPOINT_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+def clear_checkpoint():
+    if os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+
+
+# ── Extraction ────────────────────────────────────────────────────────────────
+
+def count_pending() -> int:
+    conn = get_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM farmer_feedback WHERE processed = FALSE")
+    count = cur.fetchone()[0]
+    cur.close()
+    conn.close()
+    return count
+
+
+def mark_processed(feedback_ids: list):
+    if not feedback_ids:
         return
+    conn = get_connection()
+    cur = conn.cursor()
+    fmt = ",".join(["%s"] * len(feedback_ids))
+    cur.execute(f"UPDATE farmer_feedback SET processed = TRUE WHERE id IN ({fmt})", feedback_ids)
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+def training_row(farm: dict, chosen_crop: str) -> dict:
+    return {
+        "nitrogen":       float(farm.get("nitrogen", 0)),
+        "phosphorus":     float(farm.get("phosphorus", 0)),
+        "potassium":      float(farm.get("potassium", 0)),
+        "ph":             float(farm.get("ph", farm.get("soilPh", 6.5))),
+        "soil_moisture":  float(farm.get("soil_moisture", farm.get("soilMoisture", 50))),
+        "organic_carbon": float(farm.get("organic_carbon", farm.get("organicCarbon", 1.2))),
+        "soil_type":      farm.get("soilType", farm.get("soil_type", "Loamy")),
+        "temperature":    float(farm.get("temperature", 25)),
+        "rainfall":       float(farm.get("rainfall", 800)),
+        "humidity":       float(farm.get("humidity", 60)),
+        "budget":         float(farm.get("budget", 50000)),
+        "climate_zone":   farm.get("climate_zone", "Tropical"),
+        "crop_name":      chosen_crop,
+    }
+
 
-    # 1. Count unprocessed feedback rows
+def extract_feedback(store, checkpoint: dict) -> int:
+    """
+    Stream unprocessed feedback in CHUNK_ROWS chunks (unbuffered cursor, so
+    rows come from the server as they are fetched), appending each chunk to
+    the training store and marking it processed before reading the next.
+    Returns the number of rows appended.
+    """
+    appended = 0
+    conn = get_connection()
+    cur = conn.cursor(dictionary=True)  # unbuffered — nothing is held beyond one chunk
     try:
-        conn = get_connection()
-        cur = conn.cursor(dictionary=True)
         cur.execute(
             """
-            SELECT f.id, f.farmer_id, f.farm_id, f.chosen_crop, f.chosen_at,
-                   fd.data_json
+            SELECT f.id, f.chosen_crop, fd.data_json
             FROM farmer_feedback f
             JOIN farm_data fd ON fd.farm_id = f.farm_id
             WHERE f.processed = FALSE
-            ORDER BY f.chosen_at ASC
+            ORDER BY f.chosen_at ASC, f.id ASC
             """
         )
-        rows = cur.fetchall()
+        while True:
+            chunk = cur.fetchmany(CHUNK_ROWS)
+            if not chunk:
+                break
+
+            new_rows = []
+            feedback_ids = []
+            for row in chunk:
+                try:
+                    new_rows.append(training_row(json.loads(row["data_json"]), row["chosen_crop"]))
+                    feedback_ids.append(row["id"])
+                except Exception as e:
+                    log(f"Skipping malformed row id={row['id']}: {e}")
+            if not new_rows:
+                continue
+
+            checkpoint["unmarked_ids"] = feedback_ids
+            checkpoint["unmarked_from_row"] = store.total_rows()
+            save_checkpoint(checkpoint)
+            appended += store.append(pd.DataFrame(new_rows))
+            # The streaming connection is busy until the result is drained,
+            # so marking goes through a second pooled connection
+            mark_processed(feedback_ids)
+            checkpoint["unmarked_ids"] = []
+            checkpoint["unmarked_from_row"] = None
+            save_checkpoint(checkpoint)
+            log(f"Chunk: {len(new_rows)} rows appended and marked processed (store total: {store.total_rows()})")
+    finally:
         cur.close()
         conn.close()
-    except Exception as e:
-        log(f"DB query failed: {e}")
-        log_blank_lines()
-        return
+    return appended
 
-    count = len(rows)
-    log(f"{count} new feedback rows found")
 
-    if count < MIN_NEW_ROWS:
-        log(f"Skipped — minimum {MIN_NEW_ROWS} rows required (found {count})")
-        log(f"RETRAIN END — {round(time.time() - start, 1)}s")
-        log_blank_lines()
-        return
+def resume_unmarked(store, checkpoint: dict) -> int:
+    """
+    Settle the chunk an interrupted run left in the checkpoint: mark its ids
+    processed if its append reached the store, otherwise leave them for
+    extraction to pick up again. Returns the number of ids marked.
+    """
+    ids = checkpoint["unmarked_ids"]
+    if not ids:
+        return 0
+    appended_at = checkpoint.get("unmarked_from_row")  # absent in checkpoints that wrote ids after the append
+    marked = 0
+    if appended_at is None or store.total_rows() > appended_at:
+        mark_processed(ids)
+        marked = len(ids)
+    checkpoint["unmarked_ids"] = []
+    checkpoint["unmarked_from_row"] = None
+    save_checkpoint(checkpoint)
+    return marked
 
-    # 2. Build new training rows
-    new_rows = []
-    feedback_ids = []
-    for row in rows:
-        try:
-            farm = json.loads(row["data_json"])
-            new_rows.append({
-                "row_index":      len(new_rows),
-                "nitrogen":       float(farm.get("nitrogen", 0)),
-                "phosphorus":     float(farm.get("phosphorus", 0)),
-                "potassium":      float(farm.get("potassium", 0)),
-                "ph":             float(farm.get("ph", farm.get("soilPh", 6.5))),
-                "soil_moisture":  float(farm.get("soil_moisture", farm.get("soilMoisture", 50))),
-                "organic_carbon": float(farm.get("organic_carbon", farm.get("organicCarbon", 1.2))),
-                "soil_type":      farm.get("soilType", farm.get("soil_type", "Loamy")),
-                "temperature":    float(farm.get("temperature", 25)),
-                "rainfall":       float(farm.get("rainfall", 800)),
-                "humidity":       float(farm.get("humidity", 60)),
-                "budget":         float(farm.get("budget", 50000)),
-                "climate_zone":   farm.get("climate_zone", "Tropical"),
-                "crop_name":      row["chosen_crop"],
-            })
-            feedback_ids.append(row["id"])
-        except Exception as e:
-            log(f"Skipping malformed row id={row['id']}: {e}")
-
-    if not new_rows:
-        log("No valid rows after parsing — skipping retrain.")
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+def retrain(full: bool = False) -> str:
+    """
+    full=True skips the incremental update and refits all trees.
+    Returns the outcome: "incremental", "full", "skipped" or "failed".
+    """
+    start = time.time()
+    log(f"RETRAIN START ({'full refit' if full else 'incremental'})")
+
+    try:
+        init_db()
+    except Exception as e:
+        log(f"DB init failed: {e}")
         log_blank_lines()
-        return
+        return "failed"
+
+    store = get_training_store()
+    store.ensure(INPUTS_CSV)
+    checkpoint = load_checkpoint()
 
-    # 3. Append to farmer_inputs.csv
+    # 1. Finish what an interrupted run left: ids appended to the store but not yet marked
     try:
-        existing = pd.read_csv(INPUTS_CSV)
-        new_df = pd.DataFrame(new_rows)
-        new_df["row_index"] = range(len(existing), len(existing) + len(new_df))
-        combined = pd.concat([existing, new_df], ignore_index=True)
-        combined.to_csv(INPUTS_CSV, index=False)
-        log(f"Appended {len(new_rows)} samples to farmer_inputs.csv (total: {len(combined)})")
+        if checkpoint["unmarked_ids"]:
+            marked = resume_unmarked(store, checkpoint)
+            log(f"Resumed: marked {marked} rows left over from an interrupted run" if marked
+                else "Resumed: the interrupted chunk never reached the store — it is extracted again")
     except Exception as e:
-        log(f"CSV append failed: {e}")
+        log(f"Could not mark leftover rows processed: {e}")
         log_blank_lines()
-        return
+        return "failed"
 
-    # 4. Retrain model
+    # 2. Count unprocessed feedback plus rows already extracted but not trained on
     try:
-        sys.path.insert(0, BASE_DIR)
-        from train_crop_model import train_model
-        train_model()
-        log("RandomForest training complete — model saved.")
+        count = count_pending()
     except Exception as e:
-        log(f"Training failed: {e}")
+        log(f"DB query failed: {e}")
         log_blank_lines()
-        return
+        return "failed"
 
-    # 5. Hot-swap model in running service (if accessible)
+    pending_from = checkpoint["pending_from_row"]
+    untrained = max(0, store.total_rows() - pending_from) if pending_from is not None else 0
+    log(f"{count} new feedback rows found" + (f", {untrained} extracted but not yet trained on" if untrained else ""))
+
+    if count + untrained < MIN_NEW_ROWS:
+        log(f"Skipped — minimum {MIN_NEW_ROWS} rows required (found {count + untrained})")
+        log(f"RETRAIN END — {round(time.time() - start, 1)}s")
+        log_blank_lines()
+        return "skipped"
+
+    # 3. Stream feedback into the training store in chunks
+    if pending_from is None:
+        pending_from = checkpoint["pending_from_row"] = store.total_rows()
+        save_checkpoint(checkpoint)
     try:
-        from app.routers.ml_router import recommender
-        recommender.reload_model()
-        log("Model hot-swapped in running service. No restart needed.")
-    except Exception:
-        log("Note: Model saved to disk. Server reload required to apply (or restart backend).")
+        appended = extract_feedback(store, checkpoint)
+        log(f"Appended {appended} samples to the training store (total: {store.total_rows()})")
+    except Exception as e:
+        log(f"Feedback extraction failed: {e} — extracted chunks are kept for the next run")
+        log_blank_lines()
+        return "failed"
 
-    # 6. Mark feedback rows as processed
+    rows = store.to_frame()
+    history, new_df = rows.iloc[:pending_from], rows.iloc[pending_from:]
+    if new_df.empty:
+        log("No valid rows after parsing — skipping retrain.")
+        clear_checkpoint()
+        log_blank_lines()
+        return "skipped"
+
+    # 4. Update (or refit) the model and publish it to the registry
     try:
-        conn = get_connection()
-        cur = conn.cursor()
-        fmt = ",".join(["%s"] * len(feedback_ids))
-        cur.execute(f"UPDATE farmer_feedback SET processed = TRUE WHERE id IN ({fmt})", feedback_ids)
-        conn.commit()
-        cur.close()
-        conn.close()
-        log(f"Marked {len(feedback_ids)} feedback rows as processed.")
+        from train_crop_model import train_model, update_model, IncrementalUpdateError
+        if not full:
+            try:
+                update_model(new_df, history=history)
+                log(f"Incremental update complete — {len(new_df)} new rows, oldest trees retired.")
+            except IncrementalUpdateError as e:
+                log(f"Incremental update not possible ({e}) — falling back to full refit.")
+                full = True
+        if full:
+            train_model()
+            log("RandomForest full refit complete — model published.")
     except Exception as e:
-        log(f"Could not mark rows processed: {e}")
+        log(f"Training failed: {e} — the next run retrains on these rows")
+        log_blank_lines()
+        return "failed"
+    clear_checkpoint()
+
+    # 5. Running API workers poll the registry's CURRENT pointer and hot-swap
+    #    the new version in the background — no restart or import needed here.
+    log(f"Registry CURRENT → {get_model_registry().current_version()} (workers pick it up within seconds)")
 
     elapsed = round(time.time() - start, 1)
     log(f"RETRAIN END — {elapsed}s")
     log_blank_lines()
+    return "full" if full else "incremental"
 
 
 if __name__ == "__main__":
-    retrain()
+    parser = argparse.ArgumentParser(description="Retrain the crop model from farmer feedback")
+    parser.add_argument("--full", action="store_true", help="full refit instead of an incremental update")
+    outcome = retrain(full=parser.parse_args().full)
+    sys.exit(1 if outcome == "failed" else 0)
@@ -5,74 +5,262 @@
 import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import LabelEncoder
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.metrics import accuracy_score, classification_report
 import joblib
 import os
+import sys
 
 # FILE PATHS
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_PATH = os.path.join(BASE_DIR, "farmer_inputs.csv")
-MODEL_PATH = os.path.join(BASE_DIR, "crop_recommendation_model.pkl")
-ENCODERS_PATH = os.path.join(BASE_DIR, "label_encoders.pkl")
+DATA_PATH = os.path.join(BASE_DIR, "farmer_inputs.csv")                  # seeds the training store on first run
+MODEL_PATH = os.path.join(BASE_DIR, "crop_recommendation_model.pkl")      # legacy, pre-registry
+ENCODERS_PATH = os.path.join(BASE_DIR, "label_encoders.pkl")               # legacy, pre-registry
+
+# Versioned model registry (shared with the backend)
+sys.path.insert(0, os.path.join(BASE_DIR, "..", "backend"))
+from app.services.model_registry import get_model_registry, STUDENT_FILE
+from app.services.forest_engine import FlatForest
+from training_store import get_training_store, FEATURES
+from feature_cache import get_feature_cache
+
+# FOREST SIZE + INCREMENTAL UPDATE SETTINGS
+N_ESTIMATORS = 100        # trees in a full refit, and the cap after incremental updates
+INCREMENTAL_TREES = 20    # trees added per incremental update (the same number of oldest trees retire)
+REPLAY_ROWS = 2000        # historical rows replayed alongside new feedback
+REPLAY_MIN_PER_CLASS = 2  # every crop must appear so new trees share the forest's class layout
+FULL_REFIT_EVERY = 4      # after this many incremental updates, the next retrain is a full refit
+
+# Cores used while fitting (TRAIN_N_JOBS, set by the in-server retrain job).
+# Reset to None before publishing so the served model never spawns workers.
+N_JOBS = int(os.environ["TRAIN_N_JOBS"]) if os.getenv("TRAIN_N_JOBS") else None
+
+# DISTILLED STUDENT — a small regression forest fitted on the teacher's class
+# probabilities, served instead of the full forest when it agrees with it
+STUDENT_PARAMS = {"n_estimators": 20, "max_depth": 10, "min_samples_leaf": 3, "max_features": 0.5}
+SYNTHETIC_PER_ROW = 2         # jittered copies of each row, labelled by the teacher
+SYNTHETIC_NOISE = 0.15        # jitter as a fraction of each numeric column's std
+STUDENT_MIN_AGREEMENT = 0.97  # share of held-out rows whose teacher top-1 is in the student's top 3
+
+CATEGORICAL_COLS = ['soil_type', 'climate_zone']
+
+
+class IncrementalUpdateError(Exception):
+    """The current model can't be extended with this data — do a full refit instead."""
+
+
+def training_state(manifest: dict) -> dict:
+    """Training lineage recorded in a registry manifest (empty for older versions)."""
+    return (manifest or {}).get("metrics", {}).get("training", {})
+
 
 def train_model():
-    """Train the Random Forest model and save it."""
+    """Train the Random Forest model and publish it as a new registry version."""
     print("=" * 60)
     print("TRAINING RANDOM FOREST MODEL")
     print("=" * 60)
     
-    df = pd.read_csv(DATA_PATH)
-    print(f"Dataset Shape: {df.shape}")
-    
-    if df.isnull().sum().sum() > 0:
-        df = df.dropna()
-        
-    X = df.drop(['crop_name', 'row_index'], axis=1)
-    y = df['crop_name']
-    
-    encoders = {}
-    
-    categorical_cols = ['soil_type', 'climate_zone']
-    for col in categorical_cols:
-        le = LabelEncoder()
-        X[col] = le.fit_transform(X[col])
-        encoders[col] = le
-        
-    target_le = LabelEncoder()
-    y = target_le.fit_transform(y)
-    encoders['target'] = target_le
+    # Pre-encoded matrix for the append-only store (rows with missing values never get in);
+    # memory-mapped as-is when the store is unchanged, only new segments encoded otherwise
+    store = get_training_store()
+    store.ensure(DATA_PATH)
+    cache = get_feature_cache()
+    X, y, encoders = cache.load(store)
+    print(f"Dataset Shape: {X.shape} from {len(store.manifest()['segments'])} store segment(s), feature cache {cache.last_action}")
+    X = pd.DataFrame(X, columns=FEATURES, copy=False)  # column names are kept on the fitted model
     
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
     
-    model = RandomForestClassifier(n_estimators=100, random_state=42)
+    model = RandomForestClassifier(n_estimators=N_ESTIMATORS, random_state=42, n_jobs=N_JOBS)
     model.fit(X_train, y_train)
+    model.set_params(n_jobs=None)
     
     y_pred = model.predict(X_test)
     accuracy = accuracy_score(y_test, y_pred)
     print(f"Model Accuracy: {accuracy * 100:.2f}%")
     
-    joblib.dump(model, MODEL_PATH)
-    joblib.dump(encoders, ENCODERS_PATH)
-    print(f"Model saved to: {MODEL_PATH}")
+    student, student_report = distill_student(model, X)
+    
+    version = get_model_registry().publish(
+        model, encoders,
+        metrics={
+            "accuracy": round(float(accuracy), 4),
+            "train_rows": int(len(X_train)),
+            "test_rows": int(len(X_test)),
+            "training": {"mode": "full", "incremental_since_full": 0, "n_estimators": len(model.estimators_)},
+            "student": student_report,
+        },
+        extra_files=student_artifacts(student, model),
+    )
+    print(f"Model published as version {version} (now CURRENT)")
     
     return model, encoders
 
+def distill_student(teacher, X):
+    """
+    Fit the student on the teacher's probabilities over 80% of X plus jittered
+    synthetic rows, then compare top-3s on the other 20%.
+    Returns (student or None if below STUDENT_MIN_AGREEMENT, report dict).
+    """
+    X_fit, X_eval = train_test_split(X, test_size=0.2, random_state=42)
+
+    # Synthetic rows: resampled rows with numeric columns jittered (categoricals kept)
+    numeric = [c for c in X.columns if c not in CATEGORICAL_COLS]
+    rng = np.random.default_rng(42)
+    synth = X_fit.sample(len(X_fit) * SYNTHETIC_PER_ROW, replace=True, random_state=42).reset_index(drop=True)
+    noise = rng.normal(size=(len(synth), len(numeric))) * X_fit[numeric].std().to_numpy() * SYNTHETIC_NOISE
+    synth[numeric] = (synth[numeric] + noise).clip(X_fit[numeric].min(), X_fit[numeric].max(), axis=1)
+    X_student = pd.concat([X_fit, synth], ignore_index=True)
+
+    student = RandomForestRegressor(random_state=42, n_jobs=N_JOBS, **STUDENT_PARAMS)
+    student.fit(X_student, teacher.predict_proba(X_student))
+    student.set_params(n_jobs=None)
+
+    t_probs = teacher.predict_proba(X_eval)
+    s_probs = student.predict(X_eval)
+    t_top3 = np.argsort(t_probs, axis=1)[:, -3:]
+    s_top3 = np.argsort(s_probs, axis=1)[:, -3:]
+    agreement = float((s_top3 == t_probs.argmax(axis=1)[:, None]).any(axis=1).mean())
+    report = {
+        "promoted":       agreement >= STUDENT_MIN_AGREEMENT,
+        "top3_agreement": round(agreement, 4),
+        "top3_overlap":   round(float((s_top3[:, :, None] == t_top3[:, None, :]).any(axis=2).mean()), 4),
+        "top1_agreement": round(float((s_probs.argmax(axis=1) == t_probs.argmax(axis=1)).mean()), 4),
+        "threshold":      STUDENT_MIN_AGREEMENT,
+        "params":         STUDENT_PARAMS,
+        "fit_rows":       int(len(X_student)),
+        "student_nodes":  int(sum(e.tree_.node_count for e in student.estimators_)),
+        "teacher_nodes":  int(sum(e.tree_.node_count for e in teacher.estimators_)),
+    }
+    verdict = "promoted" if report["promoted"] else f"not promoted (< {STUDENT_MIN_AGREEMENT * 100:.0f}%)"
+    print(f"Student: top-3 agreement {agreement * 100:.2f}% — {verdict}, "
+          f"{report['student_nodes']} nodes vs {report['teacher_nodes']} in the teacher")
+    return (student if report["promoted"] else None), report
+
+def student_artifacts(student, teacher) -> dict:
+    """extra_files for ModelRegistry.publish — empty when no student was promoted."""
+    if student is None:
+        return {}
+    return {STUDENT_FILE: FlatForest.from_sklearn(student, classes=teacher.classes_).state()}
+
+def encode_features(df, encoders):
+    """Encode a farmer_inputs-shaped DataFrame with existing encoders → (X, y)."""
+    X = df.drop(columns=[c for c in ('crop_name', 'row_index') if c in df.columns])
+    for col in CATEGORICAL_COLS:
+        unseen = set(X[col]) - set(encoders[col].classes_)
+        if unseen:
+            raise IncrementalUpdateError(f"unseen {col} values: {sorted(unseen)}")
+        X[col] = encoders[col].transform(X[col])
+
+    unseen = set(df['crop_name']) - set(encoders['target'].classes_)
+    if unseen:
+        raise IncrementalUpdateError(f"new crops not in the model: {sorted(unseen)}")
+    y = encoders['target'].transform(df['crop_name'])
+    return X, y
+
+def replay_sample(history, n_rows=REPLAY_ROWS, min_per_class=REPLAY_MIN_PER_CLASS, seed=42):
+    """Random sample of past rows that still contains every crop at least min_per_class times."""
+    shuffled = history.sample(frac=1, random_state=seed)
+    floor = shuffled.groupby('crop_name').head(min_per_class)
+    rest = history.drop(floor.index)
+    extra = rest.sample(min(len(rest), max(0, n_rows - len(floor))), random_state=seed)
+    return pd.concat([floor, extra])
+
+def update_model(new_rows, history=None):
+    """
+    Incremental update: warm-start the CURRENT forest with INCREMENTAL_TREES
+    new trees fitted on the new rows plus a replay sample of history, then
+    retire the oldest trees so the forest stays at N_ESTIMATORS.
+    Raises IncrementalUpdateError when a full refit is needed instead.
+    """
+    print("=" * 60)
+    print("INCREMENTAL RANDOM FOREST UPDATE")
+    print("=" * 60)
+
+    registry = get_model_registry()
+    version = registry.current_version()
+    if not version:
+        raise IncrementalUpdateError("no published model to extend")
+    model, encoders, manifest = registry.load(version)
+
+    state = training_state(manifest)
+    since_full = int(state.get("incremental_since_full", 0))
+    if since_full >= FULL_REFIT_EVERY:
+        raise IncrementalUpdateError(f"{since_full} incremental updates since the last full refit")
+
+    new_rows = new_rows.dropna()
+    if history is None:
+        get_training_store().ensure(DATA_PATH)
+        history = get_training_store().to_frame()
+    replay = replay_sample(history.dropna())
+    X_new, y_new = encode_features(new_rows, encoders)
+    X_train, y_train = encode_features(pd.concat([new_rows, replay], ignore_index=True), encoders)
+
+    # Every class must be present, otherwise the new trees' class columns shift
+    if len(np.unique(y_train)) != len(model.classes_):
+        raise IncrementalUpdateError("replay sample does not cover every crop")
+
+    accuracy_before = accuracy_score(y_new, model.predict(X_new))
+    print(f"Base version {version}: {len(model.estimators_)} trees, {since_full} incremental update(s) since full refit")
+    print(f"Training rows: {len(new_rows)} new + {len(replay)} replay")
+
+    n_before = len(model.estimators_)
+    # A fresh seed per update — with a fixed one every update would reuse the same tree seeds
+    model.set_params(warm_start=True, n_estimators=n_before + INCREMENTAL_TREES,
+                     random_state=42 + since_full + 1, n_jobs=N_JOBS)
+    model.fit(X_train, y_train)
+
+    # Retire the oldest trees (estimators_ is in fit order)
+    retired = max(0, len(model.estimators_) - N_ESTIMATORS)
+    model.estimators_ = model.estimators_[retired:]
+    model.set_params(warm_start=False, n_estimators=len(model.estimators_), n_jobs=None)
+
+    accuracy_after = accuracy_score(y_new, model.predict(X_new))
+    print(f"Accuracy on new rows: {accuracy_before * 100:.2f}% before → {accuracy_after * 100:.2f}% after")
+    print(f"Trees: +{INCREMENTAL_TREES} new, -{retired} retired → {len(model.estimators_)}")
+
+    # The student is re-distilled from the updated forest (on the same new + replay rows)
+    student, student_report = distill_student(model, X_train)
+
+    new_version = registry.publish(
+        model, encoders,
+        metrics={
+            "accuracy_new_rows_before": round(float(accuracy_before), 4),
+            "accuracy_new_rows_after": round(float(accuracy_after), 4),
+            "new_rows": int(len(new_rows)),
+            "replay_rows": int(len(replay)),
+            "training": {
+                "mode": "incremental",
+                "base_version": version,
+                "incremental_since_full": since_full + 1,
+                "trees_added": INCREMENTAL_TREES,
+                "trees_retired": retired,
+                "n_estimators": len(model.estimators_),
+            },
+            "student": student_report,
+        },
+        extra_files=student_artifacts(student, model),
+    )
+    print(f"Model published as version {new_version} (now CURRENT)")
+
+    return model, encoders
+
 def predict_from_user_input():
     """Allow user to enter farmer inputs and get crop recommendations."""
     print("\n" + "=" * 60)
     print("CROP RECOMMENDATION - ENTER FARMER INPUTS")
     print("=" * 60)
     
-    # Check if model exists, if not train it
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(ENCODERS_PATH):
+    # Load the current registry version (falling back to the legacy files), training if neither exists
+    registry = get_model_registry()
+    if registry.current_version():
+        model, encoders, _ = registry.load(registry.current_version())
+    elif os.path.exists(MODEL_PATH) and os.path.exists(ENCODERS_PATH):
+        model = joblib.load(MODEL_PATH)
+        encoders = joblib.load(ENCODERS_PATH)
+    else:
         print("Model not found. Training now...")
-        train_model()
-    
-    # Load model and encoders
-    model = joblib.load(MODEL_PATH)
-    encoders = joblib.load(ENCODERS_PATH)
+        model, encoders = train_model()
     target_le = encoders['target']
     
     print("\nPlease enter farmer input values:")
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# dataset/training_store.py
+# Append-only columnar training store — replaces rewriting farmer_inputs.csv
+#
+# Layout (under dataset/training_store/):
+#   manifest.json                  column list, categorical vocabularies, segment list
+#   seg-000001/<column>.npy        one array per column, one directory per appended batch
+#
+# Numeric columns are stored as float64; categorical columns (soil_type,
+# climate_zone, crop_name) as int32 codes into an append-only vocabulary kept
+# in the manifest, so codes never change once written. A segment only becomes
+# visible when manifest.json is atomically replaced — a crash mid-append leaves
+# an orphan directory that compaction removes, never a half-written training set.
+#
+# Usage:
+#   python training_store.py info
+#   python training_store.py import [farmer_inputs.csv]   # (re)build the store from a CSV
+#   python training_store.py compact                       # merge all segments into one
+#   python training_store.py export [out.csv]              # farmer_inputs.csv-compatible CSV
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+# ── Paths ─────────────────────────────────────────────────────────────────────
+BASE_DIR   = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR  = os.path.join(BASE_DIR, "training_store")
+INPUTS_CSV = os.path.join(BASE_DIR, "farmer_inputs.csv")
+MANIFEST   = "manifest.json"
+
+# ── Schema (farmer_inputs.csv column order) ───────────────────────────────────
+COLUMNS = [
+    "row_index", "crop_name", "nitrogen", "phosphorus", "potassium", "ph",
+    "soil_moisture", "organic_carbon", "soil_type", "temperature", "rainfall",
+    "humidity", "budget", "climate_zone",
+]
+CATEGORICAL = ["crop_name", "soil_type", "climate_zone"]
+FEATURES    = [c for c in COLUMNS if c not in ("row_index", "crop_name")]
+
+
+class TrainingStore:
+    def __init__(self, root: str = STORE_DIR):
+        self.root = root
+
+    # ── Manifest ──────────────────────────────────────────────────────────────
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.root, MANIFEST)
+
+    def manifest(self) -> dict:
+        try:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"columns": COLUMNS, "vocab": {c: [] for c in CATEGORICAL}, "segments": []}
+
+    def _write_manifest(self, manifest: dict):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._manifest_path() + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._manifest_path())
+
+    def exists(self) -> bool:
+        return os.path.exists(self._manifest_path())
+
+    def total_rows(self) -> int:
+        return sum(s["rows"] for s in self.manifest()["segments"])
+
+    # ── Writes ────────────────────────────────────────────────────────────────
+
+    def _write_segment(self, manifest: dict, arrays: dict, seq: Optional[int] = None) -> dict:
+        """Write arrays as a new segment directory; the caller publishes it via the manifest."""
+        if seq is None:
+            seq = max((s["seq"] for s in manifest["segments"]), default=0) + 1
+        name = f"seg-{seq:06d}"
+        tmp_dir = os.path.join(self.root, f".{name}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for col in COLUMNS:
+            path = os.path.join(tmp_dir, f"{col}.npy")
+            with open(path, "wb") as f:
+                np.save(f, arrays[col])
+                f.flush()
+                os.fsync(f.fileno())
+        digest = self._digest(tmp_dir)
+        final_dir = os.path.join(self.root, name)
+        shutil.rmtree(final_dir, ignore_errors=True)  # orphan of a crashed append, never in the manifest
+        os.replace(tmp_dir, final_dir)
+        return {
+            "seq":     seq,
+            "name":    name,
+            "rows":    int(len(arrays["row_index"])),
+            "sha256":  digest,
+            "created": datetime.now().isoformat(timespec="seconds"),
+        }
+
+    @staticmethod
+    def _digest(seg_dir: str) -> str:
+        """sha256 over every column file of a segment, in COLUMNS order."""
+        h = hashlib.sha256()
+        for col in COLUMNS:
+            h.update(col.encode())
+            with open(os.path.join(seg_dir, f"{col}.npy"), "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+        return h.hexdigest()
+
+    def segment_digest(self, seg: dict) -> str:
+        """Content hash of a segment (recomputed for segments written before digests were recorded)."""
+        return seg.get("sha256") or self._digest(os.path.join(self.root, seg["name"]))
+
+    def append(self, df: pd.DataFrame) -> int:
+        """
+        Append farmer_inputs-shaped rows as one new segment. row_index is
+        reassigned to continue after the existing rows; rows with missing
+        values are dropped. Returns the number of rows written.
+        """
+        manifest = self.manifest()
+        rows = self._add_segment(manifest, df)
+        if rows:
+            self._write_manifest(manifest)
+        return rows
+
+    def _add_segment(self, manifest: dict, df: pd.DataFrame, seq: Optional[int] = None) -> int:
+        """Write df as a new segment and add it to manifest (not yet published)."""
+        df = df[[c for c in COLUMNS if c != "row_index"]].dropna()
+        if df.empty:
+            return 0
+
+        start = sum(s["rows"] for s in manifest["segments"])
+        arrays = {"row_index": np.arange(start, start + len(df), dtype=np.int64)}
+        for col in COLUMNS[1:]:
+            if col in CATEGORICAL:
+                vocab = manifest["vocab"][col]
+                codes = {v: i for i, v in enumerate(vocab)}
+                for value in df[col].unique():
+                    if value not in codes:
+                        codes[value] = len(vocab)
+                        vocab.append(value)
+                arrays[col] = df[col].map(codes).to_numpy(dtype=np.int32)
+            else:
+                arrays[col] = df[col].to_numpy(dtype=np.float64)
+
+        os.makedirs(self.root, exist_ok=True)
+        manifest["segments"].append(self._write_segment(manifest, arrays, seq))
+        return len(df)
+
+    def import_csv(self, path: str = INPUTS_CSV) -> int:
+        """
+        Replace the store's contents with a farmer_inputs-style CSV. The rows
+        are written as a new segment under a fresh vocabulary and swapped in
+        with the manifest, so a failed import leaves the old store untouched;
+        the old segments are deleted only after the swap.
+        """
+        df = pd.read_csv(path)
+        old_segments = self.manifest()["segments"]
+        manifest = {"columns": COLUMNS, "vocab": {c: [] for c in CATEGORICAL}, "segments": []}
+        next_seq = max((s["seq"] for s in old_segments), default=0) + 1
+        rows = self._add_segment(manifest, df, next_seq)
+        self._write_manifest(manifest)
+        for seg in old_segments:
+            shutil.rmtree(os.path.join(self.root, seg["name"]), ignore_errors=True)
+        return rows
+
+    def ensure(self, csv_path: str = INPUTS_CSV):
+        """Bootstrap the store from farmer_inputs.csv on first use."""
+        if not self.exists():
+            rows = self.import_csv(csv_path)
+            print(f"Training store created from {os.path.basename(csv_path)} ({rows} rows)")
+
+    def compact(self) -> int:
+        """Merge every segment into one and delete the old (and orphaned) segment directories."""
+        manifest = self.manifest()
+        if len(manifest["segments"]) > 1:
+            merged = self._write_segment(manifest, self.columns(mmap=False))
+            manifest["segments"] = [merged]
+            self._write_manifest(manifest)
+        live = {s["name"] for s in manifest["segments"]} | {MANIFEST}
+        for entry in os.listdir(self.root):
+            if entry not in live:
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+        return len(manifest["segments"])
+
+    # ── Reads ─────────────────────────────────────────────────────────────────
+
+    def segment_columns(self, seg: dict, mmap: bool = True) -> dict:
+        """{column: array} for one segment."""
+        mode = "r" if mmap else None
+        return {col: np.load(os.path.join(self.root, seg["name"], f"{col}.npy"), mmap_mode=mode) for col in COLUMNS}
+
+    def columns(self, mmap: bool = True) -> dict:
+        """{column: array} over all segments (each segment file memory-mapped)."""
+        manifest = self.manifest()
+        parts = {col: [] for col in COLUMNS}
+        for seg in manifest["segments"]:
+            for col, arr in self.segment_columns(seg, mmap).items():
+                parts[col].append(arr)
+        if len(manifest["segments"]) == 1:
+            return {col: arrs[0] for col, arrs in parts.items()}
+        return {
+            col: np.concatenate(arrs) if arrs else np.empty(0, dtype=np.int32 if col in CATEGORICAL else np.float64)
+            for col, arrs in parts.items()
+        }
+
+    def to_frame(self) -> pd.DataFrame:
+        """Decoded rows in farmer_inputs.csv layout."""
+        manifest = self.manifest()
+        cols = self.columns()
+        data = {}
+        for col in COLUMNS:
+            if col in CATEGORICAL:
+                data[col] = np.asarray(manifest["vocab"][col], dtype=object)[cols[col]]
+            else:
+                data[col] = np.asarray(cols[col])
+        return pd.DataFrame(data, columns=COLUMNS)
+
+    @staticmethod
+    def label_encoders(manifest: dict) -> tuple:
+        """
+        LabelEncoders for the store vocabularies (sorted classes, as fitting on
+        the raw values would produce) → (encoders, {column: store code → encoder code}).
+        """
+        encoders = {}
+        lookups = {}
+        for col in CATEGORICAL:
+            vocab = np.asarray(manifest["vocab"][col], dtype=object)
+            le = LabelEncoder()
+            le.classes_ = np.sort(vocab)
+            lookups[col] = np.searchsorted(le.classes_, vocab)
+            encoders["target" if col == "crop_name" else col] = le
+        return encoders, lookups
+
+    def training_matrix(self):
+        """
+        Encoded features straight from the stored codes, without parsing any
+        strings → (X, y, encoders). Store codes are remapped to LabelEncoder
+        codes with one lookup per column. See feature_cache.py for the cached
+        2-D matrix train_model uses.
+        """
+        cols = self.columns()
+        encoders, lookups = self.label_encoders(self.manifest())
+        remapped = {col: lookups[col][cols[col]] for col in CATEGORICAL}
+
+        X = pd.DataFrame(
+            {col: remapped[col] if col in CATEGORICAL else np.asarray(cols[col]) for col in FEATURES},
+            columns=FEATURES,
+        )
+        return X, remapped["crop_name"], encoders
+
+    def export_csv(self, path: str = INPUTS_CSV) -> int:
+        df = self.to_frame()
+        tmp = path + ".tmp"
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        return len(df)
+
+
+_store = None
+
+
+def get_training_store() -> TrainingStore:
+    global _store
+    if _store is None:
+        _store = TrainingStore()
+    return _store
+
+
+# ── CLI ───────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="Append-only columnar training store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="segments and row counts")
+    p_import = sub.add_parser("import", help="rebuild the store from a CSV")
+    p_import.add_argument("csv", nargs="?", default=INPUTS_CSV)
+    sub.add_parser("compact", help="merge all segments into one")
+    p_export = sub.add_parser("export", help="write a farmer_inputs.csv-compatible CSV")
+    p_export.add_argument("csv", nargs="?", default=INPUTS_CSV)
+    args = parser.parse_args()
+
+    store = get_training_store()
+    if args.command == "import":
+        print(f"Imported {store.import_csv(args.csv)} rows from {args.csv}")
+    elif args.command == "compact":
+        before = len(store.manifest()["segments"])
+        print(f"Compacted {before} segment(s) into {store.compact()}")
+    elif args.command == "export":
+        print(f"Exported {store.export_csv(args.csv)} rows to {args.csv}")
+    else:
+        manifest = store.manifest()
+        print(f"{store.root}: {len(manifest['segments'])} segment(s), {store.total_rows()} rows")
+        for seg in manifest["segments"]:
+            print(f"  {seg['name']}  {seg['rows']:>7} rows  {seg['created']}")
+        for col, vocab in manifest["vocab"].items():
+            print(f"  {col}: {len(vocab)} values")
+
+
+if __name__ == "__main__":
+    main()
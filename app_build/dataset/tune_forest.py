@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# dataset/tune_forest.py
+# Size / latency / accuracy sweep over RandomForest hyper-parameters
+#
+# Trains every combination of n_estimators × max_depth × min_samples_leaf ×
+# max_features on the same split train_model uses (80/20, random_state=42),
+# one configuration per worker process. Timings are taken afterwards, one
+# model at a time, so parallel training doesn't distort them. Prints a table
+# with the Pareto-optimal configurations (no other config is at least as
+# accurate, as fast for a single farm and as small) marked with *.
+#
+# Usage:
+#   python tune_forest.py
+#   python tune_forest.py --n-estimators 50,100,200 --max-depth none,16 --min-samples-leaf 1,3 \
+#                         --max-features sqrt,0.5 --workers 4 --out sweep.json
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import joblib
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+
+BASE_DIR    = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, "tuning")
+
+sys.path.insert(0, os.path.join(BASE_DIR, "..", "backend"))
+from app.services.forest_engine import FlatForest
+from training_store import get_training_store, FEATURES
+from feature_cache import get_feature_cache
+from train_crop_model import DATA_PATH, N_ESTIMATORS
+
+# ── Default grid ──────────────────────────────────────────────────────────────
+GRID = {
+    "n_estimators":     [25, 50, 100, 200],
+    "max_depth":        [None, 12, 20],
+    "min_samples_leaf": [1, 2, 5],
+    "max_features":     ["sqrt", 0.5],
+}
+PRODUCTION = {"n_estimators": N_ESTIMATORS, "max_depth": None, "min_samples_leaf": 1, "max_features": "sqrt"}
+
+BATCH_ROWS    = 512  # rows per batch-latency call (sklearn path, as serving uses for big batches)
+SINGLE_ROUNDS = 300  # single-row FlatForest calls timed per config
+LOAD_ROUNDS   = 3
+
+
+# ── Data ──────────────────────────────────────────────────────────────────────
+
+def load_split():
+    store = get_training_store()
+    store.ensure(DATA_PATH)
+    X, y, _ = get_feature_cache().load(store)
+    X = pd.DataFrame(np.asarray(X), columns=FEATURES)
+    return train_test_split(X, np.asarray(y), test_size=0.2, random_state=42)
+
+
+def config_name(cfg: dict) -> str:
+    depth = "none" if cfg["max_depth"] is None else cfg["max_depth"]
+    return f"n{cfg['n_estimators']}-d{depth}-leaf{cfg['min_samples_leaf']}-feat{cfg['max_features']}"
+
+
+# ── Phase 1: train (parallel) ─────────────────────────────────────────────────
+
+def train_one(cfg: dict, split: tuple, out_dir: str) -> dict:
+    X_train, X_test, y_train, y_test = split
+    start = time.perf_counter()
+    model = RandomForestClassifier(random_state=42, **cfg).fit(X_train, y_train)
+    fit_s = time.perf_counter() - start
+
+    probs = model.predict_proba(X_test)
+    top1  = model.classes_[probs.argmax(axis=1)]
+    top3  = model.classes_[np.argsort(probs, axis=1)[:, -3:]]
+
+    model_path  = os.path.join(out_dir, f"{config_name(cfg)}.pkl")
+    forest_path = os.path.join(out_dir, f"{config_name(cfg)}.forest.pkl")
+    joblib.dump(model, model_path)
+    FlatForest.from_sklearn(model).save(forest_path)
+
+    return {
+        **cfg,
+        "name":        config_name(cfg),
+        "accuracy":    round(float((top1 == y_test).mean()), 4),
+        "top3_hit":    round(float((top3 == y_test[:, None]).any(axis=1).mean()), 4),
+        "fit_s":       round(fit_s, 2),
+        "model_mb":    round(os.path.getsize(model_path) / 1e6, 2),
+        "forest_mb":   round(os.path.getsize(forest_path) / 1e6, 2),
+        "total_nodes": int(sum(t.tree_.node_count for t in model.estimators_)),
+        "_model_path": model_path,
+        "_forest_path": forest_path,
+    }
+
+
+# ── Phase 2: time (sequential) ────────────────────────────────────────────────
+
+def time_one(result: dict, X_test: pd.DataFrame) -> dict:
+    clock = time.perf_counter
+
+    loads = []
+    for _ in range(LOAD_ROUNDS):
+        start = clock()
+        model = joblib.load(result["_model_path"])
+        loads.append(clock() - start)
+    start = clock()
+    forest = FlatForest.load(result["_forest_path"])  # memory-mapped, as serving loads it
+    mmap_load = clock() - start
+
+    rows = X_test.to_numpy(dtype=np.float64)
+    single = []
+    for i in range(SINGLE_ROUNDS):
+        row = rows[i % len(rows)][None, :]
+        start = clock()
+        forest.predict_proba(row)
+        single.append(clock() - start)
+
+    batch = X_test.iloc[np.arange(BATCH_ROWS) % len(X_test)]
+    model.predict_proba(batch)  # warm up
+    batches = []
+    for _ in range(5):
+        start = clock()
+        model.predict_proba(batch)
+        batches.append(clock() - start)
+
+    single_ms = np.asarray(single) * 1000
+    return {
+        **result,
+        "load_ms":       round(min(loads) * 1000, 1),
+        "mmap_load_ms":  round(mmap_load * 1000, 2),
+        "single_p50_ms": round(float(np.percentile(single_ms, 50)), 4),
+        "single_p99_ms": round(float(np.percentile(single_ms, 99)), 4),
+        "batch_ms":      round(float(np.median(batches)) * 1000, 2),
+    }
+
+
+# ── Pareto front ──────────────────────────────────────────────────────────────
+
+def pareto_front(results: list) -> set:
+    """Names of configs not dominated on (accuracy ↑, top3_hit ↑, single_p50_ms ↓, forest_mb ↓)."""
+    def key(r):
+        return (r["accuracy"], r["top3_hit"], -r["single_p50_ms"], -r["forest_mb"])
+
+    front = set()
+    for r in results:
+        kr = key(r)
+        dominated = any(
+            all(a >= b for a, b in zip(key(o), kr)) and key(o) != kr
+            for o in results if o is not r
+        )
+        if not dominated:
+            front.add(r["name"])
+    return front
+
+
+def parse_list(value: str, cast) -> list:
+    return [None if v.strip().lower() == "none" else cast(v.strip()) for v in value.split(",")]
+
+
+def max_features_value(v: str):
+    try:
+        return float(v) if "." in v else int(v)
+    except ValueError:
+        return v  # "sqrt" / "log2"
+
+
+# ── Main ──────────────────────────────────────────────────────────────────────
+
+def main():
+    parser = argparse.ArgumentParser(description="RandomForest size / latency / accuracy sweep")
+    parser.add_argument("--n-estimators", default=",".join(map(str, GRID["n_estimators"])))
+    parser.add_argument("--max-depth", default=",".join("none" if d is None else str(d) for d in GRID["max_depth"]))
+    parser.add_argument("--min-samples-leaf", default=",".join(map(str, GRID["min_samples_leaf"])))
+    parser.add_argument("--max-features", default=",".join(map(str, GRID["max_features"])))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="parallel training processes")
+    parser.add_argument("--out", help="JSON results path (default: tuning/sweep-<timestamp>.json)")
+    args = parser.parse_args()
+
+    grid = {
+        "n_estimators":     parse_list(args.n_estimators, int),
+        "max_depth":        parse_list(args.max_depth, int),
+        "min_samples_leaf": parse_list(args.min_samples_leaf, int),
+        "max_features":     parse_list(args.max_features, max_features_value),
+    }
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+    split = load_split()
+    print(f"{len(configs)} configurations, {len(split[0])} train / {len(split[1])} test rows, {args.workers} worker(s)")
+
+    work_dir = tempfile.mkdtemp(prefix="tune_forest-")
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+            futures = [pool.submit(train_one, cfg, split, work_dir) for cfg in configs]
+            for done, future in enumerate(as_completed(futures), 1):
+                r = future.result()
+                results.append(r)
+                print(f"  [{done}/{len(configs)}] {r['name']}: accuracy {r['accuracy'] * 100:.2f}%, fit {r['fit_s']}s")
+
+        print("Timing load and inference...")
+        results = [time_one(r, split[1]) for r in results]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    for r in results:
+        r.pop("_model_path")
+        r.pop("_forest_path")
+    front = pareto_front(results)
+    for r in results:
+        r["pareto"] = r["name"] in front
+        r["production"] = all(r[k] == v for k, v in PRODUCTION.items())
+    results.sort(key=lambda r: (not r["pareto"], r["single_p50_ms"]))
+
+    # ── Report ────────────────────────────────────────────────────────────────
+    print("\n  * = Pareto-optimal (accuracy, top-3 hit, single-row latency, forest size)   ← = current production config")
+    print(f"  {'config':<34} {'acc %':>6} {'top3 %':>7} {'forest MB':>9} {'pickle MB':>9} "
+          f"{'load ms':>8} {'1-row ms':>9} {f'{BATCH_ROWS}-row ms':>10}")
+    for r in results:
+        mark = "*" if r["pareto"] else " "
+        prod = " ←" if r["production"] else ""
+        print(f"{mark} {r['name']:<34} {r['accuracy'] * 100:6.2f} {r['top3_hit'] * 100:7.2f} {r['forest_mb']:9.2f} "
+              f"{r['model_mb']:9.2f} {r['load_ms']:8.1f} {r['single_p50_ms']:9.4f} {r['batch_ms']:10.2f}{prod}")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"sweep-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": datetime.now().isoformat(timespec="seconds"), "grid": grid, "results": results}, f, indent=2)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()